@@ -1,10 +1,14 @@
+import gc
 from typing import Union
 
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon
+from PyQt6.QtGui import QIcon, QKeySequence, QShortcut
 from PyQt6.QtWidgets import QHBoxLayout, QMainWindow, QTabBar, QTabWidget, QToolButton, QWidget
 
 from utility import MedicalImage, MedicalImage2
+from utility.budget import MemoryBudget
+from utility.memory import MemoryCounter, format_bytes, rss
+from utility.surface import SURFACES, cached_surfaces
 from widget import CollapsibleSidebar, ImageViewer, VolumeViewer
 
 
@@ -32,10 +36,15 @@ class Main(QMainWindow):
         self.tab_widget = QTabWidget(self)
         layout.addWidget(self.tab_widget, 4)
 
+        # 内存预算：超出时挂起后台标签页
+        self.budget = MemoryBudget(images=self.sidebar.images)
+
         # 信号与槽
+        self.tab_widget.currentChanged.connect(self.activate_tab)
         self.sidebar.image_displayed.connect(self.add_tab)
         self.sidebar.fusion_image_displayed.connect(self.add_tab)
         self.hide_sidebar_button.clicked.connect(self.hide_sidebar)
+        QShortcut(QKeySequence("Ctrl+M"), self).activated.connect(self.print_memory)
 
         # 样式
         self.resize(1920, 1080)
@@ -43,8 +52,16 @@ class Main(QMainWindow):
 
     def add_tab(self, uid: str, title: str, image: Union[MedicalImage, MedicalImage2]):
         if uid in self.tabs:
-            self.tab_widget.setCurrentIndex(self.tabs.index(uid))
+            index = self.tabs.index(uid)
+            self.tab_widget.setCurrentIndex(index)
+            # 重复点击融合时新建的融合图像不会被使用，归还其从共享仓库获取的数据
+            if isinstance(image, MedicalImage2):
+                if all(image is not i for i in self.tab_widget.widget(index).source_images()):
+                    image.release()
         else:
+            # 被挂起的图像在显示前恢复
+            if image.suspended:
+                image.resume()
             if uid.endswith("2D"):
                 viewer = ImageViewer(image)
                 index = self.tab_widget.addTab(viewer, title)
@@ -77,10 +94,45 @@ class Main(QMainWindow):
             self.tab_widget.tabBar().setTabButton(index, QTabBar.ButtonPosition.RightSide, tabCloseButton)
 
             self.tabs.append(uid)
+            self.budget.register(self.tab_widget.widget(index))
 
     def remove_tab(self, index):
         self.tabs.pop(index)
+        widget = self.tab_widget.widget(index)
+        self.budget.unregister(widget)
         self.tab_widget.removeTab(index)
+        # removeTab 不会删除部件，需要显式释放
+        if isinstance(widget, ImageViewer):
+            # 其他标签页仍在显示同一图像时保留图像的缓存
+            others = [i for w in map(self.tab_widget.widget, range(self.tab_widget.count())) for i in w.source_images()]
+            shared = any(i is o for i in widget.source_images() for o in others)
+            widget.release(drop_caches=not shared)
+        elif hasattr(widget, "release"):
+            widget.release()
+        widget.setParent(None)
+        widget.deleteLater()
+        gc.collect()
+
+    def activate_tab(self, index: int):
+        if index >= 0:
+            self.budget.activate(self.tab_widget.widget(index))
+
+    # 统计各标签页与侧边栏图像持有的内存
+    def memory(self) -> MemoryCounter:
+        counter = MemoryCounter()
+        for i, uid in enumerate(self.tabs):
+            self.tab_widget.widget(i).memory(counter, f"tab[{uid}]")
+        for i, image in enumerate(self.sidebar.images()):
+            counter.add_image(f"sidebar{i}", image)
+        for surface in cached_surfaces():
+            counter.add_data("surface_cache", surface)
+        return counter
+
+    def print_memory(self):
+        counter = self.memory()
+        for line in counter.lines():
+            print(f"[INFO] {line}")
+        print(f"[INFO] total {format_bytes(counter.total)}, rss {format_bytes(rss())}")
 
     def hide_sidebar(self):
         layout: QHBoxLayout = self.centralWidget().layout()
@@ -94,20 +146,98 @@ class Main(QMainWindow):
             layout.setStretch(0, 1)
 
 
+def synthetic_image(shape=(64, 128, 128)) -> MedicalImage:
+    """
+    合成的 CT(空气、软组织与骨骼)，没有提供图像时用于内存泄漏测试
+    """
+    from utility.volume_mapper import synthetic_volumes
+
+    ct, _ = synthetic_volumes(shape)
+    return MedicalImage(ct, ct.shape[::-1], (0.0, 0.0, 0.0), (1.0, 1.0, 1.0), (1, 0, 0, 0, 1, 0, 0, 0, 1), "CT")
+
+
+def leak_test(main: Main, image: MedicalImage, repeat: int = 10, tolerance: int = 64 * 1024 * 1024) -> bool:
+    """
+    反复打开、关闭标签页(三维标签页同时进入表面模式)，检查常驻内存是否回到基线、网格缓存是否清空，返回是否通过
+    """
+    from PyQt6.QtCore import QCoreApplication, QEvent
+
+    def settle():
+        for _ in range(3):
+            QCoreApplication.processEvents()
+            QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+            gc.collect()
+
+    types = ["2D", "3D"] if image.modality in ("CT", "PT") else ["2D"]
+
+    def cycle(i: int):
+        for t in types:
+            main.add_tab(f"leak{i}-{t}", f"leak {i} {t}", image)
+            settle()
+            widget = main.tab_widget.widget(len(main.tabs) - 1)
+            if isinstance(widget, VolumeViewer) and image.modality == "CT":
+                widget.set_surface({"bone": SURFACES["bone"][0]}, "骨骼")
+                if widget.surface_worker is not None:
+                    widget.surface_worker.wait()
+                settle()
+            main.remove_tab(len(main.tabs) - 1)
+            settle()
+
+    # 预热：首次打开时的懒加载与导入不计入
+    cycle(-1)
+    baseline = rss()
+    for i in range(repeat):
+        cycle(i)
+        print(f"[INFO] cycle {i}: rss {format_bytes(rss())}, growth {format_bytes(rss() - baseline)}")
+    growth = rss() - baseline
+    if len(main.tabs) != 0 or main.tab_widget.count() != 0:
+        print("[ERROR] leak test failed, tabs are not removed.")
+        return False
+    if cached_surfaces():
+        print(f"[ERROR] leak test failed, {len(cached_surfaces())} surfaces are still cached.")
+        return False
+    if growth >= tolerance:
+        print(f"[ERROR] leak test failed, resident memory grows by {format_bytes(growth)} after {repeat} cycles.")
+        return False
+    print(f"[INFO] leak test passed, growth {format_bytes(growth)}.")
+    return True
+
+
 if __name__ == "__main__":
     import argparse
     import sys
 
     from PyQt6.QtWidgets import QApplication
 
-    from utility import read_nifti
+    from utility import read_nifti, trace
 
     args = argparse.ArgumentParser("debug Widget.")
     args.add_argument(
-        "--widget", type=str, default="main", choices=["main", "ImageViewer", "VolumeViewer", "CollapsibleSidebar"]
+        "--widget",
+        type=str,
+        default="main",
+        choices=[
+            "main",
+            "ImageViewer",
+            "VolumeViewer",
+            "CollapsibleSidebar",
+            "MemoryLeak",
+            "VolumeBenchmark",
+            "Offscreen",
+        ],
     )
+    args.add_argument("--repeat", type=int, default=10, help="open/close cycles of MemoryLeak.")
+    args.add_argument("--image", type=str, default=None, help="NIfTI image of MemoryLeak, synthetic CT if not set.")
+    args.add_argument("--modality", type=str, default="CT", help="modality of the MemoryLeak image.")
+    args.add_argument("--tolerance", type=int, default=64, help="allowed RSS growth (MB) of MemoryLeak.")
+    args.add_argument("--frames", type=int, default=36, help="camera path frames of VolumeBenchmark and Offscreen.")
+    args.add_argument("--output", type=str, default="output", help="output directory of Offscreen.")
+    args.add_argument("--workers", type=int, default=None, help="processes of Offscreen, 0 renders in this process.")
+    args.add_argument("--trace", type=str, default=None, help="write a Chrome trace JSON to this path on exit.")
 
     args = args.parse_args()
+    if args.trace is not None:
+        trace.enable(args.trace)
     if args.widget == "main":
         app = QApplication(sys.argv)
         main = Main()
@@ -131,5 +261,29 @@ if __name__ == "__main__":
         image = MedicalImage2.from_ct_pt(ct, pt)
         widget = VolumeViewer(image)
         sys.exit(app.exec())
+    elif args.widget == "VolumeBenchmark":
+        # 离屏渲染，不需要窗口
+        from utility.volume_mapper import benchmark
+
+        benchmark(frames=args.frames)
+    elif args.widget == "Offscreen":
+        # 离屏渲染快照与旋转视频，不需要窗口
+        from utility.offscreen import CameraPath, Study, render_batch
+
+        studies = [Study("001", r"DATA\001_CT.nii.gz", r"DATA\001_SUVbw.nii.gz")]
+        paths = [CameraPath.snapshots(), CameraPath.turntable(args.frames)]
+        render_batch(studies, paths, args.output, workers=args.workers)
+    elif args.widget == "MemoryLeak":
+        # 可重复运行：python main.py --widget MemoryLeak [--image xxx.nii.gz] --repeat 10 --tolerance 64，未通过时返回 1
+        app = QApplication(sys.argv)
+        if args.image is not None:
+            image = read_nifti(args.image, True)
+            image.modality = args.modality
+        else:
+            image = synthetic_image()
+        main = Main()
+        passed = leak_test(main, image, args.repeat, args.tolerance * 1024 * 1024)
+        main.close()
+        sys.exit(0 if passed else 1)
     else:
         print("end.")
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_memory_leak():
+    """
+    在无窗口的 Qt 平台下用合成 CT 反复打开、关闭二维与三维(表面模式)标签页，常驻内存增长超出阈值时失败
+    """
+    pytest.importorskip("PyQt6.QtWidgets")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run(
+        [sys.executable, "main.py", "--widget", "MemoryLeak", "--repeat", "3", "--tolerance", "64"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=900,
+    )
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
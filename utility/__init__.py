@@ -1,14 +1,31 @@
 from utility.common import (
+    BBoxLayer,
     bbox,
+    downsample,
     float_01_to_uint8_0255,
     get_body_mask,
     get_colors,
     json_to_labels,
+    look_at,
+    mask_body,
     nifti_to_labels,
+    set_volume_input,
+    set_volume_preset,
+    to_vtk_image,
     volume_ct,
     volume_pt,
 )
 from utility.constant import LABEL_TO_NAME, VIEW_TO_NAME
+from utility.frame_timer import FrameTimer
 from utility.io import read_dicom, read_image, read_nifti
 from utility.medical_image import MedicalImage
 from utility.medical_image2 import MedicalImage2
+from utility.mip import rotating_mip
+from utility.pyramid import ImagePyramid
+from utility.reslice import VIEW_TO_AXES, ObliquePlane, curved_plane, oblique_plane
+from utility.slab import SlabProjector
+from utility.statistics import ImageStatistics
+from utility.thumbnail import load_thumbnail, make_thumbnail
+from utility.transfer_function import PRESETS, volume_property
+from utility.volume_mapper import MapperConfig, get_mapper_config, set_mapper_config
+from utility.volume_store import VolumeStore, get_volume_store
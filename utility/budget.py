@@ -0,0 +1,96 @@
+import os
+from collections import OrderedDict
+from typing import Callable, List
+
+from .memory import MemoryCounter, format_bytes
+from .surface import cached_surfaces, clear_surfaces
+
+# 内存预算(MB)，可通过环境变量 VIS_MEMORY_BUDGET 修改
+DEFAULT_BUDGET = int(os.environ.get("VIS_MEMORY_BUDGET", 8192)) * 1024 * 1024
+
+
+class MemoryBudget:
+    """
+    全局内存预算：按标签页最近一次激活的顺序管理，超出预算时先清空后台标签页的可重建缓存，
+    仍然超出时按最久未使用的顺序挂起后台标签页，只有不被任何未挂起标签页使用的图像才会换出。
+    标签页需要实现 source_images()、memory(counter, name)、drop_caches()、suspend()、resume() 与 suspended 属性。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET, images: Callable[[], List] = None) -> None:
+        self.max_bytes = max_bytes
+        # 侧边栏等标签页之外持有的图像
+        self.images = images if images is not None else list
+        # 最近激活的标签页在最后
+        self.clients: "OrderedDict[int, object]" = OrderedDict()
+
+    def register(self, client):
+        self.clients[id(client)] = client
+        self.clients.move_to_end(id(client))
+        self.enforce()
+
+    def unregister(self, client):
+        self.clients.pop(id(client), None)
+
+    def activate(self, client):
+        """
+        标签页切换到前台：必要时恢复，然后检查预算
+        """
+        if id(client) not in self.clients:
+            return
+        self.clients.move_to_end(id(client))
+        if client.suspended:
+            for image in client.source_images():
+                image.resume()
+            client.resume()
+            print(f"[INFO] memory budget: resume {type(client).__name__}.")
+        self.enforce()
+
+    def usage(self) -> MemoryCounter:
+        counter = MemoryCounter()
+        for i, client in enumerate(self.clients.values()):
+            client.memory(counter, f"tab{i}")
+        for i, image in enumerate(self.images()):
+            counter.add_image(f"image{i}", image)
+        for surface in cached_surfaces():
+            counter.add_data("surface_cache", surface)
+        return counter
+
+    def in_use(self, image) -> bool:
+        return any(not c.suspended and any(i is image for i in c.source_images()) for c in self.clients.values())
+
+    def enforce(self):
+        total = self.usage().total
+        if total <= self.max_bytes:
+            return
+        # 当前标签页不参与回收
+        background = list(self.clients.values())[:-1]
+
+        # 1. 清空后台标签页的可重建缓存与等值面网格缓存
+        for client in background:
+            client.drop_caches()
+        clear_surfaces()
+        total = self.usage().total
+
+        # 2. 按最久未使用的顺序挂起后台标签页
+        for client in background:
+            if total <= self.max_bytes:
+                break
+            if client.suspended:
+                continue
+            client.suspend()
+            for image in client.source_images():
+                if not self.in_use(image):
+                    image.suspend()
+            total = self.usage().total
+            print(f"[INFO] memory budget: suspend {type(client).__name__}, usage {format_bytes(total)}.")
+
+        # 3. 换出不被任何前台标签页使用的图像
+        for image in self.images():
+            if total <= self.max_bytes:
+                break
+            if not image.suspended and not self.in_use(image):
+                image.suspend()
+                total = self.usage().total
+
+        if total > self.max_bytes:
+            print(f"[WARNING] memory budget exceeded: {format_bytes(total)} > {format_bytes(self.max_bytes)}.")
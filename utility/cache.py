@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from glob import glob
+from typing import Hashable, List, Union
+
+import numpy as np
+
+# 本地缓存目录，可通过环境变量 VIS_CACHE_DIR 修改
+CACHE_DIR = os.environ.get("VIS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "vis_qt5"))
+
+
+def cache_path(category: str, key: str, ext: str) -> str:
+    directory = os.path.join(CACHE_DIR, category)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, key + ext)
+
+
+def series_key(files: Union[List[str], str], size: tuple, modality: str) -> str:
+    """
+    根据文件路径、修改时间、大小与模态生成序列的唯一标识，文件改变后标识随之改变
+    """
+    if files is None:
+        return None
+    files = [files] if isinstance(files, str) else list(files)
+    if len(files) == 0:
+        return None
+    sha1 = hashlib.sha1()
+    for file in files:
+        sha1.update(os.path.abspath(file).encode("utf-8"))
+    for file in (files[0], files[-1]):
+        sha1.update(str(os.path.getmtime(file) if os.path.exists(file) else 0).encode("utf-8"))
+    sha1.update(f"{tuple(size)}{modality}".encode("utf-8"))
+    return sha1.hexdigest()
+
+
+# 换出文件所在目录的大小上限，超出时删除最久未使用的文件，可通过环境变量 VIS_SPILL_MAX_BYTES 修改
+SPILL_MAX_BYTES = int(os.environ.get("VIS_SPILL_MAX_BYTES", 8 * 1024 * 1024 * 1024))
+
+
+def spill_path(key: str, dtype: np.dtype, shape: tuple) -> str:
+    # 文件名包含数据类型与形状，数据类型或形状改变后不会误用旧文件
+    shape = "x".join(str(s) for s in shape)
+    return cache_path("suspend", f"{key}_{np.dtype(dtype).str.lstrip('<>|=')}_{shape}", ".npy")
+
+
+def spill(array: np.ndarray, key: str) -> np.ndarray:
+    """
+    将数组写入本地缓存并以只读 memmap 的形式返回，memmap 的数据不占用常驻内存，按需从磁盘读取
+    """
+    if isinstance(array, np.memmap):
+        return array
+    path = spill_path(key, array.dtype, array.shape)
+    if os.path.exists(path):
+        try:
+            cached = np.load(path, mmap_mode="r")
+            if cached.dtype == array.dtype and cached.shape == array.shape:
+                # 更新修改时间，清理时按最久未使用的顺序删除
+                os.utime(path)
+                return cached
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] invalid spill file {path}: {e}")
+    # 先写入临时文件，避免中断后留下不完整的缓存
+    np.save(path + ".tmp.npy", array)
+    os.replace(path + ".tmp.npy", path)
+    prune_spills(exclude=path)
+    return np.load(path, mmap_mode="r")
+
+
+def unspill(key: str):
+    """
+    删除换出的文件，仅用于没有序列标识、无法在之后复用的数据
+    """
+    for path in glob(os.path.join(CACHE_DIR, "suspend", key + "_*.npy")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def prune_spills(max_bytes: int = SPILL_MAX_BYTES, exclude: str = None):
+    """
+    换出目录超过 max_bytes 时按修改时间从旧到新删除文件；正在被映射的文件在部分系统上无法删除，跳过即可
+    """
+    files = []
+    for path in glob(os.path.join(CACHE_DIR, "suspend", "*.npy")):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if path == exclude:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，按 numpy 数组占用的字节数限制大小。
+    每次清空时代数加一，清空前开始计算的结果按旧的代数写入时被丢弃，避免显示过期的数据
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.generation = 0
+        self.items: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> np.ndarray:
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key: Hashable, array: np.ndarray, generation: int = None) -> np.ndarray:
+        """
+        :param generation: 开始计算时的代数，与当前代数不同时不写入
+        """
+        # 缓存的数组只读，避免被调用者修改
+        array.flags.writeable = False
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return array
+            if key in self.items:
+                self.nbytes -= self.items.pop(key).nbytes
+            self.items[key] = array
+            self.nbytes += array.nbytes
+            while self.nbytes > self.max_bytes and len(self.items) > 1:
+                self.nbytes -= self.items.popitem(last=False)[1].nbytes
+        return array
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.nbytes = 0
+            self.generation += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
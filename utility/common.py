@@ -1,25 +1,29 @@
 import colorsys
 import json
+import math
 from typing import List, Tuple
 
 import cv2
 import numpy as np
 import SimpleITK as sitk
-from matplotlib.cm import get_cmap
-from vtkmodules.util.vtkImageImportFromArray import vtkImageImportFromArray
-from vtkmodules.vtkCommonCore import vtkPoints
-from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPiecewiseFunction, vtkPolyData
+from vtkmodules.util.numpy_support import get_numpy_array_type, numpy_to_vtk, numpy_to_vtkIdTypeArray
+from vtkmodules.vtkCommonCore import vtkPoints, vtkStringArray
+from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkImageData, vtkPolyData
 from vtkmodules.vtkRenderingCore import (
     vtkActor,
-    vtkColorTransferFunction,
+    vtkActor2D,
     vtkPolyDataMapper,
     vtkTextActor3D,
+    vtkTextProperty,
     vtkVolume,
-    vtkVolumeProperty,
 )
-from vtkmodules.vtkRenderingVolume import vtkFixedPointVolumeRayCastMapper
+from vtkmodules.vtkRenderingLabel import vtkLabeledDataMapper
 
 from .constant import LABEL_TO_NAME
+from .kernel import native_range, rescale_to_uint8
+from .trace import traced
+from .transfer_function import DEFAULT_PRESETS, volume_property
+from .volume_mapper import MapperConfig, get_mapper_config
 
 np.random.seed(66)
 
@@ -35,12 +39,12 @@ def get_colors(num):
     return colors
 
 
-def float_01_to_uint8_0255(array: np.ndarray):
+def float_01_to_uint8_0255(array: np.ndarray, out: np.ndarray = None):
     if array.shape[-1] == 4:
         # RGBA -> RGB
-        return (np.clip(array[..., 0:3], 0, 1) * 255).round().astype(np.uint8)
+        return rescale_to_uint8(array[..., 0:3], 0.0, 255.0, out)
     else:
-        return (np.clip(array, 0, 1) * 255).round().astype(np.uint8)
+        return rescale_to_uint8(array, 0.0, 255.0, out)
 
 
 # -----------------------------------------------------------#
@@ -92,6 +96,7 @@ def binary_morphological_opening(mask_image: sitk.Image, kernel_radius=2):
     return bmo_filter.Execute(mask_image)
 
 
+@traced()
 def get_body_mask(hu_image: sitk.Image, suv_image: sitk.Image):
     # 忽略其中进行闭操作和最大连通量
     # CT(去除机床) = CT binary ∩ SUV binary; CT(去除伪影) = CT binary(去除机床) ∪ SUV binary;
@@ -118,114 +123,148 @@ def get_body_mask(hu_image: sitk.Image, suv_image: sitk.Image):
 # -----------------------------------------------------------#
 
 
-def volume_ct(array: np.ndarray, origin: tuple, spacing: tuple, body_array: np.ndarray = None) -> vtkVolume:
+@traced()
+def mask_body(
+    array: np.ndarray, body_array: np.ndarray = None, modality: str = "CT", out: np.ndarray = None
+) -> np.ndarray:
+    """
+    保留身体部分，保持原始数据类型；身体之外 CT 填充为空气(-1000，超出数据类型范围时取最小值)，PET 填充为 0。
+    结果写入可复用的缓冲区 out，不产生与数组同样大小的临时数据
+    """
+    if body_array is None:
+        return array
+    if out is None or out.shape != array.shape or out.dtype != array.dtype:
+        out = np.empty_like(array)
+    fill = max(-1000.0, native_range(array.dtype)[0]) if modality == "CT" else 0
+    # 0/1 的 uint8 掩膜直接按 bool 解释
+    where = body_array.view(np.bool_) if body_array.dtype == np.uint8 else body_array.astype(bool, copy=False)
+    out.fill(fill)
+    np.copyto(out, array, where=where)
+    return out
+
+
+def set_volume_input(volume: vtkVolume, array: np.ndarray, spacing: tuple = None):
+    """
+    替换体数据的输入，保留映射器与传递函数，例如切换是否仅保留人体或切换分辨率
+    :param spacing: 新数据的体素间距，None 时沿用原来的间距
+    """
+    mapper = volume.GetMapper()
+    data = mapper.GetInput()
+    spacing = spacing if spacing is not None else data.GetSpacing()
+    mapper.SetInputData(to_vtk_image(array, data.GetOrigin(), spacing))
+
+
+def downsample(array: np.ndarray, factor: int) -> np.ndarray:
+    """
+    按步长对 (Z, Y, X) 数组降采样，第一个体素的位置不变，体素间距相应地乘以 factor
+    """
+    if factor <= 1:
+        return array
+    return np.ascontiguousarray(array[::factor, ::factor, ::factor])
+
+
+def to_vtk_image(array: np.ndarray, origin: tuple, spacing: tuple) -> vtkImageData:
+    """
+    将 (Z, Y, X) 数组按原始数据类型零拷贝地包装为 vtkImageData，vtk 对象持有数组的引用。
+    只有不连续(裁剪得到的视图)、非本机字节序或布尔类型的数组才会复制
+    """
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)
+    if not array.dtype.isnative:
+        array = array.astype(array.dtype.newbyteorder("="))
+    array = np.ascontiguousarray(array)
+
+    image = vtkImageData()
+    image.SetDimensions(*array.shape[::-1])
+    image.SetOrigin(origin)
+    image.SetSpacing(spacing)
+    scalars = numpy_to_vtk(array.reshape(-1), deep=False)
+    scalars.SetName("scalars")
+    image.GetPointData().SetScalars(scalars)
+    # vtk 只引用缓冲区，需要保持 numpy 数组存活
+    image.numpy_array = array
+    return image
+
+
+@traced()
+def volume_ct(
+    array: np.ndarray,
+    origin: tuple,
+    spacing: tuple,
+    body_array: np.ndarray = None,
+    config: MapperConfig = None,
+    preset: str = DEFAULT_PRESETS["CT"],
+) -> vtkVolume:
+    config = config if config is not None else get_mapper_config()
     # 保留身体部分
-    if body_array is not None:
-        array = array * body_array + -1000 * (1 - body_array)
-
-    # 创建 vtk 图像
-    vtk_image = vtkImageImportFromArray()
-    vtk_image.SetArray(array.astype(np.float64))
-    vtk_image.SetDataOrigin(origin)
-    vtk_image.SetDataSpacing(spacing)
-    vtk_image.Update()
-
-    # 体积将通过光线投射alpha合成显示，需要光线投射映射器来进行光线投射
-    mapper = vtkFixedPointVolumeRayCastMapper()
-    mapper.SetInputConnection(vtk_image.GetOutputPort())
-
-    # 使用颜色转换函数，对不同的值设置不同的函数
-    color = vtkColorTransferFunction()
-    cmap = get_cmap("gray")
-    cmap = cmap(np.linspace(0, 1, cmap.N))
-    x = np.linspace(-450, 1050, 256)
-    [color.AddRGBPoint(_x, *rgba[:3]) for _x, rgba in zip(x, cmap)]
-
-    # 使用透明度转换函数，用于控制不同组织之间的透明度
-    scalar_opacity = vtkPiecewiseFunction()
-    scalar_opacity.AddPoint(0, 0.00)
-    scalar_opacity.AddPoint(200, 0.25)
-    scalar_opacity.AddPoint(500, 0.45)
-    scalar_opacity.AddPoint(1000, 0.65)
-    scalar_opacity.AddPoint(1150, 0.90)
-
-    # 梯度不透明度函数用于降低体积“平坦”区域的不透明度，同时保持组织类型之间边界的不透明度。梯度是以强度在单位距离上的变化量来测量的。
-    gradient_opacity = vtkPiecewiseFunction()
-    gradient_opacity.AddPoint(0, 0.00)
-    gradient_opacity.AddPoint(90, 0.5)
-    gradient_opacity.AddPoint(100, 1.0)
-
-    property = vtkVolumeProperty()
-    property.SetColor(color)
-    property.SetScalarOpacity(scalar_opacity)
-    property.SetGradientOpacity(gradient_opacity)
-    property.SetInterpolationTypeToLinear()
-    property.ShadeOn()
-    # 环境光系数表示各种光线照射到物体材质上，经过很多次发射后最终在环境中的光线强度
-    property.SetAmbient(0.4)
-    # 漫反射光系数表示光线照射到物体材质上，经过漫反射后形成的光线强度
-    property.SetDiffuse(0.6)
-    # 镜反射系数表示光线照射到物体材质上，经过镜面反射后形成的光线强度
-    property.SetSpecular(0.2)
+    array = mask_body(array, body_array, "CT")
+
+    # 创建 vtk 图像，直接使用原始数据类型(int16/float32 等)，不转换为 float64
+    vtk_image = to_vtk_image(array, origin, spacing)
 
+    # 体积将通过光线投射alpha合成显示，需要光线投射映射器来进行光线投射，映射器类型由配置决定
+    mapper = config.create_mapper()
+    mapper.SetInputData(vtk_image)
+
+    # 颜色、不透明度与梯度不透明度函数来自预设库，所有体数据共享
     volume = vtkVolume()
     volume.SetMapper(mapper)
-    volume.SetProperty(property)
+    volume.SetProperty(volume_property(preset, array.dtype, config.interpolation))
 
     return volume
 
 
+@traced()
 def volume_pt(
-    array: np.ndarray, origin: tuple, spacing: tuple, body_array: np.ndarray = None, ma: float = 5.0
+    array: np.ndarray,
+    origin: tuple,
+    spacing: tuple,
+    body_array: np.ndarray = None,
+    config: MapperConfig = None,
+    preset: str = DEFAULT_PRESETS["PT"],
 ) -> vtkVolume:
+    config = config if config is not None else get_mapper_config()
     # 保留身体部分
-    if body_array is not None:
-        array = array * body_array + array * (1 - body_array)
-
-    vtk_image = vtkImageImportFromArray()
-    vtk_image.SetArray(array.astype(np.float64))
-    vtk_image.SetDataOrigin(origin)
-    vtk_image.SetDataSpacing(spacing)
-    vtk_image.Update()
-
-    mapper = vtkFixedPointVolumeRayCastMapper()
-    mapper.SetInputConnection(vtk_image.GetOutputPort())
-
-    color = vtkColorTransferFunction()
-    cmap = get_cmap("hot")
-    cmap = cmap(np.linspace(0, 1, cmap.N))
-    x = np.linspace(0, ma, 256)
-    [color.AddRGBPoint(_x, *rgba[:3]) for _x, rgba in zip(x, cmap)]
-
-    scalar_opacity = vtkPiecewiseFunction()
-    scalar_opacity.AddPoint(0, 0.00)
-    scalar_opacity.AddPoint(1.0, 0.25)
-    scalar_opacity.AddPoint(2.5, 0.45)
-    scalar_opacity.AddPoint(0.60 * ma, 0.80)
-    scalar_opacity.AddPoint(0.90 * ma, 0.95)
-
-    gradient_opacity = vtkPiecewiseFunction()
-    gradient_opacity.AddPoint(0, 0.00)
-    gradient_opacity.AddPoint(0.6 * ma, 0.4)
-    gradient_opacity.AddPoint(0.9 * ma, 1.0)
-
-    property = vtkVolumeProperty()
-    property.SetColor(color)
-    property.SetScalarOpacity(scalar_opacity)
-    property.SetGradientOpacity(gradient_opacity)
-    property.SetInterpolationTypeToLinear()
-    property.ShadeOn()
-    property.SetAmbient(0.4)
-    property.SetDiffuse(0.6)
-    property.SetSpecular(0.2)
+    array = mask_body(array, body_array, "PT")
+
+    # 直接使用原始数据类型(float32 等)，不转换为 float64
+    vtk_image = to_vtk_image(array, origin, spacing)
+
+    mapper = config.create_mapper()
+    mapper.SetInputData(vtk_image)
 
     volume = vtkVolume()
     volume.SetMapper(mapper)
-    volume.SetProperty(property)
+    volume.SetProperty(volume_property(preset, array.dtype, config.interpolation))
 
     return volume
 
 
+def set_volume_preset(volume: vtkVolume, preset: str, config: MapperConfig = None):
+    """
+    切换体数据的传递函数预设，只替换属性，映射器与输入保持不变
+    """
+    config = config if config is not None else get_mapper_config()
+    data = volume.GetMapper().GetInput()
+    dtype = get_numpy_array_type(data.GetScalarType())
+    volume.SetProperty(volume_property(preset, dtype, config.interpolation))
+
+
+def look_at(camera, size: tuple, spacing: tuple, point1: list = None, point2: list = None):
+    """
+    从前方(-y 方向)对准整个体数据或指定的体素范围，视角 60 度，头部朝上
+    """
+    if point1 is None:
+        point1, point2 = (0, 0, 0), [s - 1 for s in size]
+    extent = [(q - p + 1) * s for p, q, s in zip(point1, point2, spacing)]
+    center = [(0.5 * (p + q + 1) - 0.5 * n) * s for p, q, n, s in zip(point1, point2, size, spacing)]
+    distance = -0.5 * max(extent[0], extent[2]) / math.tan(math.pi / 6)
+    camera.SetPosition(center[0], center[1] + distance, center[2])
+    camera.SetFocalPoint(*center)
+    camera.SetViewUp(0, 0, 1)
+    camera.SetViewAngle(60.0)
+
+
 def bbox(
     point1: List[int],
     point2: List[int],
@@ -300,6 +339,111 @@ def bbox(
     return cube_actor, text_actor
 
 
+# 边界框 8 个顶点之间的 12 条边
+BBOX_EDGES = np.array(
+    [[0, 1], [1, 2], [2, 3], [3, 0], [4, 5], [5, 6], [6, 7], [7, 4], [0, 4], [1, 5], [2, 6], [3, 7]], dtype=np.int64
+)
+
+
+def bbox_arrays(boxes: List[tuple], origin: Tuple[float], spacing: Tuple[float]):
+    """
+    批量计算边界框的顶点、线段连接、线段颜色与文本位置，顶点顺序与 bbox 相同
+    :param boxes: [(point1, point2, text, color), ...]
+    :return 顶点 (8N, 3)、连接 (12N, 2)、颜色 (12N, 3) uint8、文本位置 (N, 3)
+    """
+    n = len(boxes)
+    origin, spacing = np.asarray(origin, dtype=np.float64), np.asarray(spacing, dtype=np.float64)
+    p1 = origin + (np.array([b[0] for b in boxes], dtype=np.float64).reshape(n, 3) + 1) * spacing
+    p2 = origin + (np.array([b[1] for b in boxes], dtype=np.float64).reshape(n, 3) + 1) * spacing
+    # 各顶点取 point1 或 point2 的 x、y、z
+    corners = np.array([[0, 0, 0], [0, 1, 0], [1, 1, 0], [1, 0, 0], [0, 0, 1], [0, 1, 1], [1, 1, 1], [1, 0, 1]])
+    points = np.where(corners[np.newaxis] == 1, p2[:, np.newaxis], p1[:, np.newaxis]).reshape(-1, 3)
+    lines = (BBOX_EDGES[np.newaxis] + 8 * np.arange(n)[:, np.newaxis, np.newaxis]).reshape(-1, 2)
+    colors = np.array([b[3] for b in boxes], dtype=np.float64).reshape(n, 3)
+    colors = np.repeat(np.clip(colors * 255, 0, 255).round().astype(np.uint8), len(BBOX_EDGES), axis=0)
+    anchors = np.stack([p2[:, 0], p1[:, 1], p2[:, 2]], axis=1)
+    return points, lines, colors, anchors
+
+
+class BBoxLayer:
+    """
+    所有边界框共用一个 polydata(按线段着色)与一个 vtkLabeledDataMapper，只需要两次绘制；
+    修改不透明度只需更新线框的属性与每种颜色的文本属性
+    """
+
+    def __init__(self, boxes: List[tuple], origin: Tuple[float], spacing: Tuple[float], opacity: float) -> None:
+        """
+        :param boxes: [(point1, point2, text, color), ...]
+        """
+        points, lines, colors, anchors = bbox_arrays(boxes, origin, spacing)
+
+        vtk_points = vtkPoints()
+        vtk_points.SetData(numpy_to_vtk(points, deep=True))
+        cells = vtkCellArray()
+        offsets = np.arange(0, 2 * len(lines) + 1, 2, dtype=np.int64)
+        cells.SetData(numpy_to_vtkIdTypeArray(offsets, deep=True), numpy_to_vtkIdTypeArray(lines.ravel(), deep=True))
+        scalars = numpy_to_vtk(colors, deep=True)
+        scalars.SetName("colors")
+
+        cube = vtkPolyData()
+        cube.SetPoints(vtk_points)
+        cube.SetLines(cells)
+        cube.GetCellData().SetScalars(scalars)
+
+        mapper = vtkPolyDataMapper()
+        mapper.SetInputData(cube)
+        mapper.SetScalarModeToUseCellData()
+        mapper.SetColorModeToDirectScalars()
+        self.actor = vtkActor()
+        self.actor.SetMapper(mapper)
+
+        # 文本：按颜色区分文本属性，点数据中名为 type 的数组选择使用的属性
+        unique_colors = list(dict.fromkeys(tuple(b[3]) for b in boxes))
+        texts = vtkStringArray()
+        texts.SetName("labels")
+        for b in boxes:
+            texts.InsertNextValue(str(b[2]))
+        types = numpy_to_vtk(np.array([unique_colors.index(tuple(b[3])) for b in boxes], dtype=np.int32), deep=True)
+        types.SetName("type")
+        anchor_points = vtkPoints()
+        anchor_points.SetData(numpy_to_vtk(anchors, deep=True))
+        text_data = vtkPolyData()
+        text_data.SetPoints(anchor_points)
+        text_data.GetPointData().AddArray(texts)
+        text_data.GetPointData().AddArray(types)
+
+        label_mapper = vtkLabeledDataMapper()
+        label_mapper.SetInputData(text_data)
+        label_mapper.SetLabelModeToLabelFieldData()
+        label_mapper.SetFieldDataName("labels")
+        self.text_properties: List[vtkTextProperty] = []
+        for i, color in enumerate(unique_colors):
+            text_property = vtkTextProperty()
+            text_property.SetColor(*color)
+            text_property.SetFontSize(16)
+            text_property.BoldOn()
+            text_property.SetJustificationToCentered()
+            label_mapper.SetLabelTextProperty(text_property, i)
+            self.text_properties.append(text_property)
+        self.label_actor = vtkActor2D()
+        self.label_actor.SetMapper(label_mapper)
+
+        self.set_opacity(opacity)
+
+    def set_opacity(self, opacity: float):
+        self.actor.GetProperty().SetOpacity(opacity)
+        for text_property in self.text_properties:
+            text_property.SetOpacity(opacity)
+
+    def add_to(self, renderer):
+        renderer.AddActor(self.actor)
+        renderer.AddViewProp(self.label_actor)
+
+    def remove_from(self, renderer):
+        renderer.RemoveActor(self.actor)
+        renderer.RemoveViewProp(self.label_actor)
+
+
 def nifti_to_labels(nifti_path: str):
     """
     读取itk-snap软件标注的数据，转换为边界框标注信息。
@@ -0,0 +1,133 @@
+import csv
+import json
+import os
+import platform
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Deque, Dict, List
+
+import numpy as np
+
+# 每帧的处理阶段：输入事件 -> 切面提取 -> 颜色映射 -> QImage/QPixmap 转换 -> 分割图叠加 -> 绘制
+STAGES = ("input", "plane", "colormap", "pixmap", "label", "paint")
+PERCENTILES = (50, 95, 99)
+
+
+class FrameTimer:
+    """
+    记录 2D 视图每一帧各阶段的耗时(ms)，保留最近 window 帧用于计算 p50/p95/p99。
+    帧从输入事件开始(begin)，到绘制结束(end)；设置环境变量 VIS_FRAME_LOG 后每帧追加一行 JSON 到该文件。
+    """
+
+    # 当前正在记录的计时器，只在创建它的线程(界面线程)中生效
+    current: "FrameTimer" = None
+
+    def __init__(self, window: int = 500, log_path: str = None) -> None:
+        self.window = window
+        self.log_path = log_path if log_path is not None else os.environ.get("VIS_FRAME_LOG")
+        self.thread = threading.get_ident()
+        self.samples: Dict[str, Deque[float]] = {name: deque(maxlen=window) for name in STAGES + ("total",)}
+        self.frames = 0
+        self.t0: float = None
+        self.frame: Dict[str, float] = {}
+
+    def begin(self):
+        # 同一帧内的多个输入事件以第一个为准
+        if self.t0 is None:
+            self.t0 = time.perf_counter()
+            self.frame = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t = time.perf_counter()
+        # 输入事件到第一个阶段开始之间的等待时间
+        if "input" not in self.frame:
+            self.frame["input"] = (t - self.t0) * 1000
+        try:
+            yield
+        finally:
+            self.frame[name] = self.frame.get(name, 0.0) + (time.perf_counter() - t) * 1000
+
+    def end(self):
+        if self.t0 is None:
+            return
+        self.frame["total"] = (time.perf_counter() - self.t0) * 1000
+        self.t0 = None
+        self.frames += 1
+        for name, samples in self.samples.items():
+            samples.append(self.frame.get(name, 0.0))
+        if self.log_path is not None:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"frame": self.frames, **{k: round(v, 3) for k, v in self.frame.items()}}) + "\n")
+
+    def percentiles(self, name: str) -> List[float]:
+        samples = self.samples[name]
+        if len(samples) == 0:
+            return [0.0] * len(PERCENTILES)
+        return [float(v) for v in np.percentile(np.fromiter(samples, dtype=np.float64), PERCENTILES)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: dict(zip((f"p{p}" for p in PERCENTILES), self.percentiles(name)))
+            for name in STAGES + ("total",)
+        }
+
+    def lines(self) -> List[str]:
+        """
+        叠加显示的文本
+        """
+        lines = [f"frames {self.frames}   p50 / p95 / p99 ms"]
+        for name in STAGES + ("total",):
+            p = self.percentiles(name)
+            lines.append(f"{name:<8} {p[0]:6.1f} {p[1]:6.1f} {p[2]:6.1f}")
+        return lines
+
+    def export(self, path: str):
+        """
+        导出统计结果与原始样本，扩展名为 .csv 时导出 CSV，否则导出 JSON
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage"] + [f"p{p}" for p in PERCENTILES])
+                for name, p in self.summary().items():
+                    writer.writerow([name] + [f"{v:.3f}" for v in p.values()])
+                writer.writerow([])
+                names = list(self.samples.keys())
+                writer.writerow(["frame"] + names)
+                for i, row in enumerate(zip(*(self.samples[name] for name in names))):
+                    writer.writerow([i] + [f"{v:.3f}" for v in row])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "machine": {
+                            "platform": platform.platform(),
+                            "processor": platform.processor(),
+                            "cpu_count": os.cpu_count(),
+                            "python": platform.python_version(),
+                        },
+                        "frames": self.frames,
+                        "summary": self.summary(),
+                        "samples": {name: list(samples) for name, samples in self.samples.items()},
+                    },
+                    f,
+                    indent=2,
+                )
+
+    def clear(self):
+        for samples in self.samples.values():
+            samples.clear()
+        self.frames = 0
+
+
+def stage(name: str):
+    """
+    在当前帧中记录一个阶段的耗时，未启用计时或不在界面线程中时不做任何事
+    """
+    timer = FrameTimer.current
+    if timer is None or timer.t0 is None or timer.thread != threading.get_ident():
+        return nullcontext()
+    return timer.stage(name)
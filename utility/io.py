@@ -8,8 +8,11 @@ from pydicom.uid import generate_uid
 
 from .medical_image import MedicalImage
 from .medical_slice import MedicalSlice
+from .statistics import StatisticsAccumulator
+from .trace import counter, instant, span, traced
 
 
+@traced()
 def read_nifti(file: str, only_image=False) -> Union[dict, MedicalImage]:
     filename = os.path.basename(file)
     image = sitk.ReadImage(file)
@@ -38,15 +41,18 @@ def read_nifti(file: str, only_image=False) -> Union[dict, MedicalImage]:
         }
 
 
+@traced()
 def read_dicom(file: str) -> dict:
     filename, ext = os.path.splitext(file)
     directory = os.path.dirname(filename)
     files = glob(os.path.join(directory, "*" + ext))
     files.sort()
 
+    counter("read_dicom", files=len(files))
     slices = {}
     for file in files:
-        slice = MedicalSlice(file)
+        with span("MedicalSlice", file=os.path.basename(file)):
+            slice = MedicalSlice(file)
         size_uid = str(slice.size)
         if slice.study_uid not in slices:
             slices[slice.study_uid] = {
@@ -91,14 +97,25 @@ def read_dicom(file: str) -> dict:
                         skip_count += 1
                 if len(slices_left) != 0:
                     print("[INFO] compose slices by slice location.")
+                    instant("compose slices by slice location", series=series_uid)
                     size_slices = slices_left
                     size_slices.sort(key=lambda x: x.slice_location)
                 else:
                     print("[INFO] compose slices by instance number.")
+                    instant("compose slices by instance number", series=series_uid)
                     size_slices.sort(key=lambda x: x.instance_number)
-                volume = np.concatenate(
-                    [s.array[np.newaxis, ...] if s.size[-1] == 0 else s.array for s in size_slices], axis=0
-                )
+                arrays = [s.array[np.newaxis, ...] if s.size[-1] == 0 else s.array for s in size_slices]
+                # 在组装体数据的同时逐切片统计强度：切片复制后仍在缓存中，随即更新最小值、最大值与计数
+                with span("compose", slices=len(arrays)):
+                    shape = (sum(a.shape[0] for a in arrays), *arrays[0].shape[1:])
+                    volume = np.empty(shape, dtype=np.result_type(*{a.dtype for a in arrays}))
+                    accumulator = StatisticsAccumulator()
+                    z = 0
+                    for a in arrays:
+                        volume[z : z + a.shape[0]] = a
+                        accumulator.add(a)
+                        z += a.shape[0]
+                    statistics = accumulator.statistics()
                 # volume -> Medical Image
                 w, h, _d = size_slices[0].size
                 d = len(size_slices) if _d == 0 else _d
@@ -112,7 +129,12 @@ def read_dicom(file: str) -> dict:
                     size_slices[0].modality,
                     size_slices[0].channel,
                     files,
+                    statistics,
                 )
+                # 单个多帧文件(如动态 NM)，各帧即为 t 方向的切面
+                if len(size_slices) == 1 and _d > 1:
+                    medical_image.frames = _d
+                    medical_image.frame_time = size_slices[0].frame_time
                 # replace size_uid and mediacl_image
                 series_slices.pop(size_uid)
                 series_slices[str(medical_image.size)] = medical_image
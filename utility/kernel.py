@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# 每个分块的大小约为 4 MB（float32 临时数组），可以放入缓存
+SLAB_BYTES = 4 * 1024 * 1024
+# 小于该大小的数组直接在当前线程计算
+PARALLEL_MIN_BYTES = 2 * SLAB_BYTES
+
+_executor: ThreadPoolExecutor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    进程内共享的线程池，numpy 的逐元素运算会释放 GIL，可以真正并行
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="kernel")
+    return _executor
+
+
+def slabs(shape: tuple, itemsize: int = 4, slab_bytes: int = SLAB_BYTES) -> List[slice]:
+    """
+    沿第 0 轴将数组划分为若干分块
+    """
+    if len(shape) == 0 or shape[0] == 0:
+        return []
+    row_bytes = max(int(np.prod(shape[1:], dtype=np.int64)) * itemsize, 1)
+    rows = max(slab_bytes // row_bytes, 1)
+    return [slice(i, min(i + rows, shape[0])) for i in range(0, shape[0], rows)]
+
+
+def run_slabs(func: Callable[[slice], None], shape: tuple, itemsize: int = 4):
+    _slabs = slabs(shape, itemsize)
+    if len(_slabs) <= 1 or int(np.prod(shape, dtype=np.int64)) * itemsize < PARALLEL_MIN_BYTES:
+        for s in _slabs:
+            func(s)
+    else:
+        # list() 用于等待全部完成并抛出子线程中的异常
+        list(get_executor().map(func, _slabs))
+
+
+def rescale_to_uint8(array: np.ndarray, offset: float, scale: float, out: np.ndarray = None) -> np.ndarray:
+    """
+    out = round(clip((array - offset) * scale, 0, 255))，以 float32 分块计算，结果写入预先分配的 uint8 数组
+    """
+    if out is None or out.shape != array.shape or out.dtype != np.uint8:
+        out = np.empty(array.shape, dtype=np.uint8)
+    offset, scale = np.float32(offset), np.float32(scale)
+
+    def _rescale(s: slice):
+        buffer = np.subtract(array[s], offset, dtype=np.float32)
+        np.multiply(buffer, scale, out=buffer)
+        np.clip(buffer, 0, 255, out=buffer)
+        np.rint(buffer, out=buffer)
+        np.copyto(out[s], buffer, casting="unsafe")
+
+    run_slabs(_rescale, array.shape)
+    return out
+
+
+def normalize_to_uint8(array: np.ndarray, amin: float, amax: float, out: np.ndarray = None) -> np.ndarray:
+    """
+    将 [amin, amax] 线性映射到 [0, 255]
+    """
+    scale = 255.0 / (float(amax) - float(amin) + np.finfo(np.float32).eps)
+    return rescale_to_uint8(array, amin, scale, out)
+
+
+def colormap_lut(cmap) -> np.ndarray:
+    """
+    将 matplotlib 颜色图转换为 256×3 的 uint8 查找表，与 cmap(uint8 数组) 的结果一致
+    """
+    rgba = cmap(np.arange(256))
+    return (np.clip(rgba[:, 0:3], 0, 1) * 255).round().astype(np.uint8)
+
+
+def apply_lut(array: np.ndarray, lut: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    对 uint8 数组查表着色，输出 (..., 3) 的 uint8 数组
+    """
+    shape = array.shape + lut.shape[1:]
+    if out is None or out.shape != shape or out.dtype != lut.dtype:
+        out = np.empty(shape, dtype=lut.dtype)
+
+    def _apply(s: slice):
+        np.take(lut, array[s], axis=0, out=out[s])
+
+    run_slabs(_apply, shape, lut.itemsize)
+    return out
+
+
+def native_range(dtype: np.dtype) -> Tuple[float, float]:
+    """
+    数据类型可以表示的取值范围，浮点数不限制
+    """
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return float(info.min), float(info.max)
+    return -np.inf, np.inf
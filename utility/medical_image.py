@@ -1,10 +1,19 @@
-from typing import List, Tuple, Union
+import uuid
+from typing import Dict, List, Tuple, Union
 
 import numpy as np
 import SimpleITK as sitk
 from matplotlib.cm import get_cmap
 
-from utility.common import float_01_to_uint8_0255
+from utility.cache import LRUCache, series_key, spill, unspill
+from utility.frame_timer import stage
+from utility.kernel import apply_lut, colormap_lut, normalize_to_uint8
+from utility.mip import rotating_mip
+from utility.pyramid import ImagePyramid
+from utility.reslice import curved_plane, oblique_plane, to_uint8
+from utility.slab import SlabProjector
+from utility.statistics import ImageStatistics
+from utility.trace import traced
 
 
 class MedicalImage:
@@ -18,6 +27,7 @@ class MedicalImage:
         modality: str,  # PT, CT, NM, OT
         channel: int = None,
         files: Union[List[str], str] = None,
+        statistics: ImageStatistics = None,
     ):
         self.array = array
         self.files = files
@@ -30,32 +40,102 @@ class MedicalImage:
             channel if channel is not None else 1 if len(self.array.shape) == len(self.size) else self.array.shape[-1]
         )
 
+        # 渲染缓存：着色后的切面，所有视图共享
+        self.plane_cache = LRUCache()
+        # 各视图的厚层投影
+        self.projectors: Dict[str, SlabProjector] = {}
+
         # 映射颜色图
+        self.lut: np.ndarray = None
         if self.channel == 1:
             if self.modality == "PT" or self.modality == "NM":
-                self.cmap = get_cmap("binary")
+                self.set_cmap("binary")
             else:  # CT, MR...
-                self.cmap = get_cmap("gray")
+                self.set_cmap("gray")
         elif self.channel == 3:
             self.cmap = None
         else:
             raise Exception(f"not support channel = {self.channel}.")
         assert len(self.size) == 3, f"not support Medical Image's dimension = {len(self.size)}."
 
+        # 强度统计：最小值、最大值、直方图、百分位数
+        self.statistics = statistics if statistics is not None else ImageStatistics.from_array(self.array)
+
+        # 挂起时原始数据换出到本地缓存
+        self.suspended = False
+        self.window: Tuple[float, float] = (None, None)
+        self._spill_key: str = None
+
+        # 多帧采集(如动态 NM)的帧数与帧间隔(ms)，各帧沿 t 方向排列；0 表示不是多帧采集
+        self.frames = 0
+        self.frame_time: float = None
+
         self.array_norm = None
         self.normlize()
 
+    @property
+    def series_key(self) -> str:
+        """
+        序列的唯一标识，用于本地缓存
+        """
+        return series_key(self.files, self.size, self.modality)
+
+    @property
+    def spill_key(self) -> str:
+        if self._spill_key is None:
+            self._spill_key = self.series_key or uuid.uuid4().hex
+        return self._spill_key
+
+    @property
+    def source_key(self):
+        """
+        共享体数据仓库中派生数据的键前缀
+        """
+        return self.spill_key
+
+    def suspend(self):
+        """
+        挂起：原始数据换出为只读 memmap，释放归一化数据、金字塔与渲染缓存
+        """
+        if self.suspended:
+            return
+        self.array = spill(self.array, self.spill_key)
+        self.array_norm = None
+        self.pyramid = None
+        self.plane_cache.clear()
+        self.projectors.clear()
+        self.suspended = True
+
+    def resume(self):
+        """
+        恢复：重新读入原始数据，按挂起前的窗宽窗位归一化
+        """
+        if not self.suspended:
+            return
+        self.array = np.array(self.array)
+        if self.series_key is None:
+            unspill(self.spill_key)
+        self.suspended = False
+        self.normlize(*self.window)
+
+    @traced()
     def normlize(self, amin: float = None, amax: float = None):
         if self.channel == 1 and self.array.size != 0:
             if amin is None:
-                amin = self.array.min()
+                amin = self.statistics.min
             if amax is None:
-                amax = self.array.max()
-            _array = 1.0 * (self.array - amin) / (amax - amin + np.finfo(np.float32).eps)
-            _array = float_01_to_uint8_0255(_array)
+                amax = self.statistics.max
+            self.window = (amin, amax)
+            # 分块、多线程归一化，复用已有的 uint8 缓冲区
+            _out = self.array_norm if self.array_norm is not None and self.array_norm.flags.writeable else None
+            _array = normalize_to_uint8(self.array, amin, amax, _out)
         else:
             _array = self.array
         self.array_norm = _array
+        # 归一化结果改变后重建金字塔，清空渲染缓存
+        self.pyramid = ImagePyramid(self.array_norm)
+        self.plane_cache.clear()
+        self.projectors.clear()
 
     def plane_origin(self, view: str, pos: int):
         """
@@ -72,28 +152,79 @@ class MedicalImage:
         else:
             raise Exception(f"not support view = {view}.")
 
-    def plane(self, view: str, pos: int, cmap: str = None):
+    def plane(self, view: str, pos: int, cmap: str = None, level: int = 0):
         """
         get the normalized plane of Medical Image
         :param view: Sagittal, Coronal, Transverse
         :param pos: the position, range: [1, size]
+        :param level: the pyramid level, 0 is the full resolution
         """
-        _array: np.ndarray = None
-        if view == "s":
-            _array = self.array_norm[:, :, pos - 1, ...]
-        elif view == "c":
-            _array = self.array_norm[:, pos - 1, ...]
-        elif view == "t":
-            _array = self.array_norm[pos - 1, ...]
-        else:
-            raise Exception(f"not support view = {view}.")
-
         if cmap is not None:
-            self.cmap = get_cmap(cmap)
-        if self.cmap is not None:
-            return float_01_to_uint8_0255(self.cmap(_array))
-        else:
-            return _array
+            self.set_cmap(cmap)
+
+        # 计算期间缓存被清空(重新归一化、切换颜色图)时结果不写入缓存
+        generation = self.plane_cache.generation
+        _plane = self.plane_cache.get((view, pos, level))
+        if _plane is not None:
+            return _plane
+
+        with stage("plane"):
+            _array = self.pyramid.plane(view, pos, level)
+        with stage("colormap"):
+            if self.cmap is not None:
+                _array = apply_lut(_array, self.lut)
+            else:
+                _array = np.ascontiguousarray(_array)
+        return self.plane_cache.put((view, pos, level), _array, generation)
+
+    def plane_slab(self, view: str, pos: int, thickness: int, mode: str):
+        """
+        get the normalized thick-slab projection of Medical Image
+        :param view: Sagittal, Coronal, Transverse
+        :param pos: the position of slab center, range: [1, size]
+        :param thickness: the number of slices in slab
+        :param mode: mip, minip, mean
+        """
+        projector = self.projectors.get(view)
+        if projector is None or projector.thickness != thickness or projector.mode != mode:
+            projector = self.projectors[view] = SlabProjector(self.array_norm, view, thickness, mode)
+        _array = projector.project(pos)
+        return apply_lut(_array, self.lut) if self.cmap is not None else _array
+
+    def plane_mip(self, index: int, frames: int):
+        """
+        get the rotating maximum intensity projection of Medical Image, the frames are kept by the player
+        :param index: the frame index, range: [0, frames)
+        :param frames: the number of frames in a full rotation
+        """
+        _array = rotating_mip(self.array_norm, self.spacing, 360.0 * index / frames)
+        return apply_lut(_array, self.lut)
+
+    def plane_oblique(self, view: str, pos: int, angles: Tuple[float, float], level: int = 0):
+        """
+        get the normalized oblique plane of Medical Image
+        :param view: Sagittal, Coronal, Transverse
+        :param pos: the position of base plane, range: [1, size]
+        :param angles: the tilt angles (degree) around the horizontal and vertical axes of base plane
+        :param level: the sampling level, the same as the pyramid level
+        """
+        _array = to_uint8(oblique_plane(self.array_norm, self.spacing, view, pos, angles, level))
+        return apply_lut(_array, self.lut) if self.cmap is not None else _array
+
+    def plane_curved(self, points: np.ndarray, up: Tuple[float, float, float], width: float):
+        """
+        get the normalized curved planar reformation along a polyline
+        :param points: the physical coordinates (x, y, z) of polyline, relative to the first voxel
+        :param up: the lateral sampling direction
+        :param width: the half width (mm) of lateral sampling
+        """
+        _array = to_uint8(curved_plane(self.array_norm, self.spacing, points, up, width))
+        return apply_lut(_array, self.lut) if self.cmap is not None else _array
+
+    def set_cmap(self, cmap: str):
+        self.cmap = get_cmap(cmap)
+        self.lut = colormap_lut(self.cmap)
+        self.plane_cache.clear()
 
     def to_sitk_image(self) -> sitk.Image:
         if self.files is not None:
@@ -1,13 +1,22 @@
-from typing import List, Tuple
+import uuid
+from typing import Dict, List, Tuple
 
 import cv2
 import numpy as np
 import SimpleITK as sitk
 from matplotlib.cm import get_cmap
 
-from .common import float_01_to_uint8_0255
+from .cache import LRUCache, spill, unspill
+from .frame_timer import stage
+from .kernel import apply_lut, colormap_lut, normalize_to_uint8
+from .mip import rotating_mip
 from .medical_image import MedicalImage
-
+from .pyramid import ImagePyramid
+from .reslice import curved_plane, oblique_plane, to_uint8
+from .slab import SlabProjector
+from .statistics import ImageStatistics
+from .trace import traced
+from .volume_store import get_volume_store
 
 class MedicalImage2:
     def __init__(
@@ -19,6 +28,8 @@ class MedicalImage2:
         spacing: Tuple[int, int, int],  # X, Y, Z
         direction: List[int],  # Xx Xy Xz, Yx Yy Yz, Zx Zy Zz
         channel: int,
+        statistics: ImageStatistics = None,
+        statistics_pt: ImageStatistics = None,
     ) -> None:
         self.array = array
         self.array_pt = array_pt
@@ -29,90 +40,196 @@ class MedicalImage2:
         self.modality = "PTCT"
         self.channel = channel
 
+        # 强度统计：最小值、最大值、直方图、百分位数
+        self.statistics = statistics if statistics is not None else ImageStatistics.from_array(self.array)
+        self.statistics_pt = statistics_pt if statistics_pt is not None else ImageStatistics.from_array(self.array_pt)
+
+        # 渲染缓存：融合后的切面，所有视图共享
+        self.plane_cache = LRUCache()
+        # 各视图的厚层投影
+        self.projectors: Dict[str, SlabProjector] = {}
+        self.projectors_pt: Dict[str, SlabProjector] = {}
+
         self.cmap = get_cmap("gray")
         self.cmap_pt = get_cmap("hot")
+        self.lut = colormap_lut(self.cmap)
+        self.lut_pt = colormap_lut(self.cmap_pt)
+
+        # 挂起时原始数据换出到本地缓存
+        self.suspended = False
+        self.window: Tuple[float, float] = (None, None)
+        self.window_pt: float = None
+        self.spill_key = uuid.uuid4().hex
+        # 从共享仓库获取的数组的键，释放时归还；source_key 为派生数据的键前缀，融合时由 CT 与 PET 的序列决定
+        self.store_keys: List[Tuple] = []
+        self.source_key = self.spill_key
 
         self.array_norm = None
         self.array_norm_pt = None
         self.normlize()
         self.normlize_pt()
 
+    def suspend(self):
+        """
+        挂起：CT 与 PET 的原始数据换出为只读 memmap，释放归一化数据、金字塔与渲染缓存
+        """
+        if self.suspended:
+            return
+        self.array = spill(self.array, self.spill_key + "_ct")
+        self.array_pt = spill(self.array_pt, self.spill_key + "_pt")
+        self.array_norm = self.array_norm_pt = None
+        self.pyramid = self.pyramid_pt = None
+        self.plane_cache.clear()
+        self.projectors.clear()
+        self.projectors_pt.clear()
+        # 换出后不再引用共享数组
+        self.release()
+        self.suspended = True
+
+    def release(self):
+        """
+        归还从共享仓库获取的数组，最后一个使用者归还后释放
+        """
+        get_volume_store().release_all(self.store_keys)
+
+    def resume(self):
+        if not self.suspended:
+            return
+        self.array = np.array(self.array)
+        self.array_pt = np.array(self.array_pt)
+        unspill(self.spill_key + "_ct")
+        unspill(self.spill_key + "_pt")
+        self.suspended = False
+        self.normlize(*self.window)
+        self.normlize_pt(self.window_pt)
+
+    @traced()
     def normlize(self, amin: float = None, amax: float = None):
         if self.array.size != 0:
             if amin is None:
-                amin = self.array.min()
+                amin = self.statistics.min
             if amax is None:
-                amax = self.array.max()
-            _array = (self.array - amin) / (amax - amin + np.finfo(np.float32).eps)
+                amax = self.statistics.max
+            self.window = (amin, amax)
+            _out = self.array_norm if self.array_norm is not None and self.array_norm.flags.writeable else None
+            self.array_norm = normalize_to_uint8(self.array, amin, amax, _out)
         else:
-            _array = self.array
-        self.array_norm = float_01_to_uint8_0255(_array)
+            self.array_norm = self.array.astype(np.uint8)
+        self.pyramid = ImagePyramid(self.array_norm)
+        self.plane_cache.clear()
+        self.projectors.clear()
 
+    @traced()
     def normlize_pt(self, amax: float = None):
         if self.array_pt.size != 0:
             if amax is None:
-                amax = self.array_pt.max()
-            _array = self.array_pt / (amax + np.finfo(np.float32).eps)
+                amax = self.statistics_pt.max
+            self.window_pt = amax
+            _out = self.array_norm_pt if self.array_norm_pt is not None and self.array_norm_pt.flags.writeable else None
+            self.array_norm_pt = normalize_to_uint8(self.array_pt, 0.0, amax, _out)
         else:
-            _array = self.array_pt
-        self.array_norm_pt = float_01_to_uint8_0255(_array)
-
-    def plane_ct(self, view: str, pos: int):
-        _array: np.ndarray = None
-        if view == "s":
-            _array = self.array_norm[:, :, pos - 1, ...]
-        elif view == "c":
-            _array = self.array_norm[:, pos - 1, ...]
-        elif view == "t":
-            _array = self.array_norm[pos - 1, ...]
-        else:
-            raise Exception(f"not support view = {view}.")
-        return _array
-
-    def plane_pt(self, view: str, pos: int):
-        _array: np.ndarray = None
-        if view == "s":
-            _array = self.array_norm_pt[:, :, pos - 1, ...]
-        elif view == "c":
-            _array = self.array_norm_pt[:, pos - 1, ...]
-        elif view == "t":
-            _array = self.array_norm_pt[pos - 1, ...]
-        else:
-            raise Exception(f"not support view = {view}.")
-        return _array
+            self.array_norm_pt = self.array_pt.astype(np.uint8)
+        self.pyramid_pt = ImagePyramid(self.array_norm_pt)
+        self.plane_cache.clear()
+        self.projectors_pt.clear()
+
+    def plane_ct(self, view: str, pos: int, level: int = 0):
+        return self.pyramid.plane(view, pos, level)
 
-    def plane(self, view: str, pos: int, cmap_ct: str = None, cmap_pt: str = None):
-        plane_ct = self.plane_ct(view, pos)
-        plane_pt = self.plane_pt(view, pos)
+    def plane_pt(self, view: str, pos: int, level: int = 0):
+        return self.pyramid_pt.plane(view, pos, level)
 
+    def plane(self, view: str, pos: int, cmap_ct: str = None, cmap_pt: str = None, level: int = 0):
         if cmap_ct is not None:
             self.cmap = get_cmap(cmap_ct)
+            self.lut = colormap_lut(self.cmap)
+            self.plane_cache.clear()
         if cmap_pt is not None:
             self.cmap_pt = get_cmap(cmap_pt)
+            self.lut_pt = colormap_lut(self.cmap_pt)
+            self.plane_cache.clear()
+
+        # 计算期间缓存被清空(重新归一化、切换颜色图)时结果不写入缓存
+        generation = self.plane_cache.generation
+        _plane = self.plane_cache.get((view, pos, level))
+        if _plane is not None:
+            return _plane
+
+        with stage("plane"):
+            plane_ct, plane_pt = self.plane_ct(view, pos, level), self.plane_pt(view, pos, level)
+        with stage("colormap"):
+            plane_ct = apply_lut(plane_ct, self.lut)
+            plane_pt = apply_lut(plane_pt, self.lut_pt)
+            _plane = cv2.addWeighted(plane_ct, 0.3, plane_pt, 0.7, 0)
+        return self.plane_cache.put((view, pos, level), _plane, generation)
+
+    def plane_slab(self, view: str, pos: int, thickness: int, mode: str):
+        planes = []
+        for array, projectors, lut in (
+            (self.array_norm, self.projectors, self.lut),
+            (self.array_norm_pt, self.projectors_pt, self.lut_pt),
+        ):
+            projector = projectors.get(view)
+            if projector is None or projector.thickness != thickness or projector.mode != mode:
+                projector = projectors[view] = SlabProjector(array, view, thickness, mode)
+            planes.append(apply_lut(projector.project(pos), lut))
+        return cv2.addWeighted(planes[0], 0.3, planes[1], 0.7, 0)
+
+    def plane_mip(self, index: int, frames: int):
+        # 旋转 MIP 只投影 PET，各帧由播放窗口保存，不占用切面的渲染缓存
+        _array = rotating_mip(self.array_norm_pt, self.spacing, 360.0 * index / frames)
+        return apply_lut(_array, self.lut_pt)
+
+    def plane_oblique(self, view: str, pos: int, angles: Tuple[float, float], level: int = 0):
+        plane_ct = to_uint8(oblique_plane(self.array_norm, self.spacing, view, pos, angles, level))
+        plane_pt = to_uint8(oblique_plane(self.array_norm_pt, self.spacing, view, pos, angles, level))
+        plane_ct = apply_lut(plane_ct, self.lut)
+        plane_pt = apply_lut(plane_pt, self.lut_pt)
+        return cv2.addWeighted(plane_ct, 0.3, plane_pt, 0.7, 0)
 
-        plane_ct = float_01_to_uint8_0255(self.cmap(plane_ct))
-        plane_pt = float_01_to_uint8_0255(self.cmap_pt(plane_pt))
+    def plane_curved(self, points: np.ndarray, up: Tuple[float, float, float], width: float):
+        plane_ct = to_uint8(curved_plane(self.array_norm, self.spacing, points, up, width))
+        plane_pt = to_uint8(curved_plane(self.array_norm_pt, self.spacing, points, up, width))
+        plane_ct = apply_lut(plane_ct, self.lut)
+        plane_pt = apply_lut(plane_pt, self.lut_pt)
         return cv2.addWeighted(plane_ct, 0.3, plane_pt, 0.7, 0)
 
     @staticmethod
+    @traced("MedicalImage2.from_ct_pt")
     def from_ct_pt(ct: MedicalImage, pt: MedicalImage):
-        _ct = ct.to_sitk_image()
-        _pt = pt.to_sitk_image()
-
-        array = sitk.GetArrayFromImage(_ct)
-        size = _ct.GetSize()
-        origin = _ct.GetOrigin()
-        spacing = _ct.GetSpacing()
-        direction = _ct.GetDirection()
+        """
+        融合 CT 与 PET：PET 重采样到 CT 的网格上。CT 数据与重采样结果存放在共享仓库中，
+        同一对序列多次融合时只读取、重采样一次
+        """
+        store = get_volume_store()
+
+        # 读取文件只在共享仓库中不存在时进行，几何信息(大小、原点、间距、方向)与数组一同保存、释放
+        key_ct = (ct.spill_key, "sitk")
+
+        def read_ct() -> Tuple[np.ndarray, tuple]:
+            _ct = ct.to_sitk_image()
+            return sitk.GetArrayFromImage(_ct), (_ct.GetSize(), _ct.GetOrigin(), _ct.GetSpacing(), _ct.GetDirection())
+
+        array, (size, origin, spacing, direction) = store.acquire_with_info(key_ct, read_ct)
         channel = ct.channel
 
         # 重采样进行配准
-        pt_array = sitk.GetImageFromArray(pt.array)
-        pt_array.CopyInformation(_pt)
-        pt_respampled = sitk.Resample(pt_array, _ct)
-        array_pt = sitk.GetArrayFromImage(pt_respampled)
-
-        return MedicalImage2(array, array_pt, size, origin, spacing, direction, channel)
+        def resample() -> np.ndarray:
+            _pt = pt.to_sitk_image()
+            pt_array = sitk.GetImageFromArray(pt.array)
+            pt_array.CopyInformation(_pt)
+            pt_respampled = sitk.Resample(pt_array, size, sitk.Transform(), sitk.sitkLinear, origin, spacing, direction)
+            return sitk.GetArrayFromImage(pt_respampled)
+
+        key_pt = (ct.spill_key, pt.spill_key, "resampled")
+        array_pt = store.acquire(key_pt, resample)
+
+        # CT 未经重采样，可直接复用加载时的统计
+        statistics = ct.statistics if array.shape == ct.array.shape else None
+        image = MedicalImage2(array, array_pt, size, origin, spacing, direction, channel, statistics)
+        image.store_keys = [key_ct, key_pt]
+        image.source_key = (ct.spill_key, pt.spill_key)
+        return image
 
     def to_sitk_image(self) -> Tuple[sitk.Image, sitk.Image]:
         image_ct = sitk.GetImageFromArray(self.array)
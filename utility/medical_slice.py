@@ -5,6 +5,8 @@ import numpy as np
 from pydicom import FileDataset, dcmread
 from pydicom.uid import generate_uid
 
+from .trace import traced
+
 
 class MedicalSlice(object):
     def __init__(self, file: str) -> None:
@@ -58,6 +60,9 @@ class MedicalSlice(object):
             int(dicom.InstanceNumber) if hasattr(dicom, "InstanceNumber") and dicom.InstanceNumber is not None else None
         )
 
+        # 多帧(动态)采集的帧间隔(ms)，例如三时相骨显像的血流相
+        self.frame_time = self.read_frame_time(dicom) if self.__depth > 0 else None
+
     @property
     def study_datetime(self):
         return self.str2datetime(self.__study_date + self.__study_time).strftime("%Y-%m-%d %H:%M:%S")
@@ -78,6 +83,7 @@ class MedicalSlice(object):
     def channel(self):
         return self.__samples_per_pixel
 
+    @traced()
     def convert_array(self, dcm: FileDataset) -> np.ndarray:
         if self.modality == "PT":
             bw = dcm.PatientWeight * 1000
@@ -89,13 +95,42 @@ class MedicalSlice(object):
             actual_activity = float(ris.RadionuclideTotalDose) * (
                 2 ** (-(decay_time) / float(ris.RadionuclideHalfLife))
             )
-            return (dcm.pixel_array * dcm.RescaleSlope + dcm.RescaleIntercept) * bw / actual_activity
+            # SUV 使用 float32 即可，体绘制时不再转换
+            suv = (dcm.pixel_array * dcm.RescaleSlope + dcm.RescaleIntercept) * bw / actual_activity
+            return suv.astype(np.float32)
         else:
             if hasattr(dcm, "RescaleSlope") and hasattr(dcm, "RescaleIntercept"):
-                return dcm.pixel_array * dcm.RescaleSlope + dcm.RescaleIntercept
+                return self.rescale(dcm.pixel_array, float(dcm.RescaleSlope), float(dcm.RescaleIntercept))
             else:
                 return dcm.pixel_array
 
+    @staticmethod
+    def rescale(pixel_array: np.ndarray, slope: float, intercept: float) -> np.ndarray:
+        """
+        斜率与截距均为整数时(CT 通常如此)保持整数类型，取值范围允许时使用 int16，否则使用 float64
+        """
+        if np.issubdtype(pixel_array.dtype, np.integer) and slope.is_integer() and intercept.is_integer():
+            array = pixel_array.astype(np.int32) * int(slope) + int(intercept)
+            info = np.iinfo(np.int16)
+            if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+                return array.astype(np.int16)
+            return array
+        return pixel_array * slope + intercept
+
+    @staticmethod
+    def read_frame_time(dcm: FileDataset) -> float:
+        """
+        帧间隔(ms)：优先使用 FrameTime，其次为 ActualFrameDuration 或 NM 第一个时相的 ActualFrameDuration
+        """
+        if getattr(dcm, "FrameTime", None):
+            return float(dcm.FrameTime)
+        if getattr(dcm, "ActualFrameDuration", None):
+            return float(dcm.ActualFrameDuration)
+        for phase in getattr(dcm, "PhaseInformationSequence", []):
+            if getattr(phase, "ActualFrameDuration", None):
+                return float(phase.ActualFrameDuration)
+        return None
+
     def seconds(self, end_time: str, start_time: str) -> float:
         e, s = self.str2datetime(end_time), self.str2datetime(start_time)
         return (e - s).total_seconds()
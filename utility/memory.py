@@ -0,0 +1,123 @@
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .cache import LRUCache
+from .pyramid import ImagePyramid
+
+
+def rss() -> int:
+    """
+    当前进程的常驻内存(字节)，优先使用 psutil，否则读取 /proc/self/statm，均不可用时返回 0
+    """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _base(array: np.ndarray) -> np.ndarray:
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+class MemoryCounter:
+    """
+    按名称累计字节数，同一块内存(视图共享的底层缓冲区、vtk 对象)只计算一次
+    """
+
+    def __init__(self) -> None:
+        self.seen = set()
+        self.items: Dict[str, int] = {}
+
+    def add(self, name: str, nbytes: int, key=None):
+        if key is not None:
+            if key in self.seen:
+                return
+            self.seen.add(key)
+        self.items[name] = self.items.get(name, 0) + int(nbytes)
+
+    def add_array(self, name: str, array: np.ndarray):
+        if isinstance(array, np.ndarray):
+            base = _base(array)
+            # memmap 的数据不占用常驻内存
+            if not isinstance(base, np.memmap):
+                self.add(name, base.nbytes, id(base))
+
+    def add_pyramid(self, name: str, pyramid: ImagePyramid):
+        if pyramid is not None:
+            for array, built in list(pyramid.levels.values()):
+                self.add_array(name, array)
+                self.add_array(name, built)
+
+    def add_cache(self, name: str, cache: LRUCache):
+        if cache is not None:
+            for array in list(cache.items.values()):
+                self.add_array(name, array)
+
+    def add_vtk(self, name: str, obj):
+        """
+        vtkVolume/vtkActor：统计映射器输入数据的实际内存，零拷贝导入的数据按 numpy 数组统计
+        """
+        if obj is None:
+            return
+        mapper = obj.GetMapper() if hasattr(obj, "GetMapper") else obj
+        data = mapper.GetInput() if hasattr(mapper, "GetInput") else None
+        if getattr(data, "numpy_array", None) is not None:
+            self.add_array(name, data.numpy_array)
+        elif data is not None:
+            self.add_data(name, data)
+
+    def add_data(self, name: str, data):
+        """
+        vtkDataObject：按实际内存统计，被多个对象引用(如缓存的等值面网格)时只计算一次
+        """
+        self.add(name, data.GetActualMemorySize() * 1024, ("vtk", data.GetAddressAsString("vtkObject")))
+
+    def add_image(self, name: str, image):
+        """
+        MedicalImage/MedicalImage2 的原始数据、归一化数据、金字塔、渲染缓存与厚层投影
+        """
+        if image is None:
+            return
+        for attr in ("array", "array_pt"):
+            self.add_array(f"{name}.{attr}", getattr(image, attr, None))
+        for attr in ("array_norm", "array_norm_pt"):
+            self.add_array(f"{name}.{attr}", getattr(image, attr, None))
+        for attr in ("pyramid", "pyramid_pt"):
+            self.add_pyramid(f"{name}.{attr}", getattr(image, attr, None))
+        self.add_cache(f"{name}.plane_cache", getattr(image, "plane_cache", None))
+        for attr in ("projectors", "projectors_pt"):
+            for projector in getattr(image, attr, {}).values():
+                self.add_array(f"{name}.{attr}", projector.state)
+
+    @property
+    def total(self) -> int:
+        return sum(self.items.values())
+
+    def lines(self) -> List[str]:
+        return [f"{name:<40} {format_bytes(nbytes):>10}" for name, nbytes in sorted(self.items.items())]
+
+
+def format_bytes(nbytes: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(nbytes) < 1024:
+            return f"{nbytes:.1f} {unit}" if unit != "B" else f"{nbytes} B"
+        nbytes /= 1024.0
+    return f"{nbytes:.1f} GB"
+
+
+def images_bytes(images: Iterable) -> MemoryCounter:
+    counter = MemoryCounter()
+    for i, image in enumerate(images):
+        counter.add_image(f"image{i}", image)
+    return counter
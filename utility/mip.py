@@ -0,0 +1,45 @@
+import math
+from typing import Sequence
+
+import cv2
+import numpy as np
+
+# 每次投影的层数，限制中间结果的内存
+CHUNK_SLICES = 32
+
+
+def rotating_mip(array: np.ndarray, spacing: Sequence[float], angle: float, n: int = None) -> np.ndarray:
+    """
+    绕体数据的 z 轴旋转 angle (度) 后沿前后方向的最大密度投影，angle 为 0 时与冠状面方向相同。
+    射线按最小体素间距采样、取最近邻体素，返回大小为 (Z', n) 的 uint8 数组，Z' 已按物理比例缩放
+    :param array: 归一化后的体数据 (Z, Y, X)，uint8
+    :param spacing: 体素间距 (x, y, z)
+    :param n: 投影宽度与射线采样数，默认为横截面对角线长度，保证所有角度的输出大小一致
+    """
+    d, h, w = array.shape
+    sx, sy, sz = spacing
+    step = min(sx, sy)
+    if n is None:
+        n = int(math.ceil(math.hypot(w * sx, h * sy) / step))
+
+    # 投影平面上的列与射线上的采样点，以横截面中心为原点的物理坐标
+    a = math.radians(angle)
+    offsets = (np.arange(n, dtype=np.float32) - (n - 1) / 2.0) * step
+    u, t = offsets[None, :], offsets[:, None]
+    x = (u * math.cos(a) - t * math.sin(a)) / sx + (w - 1) / 2.0
+    y = (u * math.sin(a) + t * math.cos(a)) / sy + (h - 1) / 2.0
+    x, y = np.floor(x + 0.5).astype(np.intp), np.floor(y + 0.5).astype(np.intp)
+    # 体数据之外的采样点指向补零的一列
+    index = np.where((x >= 0) & (x < w) & (y >= 0) & (y < h), y * w + x, h * w)
+
+    out = np.empty((d, n), dtype=np.uint8)
+    flat = np.zeros((min(d, CHUNK_SLICES), h * w + 1), dtype=np.uint8)
+    for z0 in range(0, d, CHUNK_SLICES):
+        z1 = min(z0 + CHUNK_SLICES, d)
+        flat[: z1 - z0, : h * w] = array[z0:z1].reshape(z1 - z0, h * w)
+        np.max(flat[: z1 - z0, index], axis=1, out=out[z0:z1])
+
+    height = max(int(round(d * sz / step)), 1)
+    if height != d:
+        out = cv2.resize(out, (n, height), interpolation=cv2.INTER_LINEAR)
+    return out
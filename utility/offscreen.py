@@ -0,0 +1,256 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+from vtkmodules.util.numpy_support import vtk_to_numpy
+from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow, vtkWindowToImageFilter
+
+from .common import BBoxLayer, get_colors, json_to_labels, look_at, nifti_to_labels, volume_ct, volume_pt
+from .io import read_nifti
+from .medical_image2 import MedicalImage2
+from .trace import traced
+from .transfer_function import DEFAULT_PRESETS
+from .volume_mapper import MapperConfig, get_mapper_config
+
+# 每个任务渲染的帧数，同一相机路径的帧分给多个进程
+CHUNK_FRAMES = 12
+
+
+class Study:
+    """
+    离屏渲染的一个检查：CT、PET(可同时提供，进行融合)、标注框文件(nifti 或 json)与传递函数预设
+    """
+
+    def __init__(
+        self, name: str, ct: str = None, pt: str = None, labels: str = None, presets: Dict[str, str] = None
+    ) -> None:
+        assert ct is not None or pt is not None, f"study {name} has neither CT nor PET."
+        self.name = name
+        self.ct = ct
+        self.pt = pt
+        self.labels = labels
+        self.presets = dict(DEFAULT_PRESETS, **(presets or {}))
+
+    def load(self):
+        """
+        读取图像与标注框，返回图像与 [(point1, point2, text, color), ...]
+        """
+        images = []
+        for path, modality in ((self.ct, "CT"), (self.pt, "PT")):
+            if path is not None:
+                image = read_nifti(path, True)
+                image.modality = modality
+                images.append(image)
+        image = MedicalImage2.from_ct_pt(*images) if len(images) == 2 else images[0]
+
+        boxes = []
+        if self.labels is not None:
+            if self.labels.endswith(".json"):
+                classes, labels = json_to_labels(self.labels)
+            else:
+                classes, labels = nifti_to_labels(self.labels)
+            if classes:
+                # 颜色带有随机的亮度，固定随机数种子，保证各进程渲染的同一检查颜色一致
+                unique_classes = sorted(set(classes))
+                state = np.random.get_state()
+                np.random.seed(66)
+                c2c = {c1: c2 for c1, c2 in zip(unique_classes, get_colors(len(unique_classes)))}
+                np.random.set_state(state)
+                boxes = [(l[0:3], l[3:6], c, c2c[c]) for c, l in zip(classes, labels)]
+        return image, boxes
+
+
+class CameraPath:
+    """
+    相机路径：从前方对准体数据后，每一帧绕竖直轴旋转 azimuth 度、俯仰 elevation 度并缩放 zoom 倍；
+    video 为 True 时按 fps 合成视频，否则只保存图片
+    """
+
+    def __init__(
+        self,
+        name: str,
+        azimuths: Sequence[float],
+        elevation: float = 0.0,
+        zoom: float = 1.0,
+        video: bool = False,
+        fps: int = 24,
+    ) -> None:
+        self.name = name
+        self.azimuths = list(azimuths)
+        self.elevation = elevation
+        self.zoom = zoom
+        self.video = video
+        self.fps = fps
+
+    @staticmethod
+    def turntable(frames: int = 72, elevation: float = 15.0, fps: int = 24, name: str = "turntable") -> "CameraPath":
+        return CameraPath(name, np.linspace(0.0, 360.0, frames, endpoint=False), elevation, video=True, fps=fps)
+
+    @staticmethod
+    def snapshots(azimuths: Sequence[float] = (0, 90, 180, 270), elevation: float = 0.0, name: str = "snapshot"):
+        return CameraPath(name, azimuths, elevation)
+
+    def __len__(self) -> int:
+        return len(self.azimuths)
+
+
+# 每个进程最近一次使用的场景，同一检查的后续任务直接复用
+_scene: tuple = None
+
+
+def build_scene(study: Study, size: Tuple[int, int], config: MapperConfig):
+    """
+    创建离屏渲染窗口，加入体数据与标注框；没有显示器时需要 vtk 的 OSMesa/EGL 版本(软件 OpenGL 即可)
+    """
+    image, boxes = study.load()
+    origin = [-0.5 * s1 * s2 for s1, s2 in zip(image.size, image.spacing)]
+
+    renderer = vtkRenderer()
+    window = vtkRenderWindow()
+    window.SetOffScreenRendering(1)
+    window.SetSize(*size)
+    window.AddRenderer(renderer)
+    if image.modality in ("CT", "PTCT"):
+        renderer.AddVolume(volume_ct(image.array, origin, image.spacing, config=config, preset=study.presets["CT"]))
+    if image.modality == "PT":
+        renderer.AddVolume(volume_pt(image.array, origin, image.spacing, config=config, preset=study.presets["PT"]))
+    elif image.modality == "PTCT":
+        renderer.AddVolume(volume_pt(image.array_pt, origin, image.spacing, config=config, preset=study.presets["PT"]))
+    if boxes:
+        BBoxLayer(boxes, origin, image.spacing, 0.8).add_to(renderer)
+    return image, renderer, window
+
+
+def capture(window: vtkRenderWindow) -> np.ndarray:
+    """
+    读取渲染窗口的图像，返回 (H, W, 3) 的 RGB uint8 数组
+    """
+    grabber = vtkWindowToImageFilter()
+    grabber.SetInput(window)
+    grabber.SetInputBufferTypeToRGB()
+    grabber.ReadFrontBufferOff()
+    grabber.Update()
+    output = grabber.GetOutput()
+    w, h, _ = output.GetDimensions()
+    array = vtk_to_numpy(output.GetPointData().GetScalars()).reshape(h, w, -1)
+    # vtk 的图像原点在左下角
+    return np.ascontiguousarray(array[::-1, :, :3])
+
+
+def frame_file(directory: str, path: CameraPath, index: int) -> str:
+    return os.path.join(directory, f"{path.name}_{index:04d}.png")
+
+
+@traced()
+def render_frames(
+    study: Study, path: CameraPath, indices: List[int], directory: str, size: Tuple[int, int], config: MapperConfig
+) -> List[str]:
+    """
+    在当前进程中渲染相机路径的若干帧并保存为 png，返回文件路径
+    """
+    global _scene
+    if _scene is None or _scene[0] != (study.name, tuple(size)):
+        if _scene is not None:
+            _scene[-1].Finalize()
+        _scene = ((study.name, tuple(size)), *build_scene(study, size, config))
+    _, image, renderer, window = _scene
+
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    camera = renderer.GetActiveCamera()
+    for i in indices:
+        look_at(camera, image.size, image.spacing)
+        camera.Azimuth(path.azimuths[i])
+        camera.Elevation(path.elevation)
+        camera.OrthogonalizeViewUp()
+        camera.Zoom(path.zoom)
+        renderer.ResetCameraClippingRange()
+        window.Render()
+        file = frame_file(directory, path, i)
+        cv2.imwrite(file, cv2.cvtColor(capture(window), cv2.COLOR_RGB2BGR))
+        files.append(file)
+    return files
+
+
+def write_video(files: List[str], file: str, fps: int):
+    writer = None
+    for f in files:
+        frame = cv2.imread(f, cv2.IMREAD_COLOR)
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(file, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        writer.write(frame)
+    if writer is not None:
+        writer.release()
+
+
+def render_batch(
+    studies: List[Study],
+    paths: List[CameraPath],
+    output: str,
+    size: Tuple[int, int] = (800, 800),
+    workers: int = None,
+    config: MapperConfig = None,
+) -> Dict[Tuple[str, str], List[str]]:
+    """
+    离屏批量渲染：每个检查按每条相机路径渲染，帧按 CHUNK_FRAMES 分块后交给进程池，
+    结果保存在 output/检查名称/ 下，需要视频的路径在所有帧完成后合成 mp4。
+    workers 为 0 时在当前进程中渲染
+    :return {(检查名称, 路径名称): [图片或视频文件, ...]}
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    config = config if config is not None else get_mapper_config()
+    # 进程之间平分 CPU，避免映射器的线程过多
+    config = config.replace(threads=max((os.cpu_count() or 1) // max(workers, 1), 1))
+
+    tasks = []
+    for study in studies:
+        directory = os.path.join(output, study.name)
+        for path in paths:
+            for i in range(0, len(path), CHUNK_FRAMES):
+                indices = list(range(i, min(i + CHUNK_FRAMES, len(path))))
+                tasks.append(((study.name, path.name), (study, path, indices, directory, size, config)))
+
+    t0 = time.perf_counter()
+    files: Dict[Tuple[str, str], List[str]] = {}
+    # 某个检查渲染失败时跳过该检查与路径，不影响其他任务
+    failed = set()
+
+    def collect(key: Tuple[str, str], result):
+        try:
+            files.setdefault(key, []).extend(result())
+        except Exception as e:
+            if key not in failed:
+                print(f"[WARNING] offscreen: {key[0]}/{key[1]} failed: {e!r}")
+            failed.add(key)
+
+    if workers == 0:
+        for key, args in tasks:
+            collect(key, lambda: render_frames(*args))
+    else:
+        # vtk 与 OpenGL 上下文不能安全地 fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [(key, executor.submit(render_frames, *args)) for key, args in tasks]
+            for key, future in futures:
+                collect(key, future.result)
+
+    n = sum(len(f) for f in files.values())
+    elapsed = time.perf_counter() - t0
+    print(f"[INFO] offscreen: {n} frames in {elapsed:.1f} s ({n / max(elapsed, 1e-6):.1f} frames/s).")
+
+    results = {}
+    for study in studies:
+        for path in paths:
+            key = (study.name, path.name)
+            results[key] = files.get(key, []) if key not in failed else []
+            if path.video and results[key]:
+                video = os.path.join(output, study.name, f"{path.name}.mp4")
+                write_video(results[key], video, path.fps)
+                results[key] = [video]
+                print(f"[INFO] offscreen: {video}.")
+    return results
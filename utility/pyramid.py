@@ -0,0 +1,100 @@
+import math
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def downsample2d(plane: np.ndarray) -> np.ndarray:
+    """
+    2×2 均值降采样，支持 (H, W) 与 (H, W, C) 的 uint8 数组
+    """
+    h, w = plane.shape[0] // 2 * 2, plane.shape[1] // 2 * 2
+    p = plane[:h, :w].astype(np.uint16)
+    out = p[0::2, 0::2] + p[1::2, 0::2]
+    out += p[0::2, 1::2]
+    out += p[1::2, 1::2]
+    out += 2
+    out >>= 2
+    return out.astype(np.uint8)
+
+
+class ImagePyramid:
+    """
+    多分辨率金字塔：第 k 层在切面内的两个方向上各缩小 2^k 倍，沿视图方向保持原始层数。
+    每个视图、每一层按切面懒加载，只有被请求过的切面才会计算。
+    """
+
+    MIN_SIZE = 32
+
+    def __init__(self, array: np.ndarray) -> None:
+        self.array = array
+        self.lock = threading.Lock()
+        self.levels: Dict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def take(array: np.ndarray, view: str, index: int) -> np.ndarray:
+        if view == "s":
+            return array[:, :, index, ...]
+        elif view == "c":
+            return array[:, index, ...]
+        elif view == "t":
+            return array[index, ...]
+        else:
+            raise Exception(f"not support view = {view}.")
+
+    def plane_shape(self, view: str, level: int = 0) -> Tuple[int, int]:
+        """
+        切面在第 level 层的大小 (H, W)
+        """
+        h, w = self.take(self.array, view, 0).shape[0:2]
+        for _ in range(level):
+            h, w = h // 2, w // 2
+        return h, w
+
+    def max_level(self, view: str) -> int:
+        if self.array.dtype != np.uint8 or self.array.size == 0:
+            return 0
+        h, w = self.plane_shape(view)
+        return max(int(math.log2(min(h, w) / self.MIN_SIZE)), 0) if min(h, w) > self.MIN_SIZE else 0
+
+    def level_for_scale(self, view: str, scale: float) -> int:
+        """
+        根据显示缩放倍数(屏幕像素/体素)选择金字塔层：第 k 层的分辨率不低于屏幕分辨率
+        """
+        if scale <= 0 or scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / scale))), self.max_level(view))
+
+    def plane(self, view: str, pos: int, level: int = 0) -> np.ndarray:
+        """
+        :param view: Sagittal, Coronal, Transverse
+        :param pos: the position, range: [1, size]
+        :param level: 金字塔层，0 为原始分辨率
+        """
+        level = min(level, self.max_level(view))
+        if level == 0:
+            return self.take(self.array, view, pos - 1)
+        with self.lock:
+            array, built = self._level(view, level)
+            built_ = built[pos - 1]
+        if not built_:
+            _plane = downsample2d(self.plane(view, pos, level - 1))
+            with self.lock:
+                self.take(array, view, pos - 1)[...] = _plane
+                built[pos - 1] = True
+        return self.take(array, view, pos - 1)
+
+    def _level(self, view: str, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        if (view, level) not in self.levels:
+            h, w = self.plane_shape(view, level)
+            shape = list(self.array.shape)
+            axes = {"s": (0, 1), "c": (0, 2), "t": (1, 2)}[view]
+            shape[axes[0]], shape[axes[1]] = h, w
+            depth = self.array.shape[{"s": 2, "c": 1, "t": 0}[view]]
+            self.levels[(view, level)] = (np.empty(shape, dtype=np.uint8), np.zeros(depth, dtype=bool))
+        return self.levels[(view, level)]
+
+    def clear(self):
+        with self.lock:
+            self.levels.clear()
@@ -0,0 +1,201 @@
+import math
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# 视图 -> (行方向, 列方向, 法线方向)，以 x, y, z 的序号表示
+VIEW_TO_AXES = {"s": (2, 1, 0), "c": (2, 0, 1), "t": (1, 0, 2)}
+
+
+def trilinear(array: np.ndarray, coords: np.ndarray, fill: float = 0) -> np.ndarray:
+    """
+    向量化的三线性插值，只读取采样点周围的体素
+    :param array: 体数据 (Z, Y, X) 或 (Z, Y, X, C)
+    :param coords: 体素坐标 (3, ...)，顺序为 z, y, x
+    :param fill: 体数据范围之外的值
+    :return: 形状为 coords.shape[1:] (+ (C,)) 的 float32 数组
+    """
+    shape = array.shape[0:3]
+    sample_shape = coords.shape[1:]
+    coords = coords.reshape(3, -1)
+
+    valid = np.ones(coords.shape[1], dtype=bool)
+    for i in range(3):
+        valid &= (coords[i] >= 0) & (coords[i] <= shape[i] - 1)
+    index = np.flatnonzero(valid)
+    out = np.full((coords.shape[1],) + array.shape[3:], fill, dtype=np.float32)
+    if len(index) == 0:
+        return out.reshape(sample_shape + array.shape[3:])
+
+    z, y, x = (coords[i, index] for i in range(3))
+    z0, y0, x0 = (np.minimum(np.floor(c).astype(np.intp), max(n - 2, 0)) for c, n in zip((z, y, x), shape))
+    z1, y1, x1 = (np.minimum(c0 + 1, n - 1) for c0, n in zip((z0, y0, x0), shape))
+    fz, fy, fx = ((c - c0).astype(np.float32) for c, c0 in zip((z, y, x), (z0, y0, x0)))
+    if array.ndim == 4:
+        fz, fy, fx = fz[:, None], fy[:, None], fx[:, None]
+
+    def lerp(a, b, f):
+        return a + (b - a) * f
+
+    c00 = lerp(array[z0, y0, x0].astype(np.float32), array[z0, y0, x1], fx)
+    c01 = lerp(array[z0, y1, x0].astype(np.float32), array[z0, y1, x1], fx)
+    c10 = lerp(array[z1, y0, x0].astype(np.float32), array[z1, y0, x1], fx)
+    c11 = lerp(array[z1, y1, x0].astype(np.float32), array[z1, y1, x1], fx)
+    out[index] = lerp(lerp(c00, c01, fy), lerp(c10, c11, fy), fz)
+    return out.reshape(sample_shape + array.shape[3:])
+
+
+def to_voxel(points: np.ndarray, spacing: Sequence[float]) -> np.ndarray:
+    """
+    物理坐标 (x, y, z, ...) -> 体素坐标 (z, y, x, ...)
+    """
+    return np.stack([points[2] / spacing[2], points[1] / spacing[1], points[0] / spacing[0]])
+
+
+def rotation(axis: np.ndarray, angle: float) -> np.ndarray:
+    """
+    绕单位向量 axis 旋转 angle (度) 的旋转矩阵
+    """
+    a = math.radians(angle)
+    x, y, z = axis
+    c, s = math.cos(a), math.sin(a)
+    return np.array(
+        [
+            [c + x * x * (1 - c), x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+            [y * x * (1 - c) + z * s, c + y * y * (1 - c), y * z * (1 - c) - x * s],
+            [z * x * (1 - c) - y * s, z * y * (1 - c) + x * s, c + z * z * (1 - c)],
+        ]
+    )
+
+
+class ObliquePlane:
+    """
+    斜切面的几何：以轴向切面为基准、绕切面中心倾斜，切面像素 (行, 列) 以原始分辨率(第 0 层)计，
+    与物理坐标 (x, y, z) 相互映射，用于十字线与像素值读取
+    """
+
+    def __init__(
+        self,
+        size: Sequence[int],
+        spacing: Sequence[float],
+        view: str,
+        pos: int,
+        angles: Tuple[float, float],
+    ) -> None:
+        """
+        :param size: 体数据大小 (X, Y, Z)
+        :param view: Sagittal, Coronal, Transverse
+        :param pos: 基准切面的位置, range: [1, size]
+        :param angles: (绕水平方向旋转的角度, 绕竖直方向旋转的角度)，单位为度
+        """
+        self.row, self.col, self.normal = VIEW_TO_AXES[view]
+        self.h, self.w = size[self.row], size[self.col]
+        self.spacing = np.asarray(spacing, dtype=np.float64)
+
+        # 基准切面的方向向量
+        u, v = np.eye(3)[self.col], np.eye(3)[self.row]
+        r = rotation(v, angles[1]) @ rotation(u, angles[0])
+        self.u, self.v = r @ u, r @ v
+
+        # 切面中心的物理坐标
+        self.center = np.array([(size[i] - 1) / 2.0 * spacing[i] for i in range(3)])
+        self.center[self.normal] = (pos - 1) * spacing[self.normal]
+
+    def to_point(self, row: float, col: float) -> np.ndarray:
+        """
+        切面像素 (行, 列) -> 物理坐标 (x, y, z)
+        """
+        dr = (row - (self.h - 1) / 2.0) * self.spacing[self.row]
+        dc = (col - (self.w - 1) / 2.0) * self.spacing[self.col]
+        return self.center + self.v * dr + self.u * dc
+
+    def from_point(self, point: Sequence[float]) -> Tuple[float, float]:
+        """
+        物理坐标 -> 切面上行、列方向的坐标与之相同的点 (行, 列)，即该点所在的两个轴向切面与斜切面的交点；
+        斜切面与其中一个轴向切面平行时取该点在斜切面上的投影
+        """
+        d = np.asarray(point, dtype=np.float64) - self.center
+        sr, sc = self.spacing[self.row], self.spacing[self.col]
+        a = np.array([[self.v[self.row] * sr, self.u[self.row] * sc], [self.v[self.col] * sr, self.u[self.col] * sc]])
+        if abs(np.linalg.det(a)) > 1e-6 * sr * sc:
+            dr, dc = np.linalg.solve(a, d[[self.row, self.col]])
+        else:
+            dr, dc = d @ self.v / sr, d @ self.u / sc
+        return dr + (self.h - 1) / 2.0, dc + (self.w - 1) / 2.0
+
+    def crosshair(self) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        """
+        十字线的方向 (行, 列)：与列方向、行方向的轴向切面的交线，切面与轴向切面平行时方向为 0
+        """
+        sr, sc = self.spacing[self.row], self.spacing[self.col]
+        vertical = (self.u[self.col] * sc, -self.v[self.col] * sr)
+        horizontal = (self.u[self.row] * sc, -self.v[self.row] * sr)
+        return vertical, horizontal
+
+
+def oblique_plane(
+    array: np.ndarray,
+    spacing: Sequence[float],
+    view: str,
+    pos: int,
+    angles: Tuple[float, float],
+    level: int = 0,
+    fill: float = 0,
+) -> np.ndarray:
+    """
+    以轴向切面为基准、绕切面中心倾斜得到的斜切面，level 为 0 时输出大小与轴向切面相同
+    :param view: Sagittal, Coronal, Transverse
+    :param pos: 基准切面的位置, range: [1, size]
+    :param angles: (绕水平方向旋转的角度, 绕竖直方向旋转的角度)，单位为度
+    :param level: 与金字塔层对应，每隔 2^level 个体素采样一次
+    """
+    size = (array.shape[2], array.shape[1], array.shape[0])  # X, Y, Z
+    plane = ObliquePlane(size, spacing, view, pos, angles)
+    h, w = plane.h, plane.w
+
+    f = 2**level
+    rows = ((np.arange(h // f) * f + (f - 1) / 2.0 - (h - 1) / 2.0) * spacing[plane.row]).astype(np.float32)
+    cols = ((np.arange(w // f) * f + (f - 1) / 2.0 - (w - 1) / 2.0) * spacing[plane.col]).astype(np.float32)
+    center, u, v = plane.center.astype(np.float32), plane.u.astype(np.float32), plane.v.astype(np.float32)
+    points = center[:, None, None] + v[:, None, None] * rows[None, :, None] + u[:, None, None] * cols[None, None, :]
+    return trilinear(array, to_voxel(points, spacing), fill)
+
+
+def curved_plane(
+    array: np.ndarray,
+    spacing: Sequence[float],
+    points: np.ndarray,
+    up: Sequence[float],
+    width: float,
+    step: float = None,
+    fill: float = 0,
+) -> np.ndarray:
+    """
+    沿折线的曲面重建(CPR)：行沿折线方向展开，列沿 up 方向(与折线切向正交化后)采样
+    :param points: 折线顶点的物理坐标 (N, 3)，顺序为 x, y, z
+    :param up: 横向采样方向 (x, y, z)
+    :param width: 横向半宽，单位 mm
+    :param step: 采样间距，单位 mm，默认为最小体素间距
+    """
+    points = np.asarray(points, dtype=np.float64)
+    step = step if step is not None else min(spacing)
+
+    # 按弧长等间距重采样折线
+    lengths = np.r_[0.0, np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))]
+    arc = np.arange(0.0, lengths[-1] + step * 0.5, step)
+    samples = np.stack([np.interp(arc, lengths, points[:, i]) for i in range(3)], axis=1)
+
+    # 每个采样点的切向量与正交化的横向向量
+    tangent = np.gradient(samples, axis=0) if len(samples) > 1 else np.zeros_like(samples)
+    tangent /= np.linalg.norm(tangent, axis=1, keepdims=True) + 1e-12
+    up = np.asarray(up, dtype=np.float64)
+    lateral = up[None, :] - (tangent @ up)[:, None] * tangent
+    lateral /= np.linalg.norm(lateral, axis=1, keepdims=True) + 1e-12
+
+    offsets = np.arange(-width, width + step * 0.5, step)
+    grid = samples.T[:, :, None] + lateral.T[:, :, None] * offsets[None, None, :]
+    return trilinear(array, to_voxel(grid, spacing), fill)
+
+
+def to_uint8(array: np.ndarray) -> np.ndarray:
+    return np.rint(np.clip(array, 0, 255, out=array), out=array).astype(np.uint8)
@@ -0,0 +1,103 @@
+from typing import Tuple
+
+import numpy as np
+
+from .pyramid import ImagePyramid
+
+# 视图方向对应的数组轴
+VIEW_TO_AXIS = {"s": 2, "c": 1, "t": 0}
+
+
+class SlabProjector:
+    """
+    沿视图方向的厚层投影：最大密度投影(MIP)、最小密度投影(MinIP)、平均(mean)。
+    逐层滚动时增量更新：平均值维护滑动窗口的累加和；MIP/MinIP 只对移出层恰好是极值的像素重新计算。
+    """
+
+    MODES = ("mip", "minip", "mean")
+
+    def __init__(self, array: np.ndarray, view: str, thickness: int, mode: str) -> None:
+        if mode not in self.MODES:
+            raise Exception(f"not support slab mode = {mode}.")
+        self.array = array
+        self.view = view
+        self.thickness = max(int(thickness), 1)
+        self.mode = mode
+        self.depth = array.shape[VIEW_TO_AXIS[view]]
+
+        self.window: Tuple[int, int] = None
+        self.state: np.ndarray = None
+
+    def plane(self, index: int) -> np.ndarray:
+        return ImagePyramid.take(self.array, self.view, index)
+
+    def window_of(self, pos: int) -> Tuple[int, int]:
+        """
+        以 pos 为中心、厚度为 thickness 的层范围 [lo, hi)
+        """
+        hi = min(max(pos - 1 - self.thickness // 2, 0) + self.thickness, self.depth)
+        return max(hi - self.thickness, 0), hi
+
+    def project(self, pos: int) -> np.ndarray:
+        """
+        :param pos: the position, range: [1, size]
+        :return: 投影结果，uint8
+        """
+        lo, hi = self.window_of(pos)
+        if self.window is None or abs(lo - self.window[0]) > 1 or abs(hi - self.window[1]) > 1:
+            self.full(lo, hi)
+        elif (lo, hi) != self.window:
+            self.shift(lo, hi)
+        self.window = (lo, hi)
+
+        if self.mode == "mean":
+            return ((self.state + (hi - lo) // 2) // (hi - lo)).astype(np.uint8)
+        return self.state
+
+    def full(self, lo: int, hi: int):
+        if self.mode == "mean":
+            self.state = np.zeros(self.plane(lo).shape, dtype=np.uint32)
+            for i in range(lo, hi):
+                self.state += self.plane(i)
+        else:
+            reduce = np.maximum if self.mode == "mip" else np.minimum
+            self.state = self.plane(lo).copy()
+            for i in range(lo + 1, hi):
+                reduce(self.state, self.plane(i), out=self.state)
+
+    def shift(self, lo: int, hi: int):
+        _lo, _hi = self.window
+        leaving = [i for i in range(_lo, _hi) if not lo <= i < hi]
+        entering = [i for i in range(lo, hi) if not _lo <= i < _hi]
+
+        if self.mode == "mean":
+            for i in leaving:
+                self.state -= self.plane(i)
+            for i in entering:
+                self.state += self.plane(i)
+            return
+
+        if self.mode == "mip":
+            reduce, stale = np.maximum, np.greater_equal
+        else:
+            reduce, stale = np.minimum, np.less_equal
+        # 移出层中恰好为极值的像素需要在新窗口内重新计算
+        mask = np.zeros(self.state.shape, dtype=bool)
+        for i in leaving:
+            mask |= stale(self.plane(i), self.state)
+        for i in entering:
+            reduce(self.state, self.plane(i), out=self.state)
+        if mask.any():
+            self.state[mask] = self.reduce_pixels(mask, lo, hi, reduce)
+
+    def reduce_pixels(self, mask: np.ndarray, lo: int, hi: int, reduce) -> np.ndarray:
+        # 只读取被标记像素在窗口内的体素
+        r, c = np.nonzero(mask)
+        d = np.arange(lo, hi)[:, None]
+        if self.view == "t":
+            values = self.array[d, r[None, :], c[None, :]]
+        elif self.view == "c":
+            values = self.array[r[None, :], d, c[None, :]]
+        else:
+            values = self.array[r[None, :], c[None, :], d]
+        return reduce.reduce(values, axis=0)
@@ -0,0 +1,120 @@
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+
+class ImageStatistics:
+    """
+    影像的强度统计索引：最小值、最大值、直方图以及常用百分位数。
+    在加载时计算一次，之后的自动窗口、百分位窗口与直方图显示都直接查询，无需再次扫描整个体数据。
+    """
+
+    BINS = 4096
+    PERCENTILES = (0.1, 0.5, 1.0, 5.0, 50.0, 95.0, 99.0, 99.5, 99.9)
+
+    def __init__(self, amin: float, amax: float, histogram: np.ndarray, edges: np.ndarray) -> None:
+        self.min = float(amin)
+        self.max = float(amax)
+        self.histogram = histogram
+        self.edges = edges
+        self._cdf = np.cumsum(histogram, dtype=np.float64)
+        self.percentiles: Dict[float, float] = {p: self._percentile(p) for p in self.PERCENTILES}
+
+    @property
+    def count(self) -> int:
+        return int(self._cdf[-1]) if len(self._cdf) != 0 else 0
+
+    def percentile(self, q: float) -> float:
+        """
+        根据累积直方图估计百分位数，精度为一个直方图区间
+        :param q: 百分位，范围：[0, 100]
+        """
+        if q in self.percentiles:
+            return self.percentiles[q]
+        return self._percentile(q)
+
+    def _percentile(self, q: float) -> float:
+        if self.count == 0:
+            return self.min
+        target = min(max(q, 0.0), 100.0) / 100.0 * self._cdf[-1]
+        i = int(np.searchsorted(self._cdf, target, side="left"))
+        i = min(i, len(self.histogram) - 1)
+        # 区间内线性插值
+        below = self._cdf[i - 1] if i > 0 else 0.0
+        inside = self.histogram[i]
+        ratio = (target - below) / inside if inside > 0 else 0.0
+        return float(self.edges[i] + ratio * (self.edges[i + 1] - self.edges[i]))
+
+    def window(self, lower: float, upper: float) -> Tuple[float, float]:
+        """
+        百分位窗口，例如 window(1, 99) 返回 1% 与 99% 处的强度值
+        """
+        return self.percentile(lower), self.percentile(upper)
+
+    @staticmethod
+    def from_slices(arrays: Iterable[np.ndarray], bins: int = None) -> "ImageStatistics":
+        """
+        逐切片统计，切片在内存中连续，避免对整个体数据生成临时数组
+        """
+        accumulator = StatisticsAccumulator()
+        for a in arrays:
+            accumulator.add(a)
+        return accumulator.statistics(bins)
+
+    @staticmethod
+    def from_array(array: np.ndarray, bins: int = None) -> "ImageStatistics":
+        if array.ndim >= 3:
+            return ImageStatistics.from_slices(array, bins)
+        return ImageStatistics.from_slices([array], bins)
+
+
+class StatisticsAccumulator:
+    """
+    在组装体数据时逐切片累积强度统计：最小值、最大值随切片更新；
+    8/16 位整数切片同时累积每个取值的计数，结束时按区间合并为直方图，无需再次扫描体数据；
+    其他类型的切片只能在范围确定后再统计直方图
+    """
+
+    def __init__(self) -> None:
+        self.min = np.inf
+        self.max = -np.inf
+        # {dtype: 各取值的计数}，下标 0 对应该类型的最小值
+        self.counts: Dict[np.dtype, np.ndarray] = {}
+        self.arrays = []
+
+    def add(self, array: np.ndarray):
+        if array.size == 0:
+            return
+        self.min = min(self.min, float(array.min()))
+        self.max = max(self.max, float(array.max()))
+        if np.issubdtype(array.dtype, np.integer) and array.dtype.itemsize <= 2:
+            info = np.iinfo(array.dtype)
+            values = array.reshape(-1)
+            if info.min != 0:
+                values = values.astype(np.int32) - info.min
+            counts = np.bincount(values, minlength=int(info.max) - int(info.min) + 1)
+            if array.dtype in self.counts:
+                self.counts[array.dtype] += counts
+            else:
+                self.counts[array.dtype] = counts
+        else:
+            self.arrays.append(array)
+
+    def statistics(self, bins: int = None) -> ImageStatistics:
+        bins = bins if bins is not None else ImageStatistics.BINS
+        if self.min > self.max:
+            return ImageStatistics(0.0, 0.0, np.zeros(bins, dtype=np.int64), np.zeros(bins + 1))
+
+        if self.min == self.max:
+            edges = np.linspace(self.min - 0.5, self.max + 0.5, bins + 1)
+        else:
+            edges = np.linspace(self.min, self.max, bins + 1)
+        histogram = np.zeros(bins, dtype=np.int64)
+        for dtype, counts in self.counts.items():
+            # 按取值加权统计，与直接统计切片的分箱结果一致
+            values = np.arange(len(counts), dtype=np.int64) + np.iinfo(dtype).min
+            h = np.histogram(values, bins=bins, range=(edges[0], edges[-1]), weights=counts)[0]
+            histogram += np.rint(h).astype(np.int64)
+        for a in self.arrays:
+            histogram += np.histogram(a, bins=bins, range=(edges[0], edges[-1]))[0]
+        return ImageStatistics(self.min, self.max, histogram, edges)
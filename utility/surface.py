@@ -0,0 +1,111 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from vtkmodules.vtkCommonDataModel import vtkPolyData
+from vtkmodules.vtkFiltersCore import vtkFlyingEdges3D, vtkPolyDataNormals, vtkQuadricDecimation
+from vtkmodules.vtkRenderingCore import vtkActor, vtkPolyDataMapper
+
+from .common import to_vtk_image
+from .trace import traced
+
+# 等值面的阈值(HU)与颜色
+SURFACES: Dict[str, Tuple[float, Tuple[float, float, float]]] = {
+    "bone": (300.0, (0.95, 0.92, 0.84)),
+    "metal": (2500.0, (0.55, 0.65, 0.80)),
+}
+# 网格缓存的上限(字节)，按网格实际占用的内存统计
+SURFACE_MAX_BYTES = int(os.environ.get("VIS_SURFACE_MAX_BYTES", 512 * 1024 * 1024))
+
+# {(序列标识, 阈值, 简化比例): 网格}，最近使用的在最后
+_surfaces: "OrderedDict[tuple, vtkPolyData]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def surface_bytes(surface: vtkPolyData) -> int:
+    return surface.GetActualMemorySize() * 1024
+
+
+@traced()
+def extract_surface(
+    array: np.ndarray, origin: tuple, spacing: tuple, level: float, reduction: float = 0.0
+) -> vtkPolyData:
+    """
+    使用 Flying Edges 提取等值面，reduction > 0 时按比例减少三角形数量后重新计算法向量
+    :param reduction: 0 ~ 1，减少的三角形比例
+    """
+    contour = vtkFlyingEdges3D()
+    contour.SetInputData(to_vtk_image(array, origin, spacing))
+    contour.SetValue(0, level)
+    contour.ComputeNormalsOn()
+    contour.ComputeScalarsOff()
+    contour.Update()
+    surface = contour.GetOutput()
+
+    if reduction > 0 and surface.GetNumberOfPolys() > 0:
+        decimate = vtkQuadricDecimation()
+        decimate.SetInputData(surface)
+        decimate.SetTargetReduction(reduction)
+        normals = vtkPolyDataNormals()
+        normals.SetInputConnection(decimate.GetOutputPort())
+        normals.SplittingOff()
+        normals.Update()
+        surface = normals.GetOutput()
+
+    result = vtkPolyData()
+    result.ShallowCopy(surface)
+    return result
+
+
+def get_surface(key: tuple) -> vtkPolyData:
+    with _lock:
+        if key in _surfaces:
+            _surfaces.move_to_end(key)
+            return _surfaces[key]
+    return None
+
+
+def put_surface(key: tuple, surface: vtkPolyData):
+    """
+    缓存网格，超出 SURFACE_MAX_BYTES 时按最久未使用的顺序删除，单个超出上限的网格不缓存
+    """
+    if surface_bytes(surface) > SURFACE_MAX_BYTES:
+        return
+    with _lock:
+        _surfaces[key] = surface
+        _surfaces.move_to_end(key)
+        while sum(surface_bytes(s) for s in _surfaces.values()) > SURFACE_MAX_BYTES:
+            _surfaces.popitem(last=False)
+
+
+def cached_surfaces() -> List[vtkPolyData]:
+    with _lock:
+        return list(_surfaces.values())
+
+
+def drop_surfaces(source_key):
+    """
+    删除某个序列的所有网格，显示中的网格由 vtkActor 持有，不受影响
+    """
+    with _lock:
+        for key in [k for k in _surfaces if k[0] == source_key]:
+            _surfaces.pop(key)
+
+
+def clear_surfaces():
+    with _lock:
+        _surfaces.clear()
+
+
+def surface_actor(surface: vtkPolyData, color: Tuple[float, float, float]) -> vtkActor:
+    mapper = vtkPolyDataMapper()
+    mapper.SetInputData(surface)
+    mapper.ScalarVisibilityOff()
+    actor = vtkActor()
+    actor.SetMapper(mapper)
+    actor.GetProperty().SetColor(*color)
+    actor.GetProperty().SetSpecular(0.3)
+    actor.GetProperty().SetSpecularPower(20)
+    return actor
@@ -0,0 +1,54 @@
+import os
+
+import cv2
+import numpy as np
+
+from .cache import cache_path
+from .kernel import apply_lut
+from .medical_image import MedicalImage
+
+THUMBNAIL_HEIGHT = 28
+
+
+def _resize(array: np.ndarray, width_mm: float, height_mm: float, height: int) -> np.ndarray:
+    # 按物理尺寸保持宽高比
+    width = max(int(round(height * width_mm / max(height_mm, 1e-6))), 1)
+    return cv2.resize(array, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def make_thumbnail(image: MedicalImage, height: int = THUMBNAIL_HEIGHT) -> np.ndarray:
+    """
+    缩略图：中间的横截面 + 矢状面最大密度投影(MIP)，返回 RGB 的 uint8 数组
+    """
+    w, h, d = image.size
+    sx, sy, sz = image.spacing
+    # 使用金字塔中不低于缩略图分辨率的最粗一层
+    level = image.pyramid.level_for_scale("t", height / max(h, 1))
+    transverse = image.plane("t", d // 2 + 1, level=level)
+    parts = [_resize(np.ascontiguousarray(transverse), w * sx, h * sy, height)]
+
+    if image.channel == 1 and d > 1:
+        # 对体数据进行跨步采样后沿矢状方向投影
+        step = max(min(h, d) // (height * 2), 1)
+        mip = image.array_norm[::step, ::step, ::step].max(axis=2)
+        mip = apply_lut(np.ascontiguousarray(mip), image.lut)
+        parts.append(np.zeros((height, 2, 3), dtype=np.uint8))
+        parts.append(_resize(mip, h * sy, d * sz, height))
+    return np.concatenate(parts, axis=1)
+
+
+def load_thumbnail(image: MedicalImage, height: int = THUMBNAIL_HEIGHT) -> np.ndarray:
+    """
+    优先从本地缓存读取缩略图，缓存以序列标识为键
+    """
+    key = image.series_key
+    if key is None:
+        return make_thumbnail(image, height)
+    path = cache_path("thumbnail", f"{key}_{height}", ".png")
+    if os.path.exists(path):
+        thumbnail = cv2.imread(path, cv2.IMREAD_COLOR)
+        if thumbnail is not None:
+            return cv2.cvtColor(thumbnail, cv2.COLOR_BGR2RGB)
+    thumbnail = make_thumbnail(image, height)
+    cv2.imwrite(path, cv2.cvtColor(thumbnail, cv2.COLOR_RGB2BGR))
+    return thumbnail
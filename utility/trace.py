@@ -0,0 +1,135 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List
+
+# 设置环境变量 VIS_TRACE 为输出文件路径即可开启追踪，退出时写入 Chrome/Perfetto 可读取的 JSON
+TRACE_PATH = os.environ.get("VIS_TRACE")
+
+_enabled = TRACE_PATH is not None
+_events: List[Dict[str, Any]] = []
+_threads: Dict[int, str] = {}
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(path: str = None):
+    global _enabled, TRACE_PATH
+    _enabled = True
+    if path is not None:
+        TRACE_PATH = path
+
+
+def _now() -> float:
+    # 微秒
+    return (time.perf_counter() - _t0) * 1e6
+
+
+def _emit(event: Dict[str, Any]):
+    thread = threading.current_thread()
+    event["pid"] = os.getpid()
+    event["tid"] = thread.ident
+    with _lock:
+        _threads.setdefault(thread.ident, thread.name)
+        _events.append(event)
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, *exc):
+        event = {"name": self.name, "cat": self.category, "ph": "X", "ts": self.start, "dur": _now() - self.start}
+        if self.args:
+            event["args"] = self.args
+        _emit(event)
+        return False
+
+
+def span(name: str, category: str = "vis", **args):
+    """
+    记录一段耗时，未开启追踪时返回空的上下文管理器
+    """
+    if not _enabled:
+        return nullcontext()
+    return _Span(name, category, args)
+
+
+def traced(name: str = None, category: str = "vis") -> Callable:
+    """
+    函数装饰器，以函数的限定名作为默认的名称
+    """
+
+    def decorator(func: Callable) -> Callable:
+        _name = name if name is not None else func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(_name, category, None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def counter(name: str, **values):
+    """
+    记录计数器的取值，例如缓存占用的字节数
+    """
+    if _enabled:
+        _emit({"name": name, "ph": "C", "ts": _now(), "args": values})
+
+
+def instant(name: str, category: str = "vis", **args):
+    """
+    记录一个瞬时事件，例如进度信息
+    """
+    if _enabled:
+        _emit({"name": name, "cat": category, "ph": "i", "s": "t", "ts": _now(), "args": args})
+
+
+def save(path: str = None):
+    path = path if path is not None else TRACE_PATH
+    if path is None:
+        return
+    with _lock:
+        events = list(_events)
+        threads = dict(_threads)
+    pid = os.getpid()
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in threads.items()
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+    print(f"[INFO] trace saved to {path}.")
+
+
+def clear():
+    with _lock:
+        _events.clear()
+
+
+@atexit.register
+def _save_at_exit():
+    if _enabled and _events:
+        save()
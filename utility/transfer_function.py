@@ -0,0 +1,142 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+from matplotlib.cm import get_cmap
+from vtkmodules.vtkCommonDataModel import vtkPiecewiseFunction
+from vtkmodules.vtkRenderingCore import vtkColorTransferFunction, vtkVolumeProperty
+
+from .kernel import native_range
+
+
+class Preset:
+    """
+    体绘制的传递函数预设：颜色图及其映射范围、标量不透明度与梯度不透明度的控制点
+    """
+
+    def __init__(
+        self,
+        modality: str,
+        name: str,
+        cmap: str,
+        color_range: Tuple[float, float],
+        scalar_opacity: List[Tuple[float, float]],
+        gradient_opacity: List[Tuple[float, float]],
+    ) -> None:
+        self.modality = modality
+        self.name = name
+        self.cmap = cmap
+        self.color_range = color_range
+        self.scalar_opacity = scalar_opacity
+        self.gradient_opacity = gradient_opacity
+
+
+def _suv_preset(ma: float) -> Preset:
+    return Preset(
+        "PT",
+        f"SUV 0-{ma:g}",
+        "hot",
+        (0.0, ma),
+        [(0.0, 0.00), (0.2 * ma, 0.25), (0.5 * ma, 0.45), (0.6 * ma, 0.80), (0.9 * ma, 0.95)],
+        [(0.0, 0.00), (0.6 * ma, 0.4), (0.9 * ma, 1.0)],
+    )
+
+
+# 预设库，CT 的取值为 HU，PET 的取值为 SUV
+PRESETS: Dict[str, Preset] = {
+    "ct_default": Preset(
+        "CT",
+        "默认",
+        "gray",
+        (-450.0, 1050.0),
+        [(0.0, 0.00), (200.0, 0.25), (500.0, 0.45), (1000.0, 0.65), (1150.0, 0.90)],
+        [(0.0, 0.00), (90.0, 0.5), (100.0, 1.0)],
+    ),
+    "ct_bone": Preset(
+        "CT",
+        "骨骼",
+        "bone",
+        (100.0, 1500.0),
+        [(150.0, 0.00), (300.0, 0.30), (700.0, 0.70), (1500.0, 0.95)],
+        [(0.0, 0.00), (90.0, 0.5), (100.0, 1.0)],
+    ),
+    "ct_soft_tissue": Preset(
+        "CT",
+        "软组织",
+        "gray",
+        (-160.0, 240.0),
+        [(-200.0, 0.00), (-100.0, 0.05), (40.0, 0.25), (240.0, 0.50), (400.0, 0.00)],
+        [(0.0, 0.00), (50.0, 0.5), (100.0, 1.0)],
+    ),
+    "ct_lung": Preset(
+        "CT",
+        "肺",
+        "gray",
+        (-1000.0, -200.0),
+        [(-1000.0, 0.00), (-900.0, 0.02), (-500.0, 0.15), (-200.0, 0.00)],
+        [(0.0, 0.00), (50.0, 0.5), (100.0, 1.0)],
+    ),
+    "pt_suv3": _suv_preset(3.0),
+    "pt_suv5": _suv_preset(5.0),
+    "pt_suv10": _suv_preset(10.0),
+}
+DEFAULT_PRESETS = {"CT": "ct_default", "PT": "pt_suv5"}
+
+# 已创建的 vtk 对象，所有体数据与标签页共享
+_functions: Dict[tuple, Tuple[vtkColorTransferFunction, vtkPiecewiseFunction, vtkPiecewiseFunction]] = {}
+_properties: Dict[tuple, vtkVolumeProperty] = {}
+
+
+def transfer_functions(name: str, dtype=np.float32):
+    """
+    创建(或返回已创建的)颜色、标量不透明度与梯度不透明度函数，控制点限制在数据类型的取值范围内
+    """
+    lo, hi = native_range(np.dtype(dtype))
+    key = (name, lo, hi)
+    if key not in _functions:
+        preset = PRESETS[name]
+
+        color = vtkColorTransferFunction()
+        cmap = get_cmap(preset.cmap)
+        cmap = cmap(np.linspace(0, 1, cmap.N))
+        x = np.clip(np.linspace(*preset.color_range, cmap.shape[0]), lo, hi)
+        [color.AddRGBPoint(_x, *rgba[:3]) for _x, rgba in zip(x, cmap)]
+
+        scalar_opacity = vtkPiecewiseFunction()
+        [scalar_opacity.AddPoint(np.clip(_x, lo, hi), _y) for _x, _y in preset.scalar_opacity]
+
+        gradient_opacity = vtkPiecewiseFunction()
+        [gradient_opacity.AddPoint(_x, _y) for _x, _y in preset.gradient_opacity]
+
+        _functions[key] = (color, scalar_opacity, gradient_opacity)
+    return _functions[key]
+
+
+def volume_property(name: str, dtype=np.float32, interpolation: str = "linear") -> vtkVolumeProperty:
+    """
+    预设对应的体绘制属性，只创建一次，切换预设时替换体数据的属性即可，不需要重新创建映射器
+    """
+    lo, hi = native_range(np.dtype(dtype))
+    key = (name, lo, hi, interpolation)
+    if key not in _properties:
+        color, scalar_opacity, gradient_opacity = transfer_functions(name, dtype)
+        property = vtkVolumeProperty()
+        property.SetColor(color)
+        property.SetScalarOpacity(scalar_opacity)
+        property.SetGradientOpacity(gradient_opacity)
+        if interpolation == "nearest":
+            property.SetInterpolationTypeToNearest()
+        else:
+            property.SetInterpolationTypeToLinear()
+        property.ShadeOn()
+        # 环境光系数表示各种光线照射到物体材质上，经过很多次发射后最终在环境中的光线强度
+        property.SetAmbient(0.4)
+        # 漫反射光系数表示光线照射到物体材质上，经过漫反射后形成的光线强度
+        property.SetDiffuse(0.6)
+        # 镜反射系数表示光线照射到物体材质上，经过镜面反射后形成的光线强度
+        property.SetSpecular(0.2)
+        _properties[key] = property
+    return _properties[key]
+
+
+def presets(modality: str) -> List[str]:
+    return [name for name, preset in PRESETS.items() if preset.modality == modality]
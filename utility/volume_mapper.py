@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from vtkmodules.vtkCommonCore import vtkMultiThreader
+from vtkmodules.vtkRenderingCore import vtkRenderer, vtkRenderWindow
+from vtkmodules.vtkRenderingVolume import vtkFixedPointVolumeRayCastMapper
+from vtkmodules.vtkRenderingVolumeOpenGL2 import vtkSmartVolumeMapper
+
+from .cache import cache_path
+
+# 可选的 CPU 体绘制映射器
+BACKENDS = {
+    "fixed_point": "定点光线投射",
+    "smart": "智能(CPU)",
+}
+INTERPOLATIONS = ("linear", "nearest")
+
+
+class MapperConfig:
+    """
+    体绘制映射器的配置：映射器类型、线程数(0 表示使用所有核心)、光线采样步长(mm)与插值方式，保存在本地缓存目录
+    """
+
+    def __init__(
+        self,
+        backend: str = "fixed_point",
+        threads: int = 0,
+        sample_distance: float = 1.0,
+        interpolation: str = "linear",
+    ) -> None:
+        assert backend in BACKENDS, f"not support mapper backend = {backend}."
+        assert interpolation in INTERPOLATIONS, f"not support interpolation = {interpolation}."
+        self.backend = backend
+        self.threads = threads
+        self.sample_distance = sample_distance
+        self.interpolation = interpolation
+
+    @property
+    def name(self) -> str:
+        threads = self.threads if self.threads > 0 else "all"
+        return f"{self.backend}/threads={threads}/distance={self.sample_distance:g}/{self.interpolation}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "threads": self.threads,
+            "sample_distance": self.sample_distance,
+            "interpolation": self.interpolation,
+        }
+
+    def replace(self, **changes) -> "MapperConfig":
+        """
+        返回修改部分配置后的副本，不改变当前配置
+        """
+        return MapperConfig(**dict(self.to_dict(), **changes))
+
+    @staticmethod
+    def load(path: str = None) -> "MapperConfig":
+        path = path if path is not None else cache_path("config", "volume_mapper", ".json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return MapperConfig(**json.load(f))
+        except FileNotFoundError:
+            return MapperConfig()
+        except (ValueError, TypeError, AssertionError) as e:
+            print(f"[WARNING] invalid volume mapper config {path}: {e}")
+            return MapperConfig()
+
+    def save(self, path: str = None):
+        path = path if path is not None else cache_path("config", "volume_mapper", ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def create_mapper(self):
+        if self.backend == "smart":
+            # 智能映射器内部的光线投射映射器在构造时读取全局默认的线程数，构造后恢复，不影响进程中的其他 vtk 对象
+            default = vtkMultiThreader.GetGlobalDefaultNumberOfThreads()
+            if self.threads > 0:
+                vtkMultiThreader.SetGlobalDefaultNumberOfThreads(self.threads)
+            try:
+                mapper = vtkSmartVolumeMapper()
+            finally:
+                vtkMultiThreader.SetGlobalDefaultNumberOfThreads(default)
+            mapper.SetRequestedRenderModeToRayCast()
+        else:
+            mapper = vtkFixedPointVolumeRayCastMapper()
+            if self.threads > 0:
+                mapper.SetNumberOfThreads(self.threads)
+        if hasattr(mapper, "SetSampleDistance"):
+            mapper.SetSampleDistance(self.sample_distance)
+        return mapper
+
+
+_config: MapperConfig = None
+
+
+def get_mapper_config() -> MapperConfig:
+    global _config
+    if _config is None:
+        _config = MapperConfig.load()
+    return _config
+
+
+def set_mapper_config(config: MapperConfig, persist: bool = True):
+    global _config
+    _config = config
+    if persist:
+        config.save()
+
+
+# -----------------------------------------------------------#
+#                      离屏性能测试
+# -----------------------------------------------------------#
+
+
+def synthetic_volumes(shape=(200, 256, 256)):
+    """
+    合成的 CT(int16，空气、软组织、骨骼)与 PET(float32，本底与若干高摄取病灶)
+    """
+    z, y, x = np.ogrid[-1 : 1 : shape[0] * 1j, -1 : 1 : shape[1] * 1j, -1 : 1 : shape[2] * 1j]
+    body = (x / 0.8) ** 2 + (y / 0.6) ** 2 < 1
+    bone = (x**2 + (y + 0.2) ** 2 < 0.02) | ((np.abs(x) - 0.5) ** 2 + y**2 < 0.01)
+    ct = np.full(shape, -1000, dtype=np.int16)
+    ct[np.broadcast_to(body, shape)] = 40
+    ct[np.broadcast_to(bone, shape)] = 1000
+
+    pt = np.zeros(shape, dtype=np.float32)
+    pt[np.broadcast_to(body, shape)] = 0.8
+    rng = np.random.default_rng(0)
+    for cz, cy, cx in rng.uniform(-0.5, 0.5, size=(5, 3)):
+        pt += 8.0 * np.exp(-((z - cz) ** 2 + (y - cy) ** 2 + (x - cx) ** 2) / 0.005).astype(np.float32)
+    return ct, pt
+
+
+def default_configs() -> List[MapperConfig]:
+    threads = os.cpu_count() or 1
+    configs = []
+    for backend in BACKENDS:
+        for n in sorted({1, threads}):
+            configs.append(MapperConfig(backend, n))
+    configs.append(MapperConfig("fixed_point", threads, 2.0))
+    configs.append(MapperConfig("fixed_point", threads, 1.0, "nearest"))
+    return configs
+
+
+def benchmark(
+    configs: List[MapperConfig] = None, frames: int = 36, shape=(200, 256, 256), size=(512, 512)
+) -> List[Dict]:
+    """
+    离屏渲染合成的 PET/CT，相机绕体数据旋转一周，统计各配置的每帧耗时(ms)；首帧包含梯度等预处理，单独统计
+    """
+    from .common import volume_ct, volume_pt
+
+    configs = configs if configs is not None else default_configs()
+    ct, pt = synthetic_volumes(shape)
+    spacing = (1.0, 1.0, 1.0)
+    origin = [-0.5 * s for s in ct.shape[::-1]]
+
+    results = []
+    for config in configs:
+        renderer = vtkRenderer()
+        window = vtkRenderWindow()
+        window.SetOffScreenRendering(1)
+        window.SetSize(*size)
+        window.AddRenderer(renderer)
+        renderer.AddVolume(volume_ct(ct, origin, spacing, config=config))
+        renderer.AddVolume(volume_pt(pt, origin, spacing, config=config))
+        camera = renderer.GetActiveCamera()
+        camera.SetPosition(0.0, -2.0 * max(ct.shape), 0.0)
+        camera.SetFocalPoint(0.0, 0.0, 0.0)
+        camera.SetViewUp(0, 0, 1)
+        renderer.ResetCameraClippingRange()
+
+        t0 = time.perf_counter()
+        window.Render()
+        first = (time.perf_counter() - t0) * 1000
+
+        times = []
+        for _ in range(frames):
+            camera.Azimuth(360.0 / frames)
+            renderer.ResetCameraClippingRange()
+            t0 = time.perf_counter()
+            window.Render()
+            times.append((time.perf_counter() - t0) * 1000)
+        window.Finalize()
+
+        p50, p95 = np.percentile(times, (50, 95))
+        result = {
+            "config": config.name,
+            "first": first,
+            "mean": float(np.mean(times)),
+            "p50": float(p50),
+            "p95": float(p95),
+        }
+        results.append(result)
+        print(
+            f"[INFO] {config.name:<48} first {first:8.1f} ms, "
+            f"mean {result['mean']:7.1f} ms/frame, p50 {p50:7.1f}, p95 {p95:7.1f}"
+        )
+    return results
@@ -0,0 +1,87 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+
+class VolumeStore:
+    """
+    进程内共享的体数据仓库：以(序列标识, 变换, 参数)为键保存派生的只读数组并进行引用计数，
+    2D 与 3D 标签页共享同一份数据，最后一个使用者释放后删除
+    """
+
+    def __init__(self) -> None:
+        self.arrays: Dict[Hashable, np.ndarray] = {}
+        self.infos: Dict[Hashable, Any] = {}
+        self.refs: Dict[Hashable, int] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key: Hashable, factory: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        获取键对应的数组并增加引用计数，不存在时调用 factory 生成
+        """
+        return self.acquire_with_info(key, lambda: (factory(), None))[0]
+
+    def acquire_with_info(self, key: Hashable, factory: Callable[[], Tuple[np.ndarray, Any]]) -> Tuple[np.ndarray, Any]:
+        """
+        获取键对应的数组及随之保存的信息(如几何信息)，factory 返回 (数组, 信息)，信息与数组一同释放
+        """
+        with self.lock:
+            if key in self.arrays:
+                self.refs[key] += 1
+                return self.arrays[key], self.infos[key]
+        # 生成可能很耗时，不持有锁
+        array, info = factory()
+        array.flags.writeable = False
+        with self.lock:
+            if key in self.arrays:
+                # 其他线程已生成
+                self.refs[key] += 1
+                return self.arrays[key], self.infos[key]
+            self.arrays[key] = array
+            self.infos[key] = info
+            self.refs[key] = 1
+            return array, info
+
+    def get(self, key: Hashable) -> np.ndarray:
+        """
+        获取已持有的数组，不改变引用计数
+        """
+        with self.lock:
+            return self.arrays.get(key)
+
+    def release(self, key: Hashable):
+        with self.lock:
+            if key not in self.refs:
+                return
+            self.refs[key] -= 1
+            if self.refs[key] <= 0:
+                self.refs.pop(key)
+                self.arrays.pop(key)
+                self.infos.pop(key)
+
+    def release_all(self, keys: List[Hashable]):
+        for key in keys:
+            self.release(key)
+        keys.clear()
+
+    @property
+    def nbytes(self) -> int:
+        with self.lock:
+            return sum(array.nbytes for array in self.arrays.values())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.arrays
+
+    def __len__(self) -> int:
+        return len(self.arrays)
+
+
+_store: VolumeStore = None
+
+
+def get_volume_store() -> VolumeStore:
+    global _store
+    if _store is None:
+        _store = VolumeStore()
+    return _store
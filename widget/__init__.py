@@ -1,11 +1,16 @@
 from widget.collapsible_child import CollapsibleChild
 from widget.collapsible_sidebar import CollapsibleSidebar
 from widget.collapsible_widget import CollapsibleWidget
+from widget.image_cine import ImageCine
 from widget.image_constrast import ImageConstrast
+from widget.image_curved import ImageCurved
 from widget.image_item import ImageItem
 from widget.image_item2 import ImageItem2
+from widget.image_oblique import ImageOblique
 from widget.image_view import ImageView
 from widget.image_viewer import ImageViewer
 from widget.message_box import TimerMessageBox, error, information, question, warning
+from widget.mip_player import MIPPlayer
+from widget.mpr_view import MPRView
 from widget.note import Note
 from widget.volume_viewer import VolumeViewer
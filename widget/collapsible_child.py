@@ -1,5 +1,7 @@
+import numpy as np
 from PyQt6.QtCore import pyqtSignal
-from PyQt6.QtWidgets import QHBoxLayout, QRadioButton, QSizePolicy, QSpacerItem, QWidget
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QHBoxLayout, QLabel, QRadioButton, QSizePolicy, QSpacerItem, QWidget
 
 from utility import MedicalImage
 
@@ -22,8 +24,12 @@ class CollapsibleChild(QWidget):
         self.setVisible(False)  # 初始隐藏
 
         self.radio_button = QRadioButton(description, self)
+        # 缩略图，由后台线程生成后填充
+        self.thumbnail = QLabel(self)
+        self.thumbnail.setFixedHeight(28)
         layout = QHBoxLayout()
         layout.addItem(QSpacerItem(28, 30, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Minimum))
+        layout.addWidget(self.thumbnail)
         layout.addWidget(self.radio_button)
         layout.setSpacing(0)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -33,5 +39,11 @@ class CollapsibleChild(QWidget):
 
         self.radio_button.toggled.connect(self.radio_button_toggled)
 
+    def set_thumbnail(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        image = QImage(array.data, array.shape[1], array.shape[0], array.shape[1] * 3, QImage.Format.Format_RGB888)
+        self.thumbnail.setPixmap(QPixmap.fromImage(image))
+        self.thumbnail.setFixedWidth(array.shape[1] + 4)
+
     def radio_button_toggled(self, c: bool):
         self.toggled.emit(self.uid, c)
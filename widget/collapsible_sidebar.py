@@ -1,10 +1,12 @@
 from typing import Dict, List
 
+import numpy as np
 from PyQt6.QtCore import QSize, Qt, pyqtSignal
 from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import QFileDialog, QGridLayout, QScrollArea, QToolButton, QVBoxLayout, QWidget
 
 from utility import MedicalImage, MedicalImage2, read_image
+from worker import ThumbnailWorker
 
 from .collapsible_widget import CollapsibleWidget
 from .message_box import information
@@ -19,6 +21,9 @@ class CollapsibleSidebar(QWidget):
         super().__init__(parent)
         self.toggled_children: List[str] = []
         self.collapsible_widgets: Dict[str, CollapsibleWidget] = {}
+        # 后台生成缩略图
+        self.thumbnail_worker = ThumbnailWorker(parent=self)
+        self.thumbnail_worker.thumbnail_ready.connect(self.set_thumbnail)
 
         # 样式
         self.setStyleSheet(
@@ -119,6 +124,19 @@ class CollapsibleSidebar(QWidget):
                 widget.child_toggled.connect(self.toggle_collapsible_child)
                 self.collapsible_widgets[study_uid] = widget
                 self.collapsible_button_layout.addWidget(widget)
+            # 为新增的序列生成缩略图
+            for child_uid, child in self.collapsible_widgets[study_uid].children.items():
+                if child.thumbnail.pixmap().isNull():
+                    self.thumbnail_worker.add(study_uid + "_^_" + child_uid, child.image)
+
+    # 侧边栏中已加载的所有图像
+    def images(self) -> List[MedicalImage]:
+        return [child.image for widget in self.collapsible_widgets.values() for child in widget.children.values()]
+
+    def set_thumbnail(self, uid: str, array: np.ndarray):
+        widget_uid, child_uid = uid.split("_^_")
+        if widget_uid in self.collapsible_widgets and child_uid in self.collapsible_widgets[widget_uid].children:
+            self.collapsible_widgets[widget_uid].children[child_uid].set_thumbnail(array)
 
     def toggle_collapsible_child(self, widget_uid: str, child_uid: str, c: bool):
         if c:
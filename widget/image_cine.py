@@ -0,0 +1,149 @@
+import time
+from collections import deque
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QComboBox, QDialog, QHBoxLayout, QLabel, QPushButton, QSpinBox, QVBoxLayout, QWidget
+
+from worker import PrefetchWorker
+
+from .image_view import ImageView
+
+
+class ImageCine(QDialog):
+    """
+    电影模式：按目标帧率沿当前视图方向自动播放切面，支持循环与往返。
+    多帧采集(如三时相骨显像的血流相)沿帧方向播放，默认帧率取自采集的帧间隔。
+    播放以墙上时间为准，渲染跟不上时跳过的帧计为丢帧；即将显示的切面在后台线程中预先计算。
+    """
+
+    # 多帧采集需要切换到帧所在的视图
+    view_requested = pyqtSignal(str)
+
+    def __init__(self, view: ImageView, parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self.view = view
+        self.prefetch_worker = PrefetchWorker(view.image, self)
+
+        # 播放状态：起始时间、起始帧序号、已显示的帧序号
+        self.t0 = 0.0
+        self.k0 = 0
+        self.k = 0
+        self.dropped = 0
+        self.shown = deque()
+
+        self.setFixedSize(400, 100)
+        self.setWindowTitle("电影")
+
+        self.play_button = QPushButton()
+        self.play_button.setText("播放")
+        self.play_button.setFixedWidth(60)
+        self.fps = QSpinBox()
+        self.fps.setRange(1, 60)
+        self.fps.setValue(10)
+        self.fps.setSuffix(" fps")
+        self.mode = QComboBox()
+        self.mode.addItems(["循环", "往返"])
+        self.stats = QLabel()
+        self.stats.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.stats.setText("实际 0.0 fps，丢帧 0")
+
+        _layout = QHBoxLayout()
+        _layout.addWidget(self.play_button)
+        _layout.addWidget(self.fps)
+        _layout.addWidget(self.mode)
+        layout = QVBoxLayout()
+        layout.addLayout(_layout)
+        layout.addWidget(self.stats)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+        self.play_button.clicked.connect(self.toggle_play)
+        self.fps.valueChanged.connect(self.set_fps)
+
+    @property
+    def frame_mode(self) -> bool:
+        return getattr(self.view.image, "frames", 0) > 1
+
+    @property
+    def length(self) -> int:
+        # 一个周期的帧数
+        n = self.view.position_max
+        return 2 * (n - 1) if self.mode.currentIndex() == 1 and n > 1 else n
+
+    def frame_to_position(self, k: int) -> int:
+        n = self.view.position_max
+        k = k % max(self.length, 1)
+        return (k if k < n else 2 * (n - 1) - k) + 1
+
+    def toggle_play(self):
+        if self.timer.isActive():
+            self.stop()
+        else:
+            self.play()
+
+    def play(self):
+        if self.frame_mode and self.view.view != "t":
+            self.view_requested.emit("t")
+        self.k0 = self.k = self.view.position - 1
+        self.t0 = time.perf_counter()
+        self.dropped = 0
+        self.shown.clear()
+        self.timer.start(max(int(1000 / self.fps.value()), 1))
+        self.play_button.setText("暂停")
+        self.prefetch()
+
+    def stop(self):
+        self.timer.stop()
+        self.prefetch_worker.stop()
+        self.play_button.setText("播放")
+
+    def set_fps(self, fps: int):
+        if self.timer.isActive():
+            # 以当前帧为起点重新计时
+            self.k0, self.t0 = self.k, time.perf_counter()
+            self.timer.setInterval(max(int(1000 / fps), 1))
+
+    def tick(self):
+        now = time.perf_counter()
+        k = self.k0 + int((now - self.t0) * self.fps.value())
+        if k == self.k:
+            return
+        # 两次显示之间跳过的帧
+        self.dropped += k - self.k - 1
+        self.k = k
+
+        self.view.begin_frame()
+        self.view.position = self.frame_to_position(k)
+        self.view.position_changed.emit(self.view._position["s"], self.view._position["c"], self.view._position["t"])
+        self.prefetch()
+
+        # 最近 1 秒内实际显示的帧数
+        self.shown.append(now)
+        while self.shown and now - self.shown[0] > 1.0:
+            self.shown.popleft()
+        fps = (len(self.shown) - 1) / (now - self.shown[0]) if len(self.shown) > 1 else 0.0
+        frame = f"帧 {self.view.position}/{self.view.position_max}，" if self.frame_mode else ""
+        self.stats.setText(f"{frame}实际 {fps:.1f} fps，丢帧 {self.dropped}")
+
+    def prefetch(self):
+        # 斜切面与厚层投影不经过渲染缓存，不预读
+        if self.view.slab is not None or self.view.angles != (0.0, 0.0):
+            return
+        ahead = max(self.fps.value() // 2, 4)
+        positions = [self.frame_to_position(self.k + i) for i in range(1, ahead + 1)]
+        self.prefetch_worker.prefetch(self.view.view, positions, self.view.level)
+
+    def showEvent(self, event) -> None:
+        # 多帧采集按采集时的帧率播放
+        frame_time = getattr(self.view.image, "frame_time", None)
+        if self.frame_mode and frame_time:
+            self.fps.setValue(min(max(round(1000.0 / frame_time), 1), 60))
+        self.setWindowTitle("电影 - 多帧采集" if self.frame_mode else "电影")
+        super().showEvent(event)
+
+    def hideEvent(self, event) -> None:
+        self.stop()
+        super().hideEvent(event)
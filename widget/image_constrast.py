@@ -1,15 +1,61 @@
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QDoubleValidator
+from typing import List, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QRectF, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QDoubleValidator, QPainter, QPaintEvent
 from PyQt6.QtWidgets import QDialog, QHBoxLayout, QLabel, QLineEdit, QPushButton, QVBoxLayout, QWidget
 
+from utility import ImageStatistics
+
+
+class Histogram(QWidget):
+    def __init__(self, parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self.setFixedHeight(100)
+        self.statistics: ImageStatistics = None
+        self.mi, self.ma = 0.0, 0.0
+
+    def set_statistics(self, statistics: ImageStatistics):
+        self.statistics = statistics
+        self.update()
+
+    def set_window(self, mi: float, ma: float):
+        self.mi, self.ma = mi, ma
+        self.update()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#1e1e1e"))
+        if self.statistics is None or self.statistics.count == 0:
+            return
+        w, h = self.width(), self.height()
+        lo, hi = self.statistics.edges[0], self.statistics.edges[-1]
+
+        # 按控件宽度合并直方图区间，对数坐标
+        histogram = self.statistics.histogram
+        columns = np.array_split(histogram, min(w, len(histogram)))
+        heights = np.log1p(np.array([c.sum() for c in columns], dtype=np.float64))
+        heights = heights / (heights.max() + np.finfo(np.float32).eps)
+        bar = w / len(columns)
+        for i, v in enumerate(heights):
+            painter.fillRect(QRectF(i * bar, h * (1 - v), bar, h * v), QColor("#a0a0a0"))
+
+        # 当前窗口
+        if hi > lo:
+            left = (self.mi - lo) / (hi - lo) * w
+            right = (self.ma - lo) / (hi - lo) * w
+            painter.fillRect(QRectF(left, 0, max(right - left, 1), h), QColor(220, 126, 35, 80))
+
 
 class ImageConstrast(QDialog):
     changed = pyqtSignal(float, float)
 
     def __init__(self, mi=0.0, ma=0.0, parent: QWidget = None) -> None:
         super().__init__(parent)
+        self.statistics: ImageStatistics = None
+        self.presets: List[Tuple[str, float, float]] = []
 
-        self.setFixedSize(400, 150)
+        self.setFixedSize(400, 300)
 
         self.setWindowTitle("对比度")
         validator = QDoubleValidator(self)
@@ -66,6 +112,15 @@ class ImageConstrast(QDialog):
         layout2.addWidget(label_window_width)
         layout2.addWidget(self.edit_window_width)
 
+        # 直方图
+        self.histogram = Histogram(self)
+        self.histogram.set_window(mi, ma)
+
+        # 预设窗口
+        self.layout_preset = QHBoxLayout()
+        self.layout_preset.setSpacing(5)
+        self.layout_preset.setContentsMargins(0, 0, 0, 0)
+
         button = QPushButton()
         button.setText("确定")
         button.setFixedWidth(80)
@@ -73,6 +128,8 @@ class ImageConstrast(QDialog):
         layout = QVBoxLayout()
         layout.setSpacing(0)
         layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.histogram)
+        layout.addLayout(self.layout_preset)
         layout.addLayout(layout1)
         layout.addLayout(layout2)
         layout.addWidget(button, alignment=Qt.AlignmentFlag.AlignHCenter)
@@ -90,6 +147,42 @@ class ImageConstrast(QDialog):
         #
         button.clicked.connect(self.clicked)
 
+    def set_statistics(self, statistics: ImageStatistics, modality: str = None):
+        """
+        设置加载时预先计算的强度统计，用于直方图显示和预设窗口
+        """
+        self.statistics = statistics
+        self.histogram.set_statistics(statistics)
+
+        self.presets = [
+            ("全范围", statistics.min, statistics.max),
+            ("自动", *statistics.window(0.5, 99.5)),
+            ("1%-99%", *statistics.window(1, 99)),
+        ]
+        if modality == "PT" or modality == "NM":
+            self.presets.append(("SUVmax", 0.0, statistics.max))
+            self.presets.append(("SUV 99.9%", 0.0, statistics.percentile(99.9)))
+
+        while self.layout_preset.count() != 0:
+            item = self.layout_preset.takeAt(0)
+            item.widget().deleteLater()
+        for name, mi, ma in self.presets:
+            preset_button = QPushButton(name)
+            preset_button.clicked.connect(lambda _, mi=mi, ma=ma: self.apply_preset(mi, ma))
+            self.layout_preset.addWidget(preset_button)
+
+    def set_window(self, mi: float, ma: float):
+        self.edit_min.setText(f"{mi:.2f}")
+        self.edit_max.setText(f"{ma:.2f}")
+        self.change("min_max")
+
+    def apply_preset(self, mi: float, ma: float):
+        """
+        预设窗口立即生效，对话框保持打开以便继续微调
+        """
+        self.set_window(mi, ma)
+        self.changed.emit(float(self.edit_min.text()), float(self.edit_max.text()))
+
     def change(self, param: str):
         if param == "min_max":
             mi = 0.0 if len(self.edit_min.text()) == 0 else float(self.edit_min.text())
@@ -109,6 +202,7 @@ class ImageConstrast(QDialog):
             self.edit_window_width.setText(f"{width:.2f}")
         else:
             raise Exception(f"not supprot param = {param}")
+        self.histogram.set_window(float(self.edit_min.text()), float(self.edit_max.text()))
 
     def clicked(self):
         mi, ma = float(self.edit_min.text()), float(self.edit_max.text())
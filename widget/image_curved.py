@@ -0,0 +1,107 @@
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QDialog, QDoubleSpinBox, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+
+from utility import VIEW_TO_AXES
+
+from .image_view import ImageView
+
+
+class ImageCurved(QDialog):
+    """
+    曲面重建(CPR)：窗口显示期间在视图上单击依次添加折线顶点，重建时沿折线展开，
+    横向沿选点时视图的法线方向采样，折线在结果中水平显示
+    """
+
+    def __init__(self, view: ImageView, parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self.view = view
+        self.pixmap: QPixmap = None
+
+        self.resize(600, 400)
+        self.setWindowTitle("曲面重建")
+
+        self.canvas = QLabel()
+        self.canvas.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.canvas.setMinimumSize(200, 100)
+        self.canvas.setStyleSheet("background-color: #000000;")
+
+        self.count = QLabel()
+        self.count.setText("顶点 0")
+        self.half_width = QDoubleSpinBox()
+        self.half_width.setRange(1.0, 200.0)
+        self.half_width.setValue(30.0)
+        self.half_width.setSuffix(" mm")
+        clear_button = QPushButton()
+        clear_button.setText("清除")
+        clear_button.setFixedWidth(60)
+        self.build_button = QPushButton()
+        self.build_button.setText("重建")
+        self.build_button.setFixedWidth(60)
+        self.build_button.setEnabled(False)
+
+        _layout = QHBoxLayout()
+        _layout.addWidget(self.count)
+        _layout.addWidget(QLabel("半宽"))
+        _layout.addWidget(self.half_width)
+        _layout.addWidget(clear_button)
+        _layout.addWidget(self.build_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas, 1)
+        layout.addLayout(_layout)
+        self.setLayout(layout)
+
+        clear_button.clicked.connect(self.clear)
+        self.build_button.clicked.connect(self.build)
+        self.view.curve_changed.connect(self.update_count)
+
+    def update_count(self):
+        n = len(self.view.curve_points or [])
+        self.count.setText(f"顶点 {n}")
+        self.build_button.setEnabled(n >= 2)
+
+    def clear(self):
+        if self.view.curve_points is not None:
+            self.view.curve_points.clear()
+        self.update_count()
+        self.view.scene().update()
+
+    def build(self):
+        points = np.array(self.view.curve_points)
+        up = np.eye(3)[VIEW_TO_AXES[self.view.view][2]]
+        plane = self.view.image.plane_curved(points, up, self.half_width.value())
+        # 行沿折线、列沿横向 -> 折线水平显示
+        plane = np.ascontiguousarray(np.swapaxes(plane, 0, 1))
+        h, w = plane.shape[0:2]
+        if plane.ndim == 2:
+            image = QImage(plane.data.tobytes(), w, h, w, QImage.Format.Format_Grayscale8)
+        else:
+            image = QImage(plane.data.tobytes(), w, h, w * 3, QImage.Format.Format_RGB888)
+        self.pixmap = QPixmap.fromImage(image)
+        self.show_pixmap()
+
+    def show_pixmap(self):
+        if self.pixmap is not None:
+            self.canvas.setPixmap(
+                self.pixmap.scaled(
+                    self.canvas.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+                )
+            )
+
+    def resizeEvent(self, event) -> None:
+        self.show_pixmap()
+        super().resizeEvent(event)
+
+    def showEvent(self, event) -> None:
+        # 进入选点状态
+        if self.view.curve_points is None:
+            self.view.curve_points = []
+        self.update_count()
+        super().showEvent(event)
+
+    def hideEvent(self, event) -> None:
+        # 退出选点状态，隐藏折线
+        self.view.curve_points = None
+        self.view.scene().update()
+        super().hideEvent(event)
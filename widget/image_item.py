@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Tuple, Union
 
 import numpy as np
 from PyQt6.QtCore import QPointF, QRectF
@@ -7,7 +7,7 @@ from PyQt6.QtWidgets import QGraphicsPixmapItem, QStyleOptionGraphicsItem, QWidg
 
 
 class ImageItem(QGraphicsPixmapItem):
-    def __init__(self, array: np.ndarray) -> None:
+    def __init__(self, array: np.ndarray, size: Tuple[int, int] = None, level: int = 0) -> None:
         # 初始化
         image = QImage(
             array.data.tobytes(),
@@ -19,12 +19,16 @@ class ImageItem(QGraphicsPixmapItem):
         pixmap = QPixmap.fromImage(image)
         super(ImageItem, self).__init__(pixmap)
 
-        # 属性
-        self.w, self.h = self.pixmap().width(), self.pixmap().height()
+        # 属性，size 为原始分辨率下的大小 (W, H)，低分辨率的金字塔图像会被拉伸至该大小
+        self.w, self.h = size if size is not None else (self.pixmap().width(), self.pixmap().height())
         self.left, self.top = -self.w / 2.0, -self.h / 2.0
+        self.level = level
 
     def boundingRect(self) -> QRectF:
         return QRectF(self.left, self.top, self.w, self.h)
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Union[QWidget, None]) -> None:
-        painter.drawPixmap(QPointF(self.left, self.top), self.pixmap())
+        if self.pixmap().width() == self.w and self.pixmap().height() == self.h:
+            painter.drawPixmap(QPointF(self.left, self.top), self.pixmap())
+        else:
+            painter.drawPixmap(self.boundingRect(), self.pixmap(), QRectF(self.pixmap().rect()))
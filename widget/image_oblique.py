@@ -0,0 +1,66 @@
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QDialog, QHBoxLayout, QLabel, QPushButton, QSlider, QVBoxLayout, QWidget
+
+
+class ImageOblique(QDialog):
+    changed = pyqtSignal(float, float)
+
+    def __init__(self, parent: QWidget = None) -> None:
+        super().__init__(parent)
+
+        self.setFixedSize(400, 120)
+        self.setWindowTitle("斜切面")
+
+        self.sliders, self.labels = [], []
+        layout = QVBoxLayout()
+        layout.setSpacing(0)
+        layout.setContentsMargins(10, 0, 10, 0)
+        for text in ("绕水平轴", "绕竖直轴"):
+            label = QLabel()
+            label.setText(text)
+            label.setFixedWidth(60)
+            slider = QSlider(Qt.Orientation.Horizontal)
+            slider.setRange(-90, 90)
+            slider.setValue(0)
+            slider.setSingleStep(1)
+            value = QLabel()
+            value.setText("0°")
+            value.setFixedWidth(40)
+            value.setAlignment(Qt.AlignmentFlag.AlignRight)
+
+            _layout = QHBoxLayout()
+            _layout.addWidget(label)
+            _layout.addWidget(slider)
+            _layout.addWidget(value)
+            layout.addLayout(_layout)
+
+            # 拖动时实时重建
+            slider.valueChanged.connect(self.change)
+            self.sliders.append(slider)
+            self.labels.append(value)
+
+        button = QPushButton()
+        button.setText("重置")
+        button.setFixedWidth(80)
+        layout.addWidget(button, alignment=Qt.AlignmentFlag.AlignHCenter)
+        self.setLayout(layout)
+
+        button.clicked.connect(self.reset)
+
+    def change(self):
+        a, b = (s.value() for s in self.sliders)
+        self.labels[0].setText(f"{a}°")
+        self.labels[1].setText(f"{b}°")
+        self.changed.emit(float(a), float(b))
+
+    def set_angles(self, a: float, b: float):
+        for slider, v in zip(self.sliders, (a, b)):
+            slider.blockSignals(True)
+            slider.setValue(int(v))
+            slider.blockSignals(False)
+        self.labels[0].setText(f"{int(a)}°")
+        self.labels[1].setText(f"{int(b)}°")
+
+    def reset(self):
+        self.set_angles(0, 0)
+        self.change()
@@ -1,12 +1,15 @@
 import copy
-from typing import Union
+import math
+import os
+from contextlib import nullcontext
+from typing import List, Union
 
 import numpy as np
 from PyQt6.QtCore import QPointF, QRectF, Qt, pyqtSignal
-from PyQt6.QtGui import QColor, QMouseEvent, QPainter, QPen, QResizeEvent, QWheelEvent
+from PyQt6.QtGui import QColor, QFont, QMouseEvent, QPainter, QPaintEvent, QPen, QResizeEvent, QWheelEvent
 from PyQt6.QtWidgets import QGraphicsScene, QGraphicsView, QWidget
 
-from utility import MedicalImage, MedicalImage2
+from utility import VIEW_TO_AXES, FrameTimer, MedicalImage, MedicalImage2, ObliquePlane
 
 from .image_item import ImageItem
 from .image_item2 import ImageItem2
@@ -16,6 +19,7 @@ from .message_box import warning
 class ImageView(QGraphicsView):
     position_changed = pyqtSignal(int, int, int)
     PJI_box_selected = pyqtSignal(int, int)
+    curve_changed = pyqtSignal()
 
     def __init__(self, view: str, image: Union[MedicalImage, MedicalImage2], parent: QWidget = None):
         # 初始化
@@ -51,6 +55,15 @@ class ImageView(QGraphicsView):
         #
         self._scale_current = {"s": (1.0, 1.0), "c": (1.0, 1.0), "t": (1.0, 1.0)}
         self._scale_default = None
+        # 斜切面的倾斜角度
+        self._angles = {"s": (0.0, 0.0), "c": (0.0, 0.0), "t": (0.0, 0.0)}
+        # 厚层投影 (mode, thickness)，None 表示单层
+        self.slab = None
+        # 当前显示的切面 (view, position, angles, slab)
+        self._rendered = None
+        # 帧时间统计与叠加显示，设置环境变量 VIS_FRAME_LOG 时默认开启统计
+        self.frame_timer: FrameTimer = FrameTimer() if os.environ.get("VIS_FRAME_LOG") else None
+        self.hud = False
         #
         self.set_image(image)
 
@@ -60,6 +73,8 @@ class ImageView(QGraphicsView):
         #
         self.PJI_mode = False
         self.PJI_box = None
+        # 曲面重建的折线顶点(物理坐标)，None 表示不在选点状态
+        self.curve_points: List[np.ndarray] = None
 
     @property
     def position(self):
@@ -85,18 +100,47 @@ class ImageView(QGraphicsView):
     def scale_current(self, v):
         self._scale_current[self.view] = v
 
+    @property
+    def angles(self):
+        return self._angles[self.view]
+
+    @property
+    def level(self):
+        # 根据当前缩放倍数选择金字塔层
+        sx, sy = self.scale_current
+        return self.image.pyramid.level_for_scale(self.view, max(abs(sx), abs(sy)))
+
     @property
     def image_rect(self):
         return self.image_item.boundingRect()
 
+    # 斜切面的几何，轴向切面时为 None
+    @property
+    def oblique(self):
+        if self.angles == (0.0, 0.0):
+            return None
+        return ObliquePlane(self.image.size, self.image.spacing, self.view, self.position, self.angles)
+
+    # 十字线中心对应的体素 (z, y, x)，斜切面上取十字线中心最近的体素
+    @property
+    def voxel(self):
+        if self.oblique is None:
+            return self._position["t"] - 1, self._position["c"] - 1, self._position["s"] - 1
+        point = self.scene_pos_to_point(self._scene_pos)
+        x, y, z = (
+            min(max(int(math.floor(point[i] / self.image.spacing[i] + 0.5)), 0), self.image.size[i] - 1)
+            for i in range(3)
+        )
+        return z, y, x
+
     @property
     def image_value(self):
-        return self.image.array[self._position["t"] - 1, self._position["c"] - 1, self._position["s"] - 1]
+        return self.image.array[self.voxel]
 
     @property
     def image_value_pt(self):
         if self.image.modality == "PTCT":
-            return self.image.array_pt[self._position["t"] - 1, self._position["c"] - 1, self._position["s"] - 1]
+            return self.image.array_pt[self.voxel]
         else:
             return 0
 
@@ -116,14 +160,13 @@ class ImageView(QGraphicsView):
             if v.y() > self.image_rect.bottom():
                 v.setY(self.image_rect.bottom())
         self._scene_pos = v
-        # 修改 position
-        _pos = int(v.x() - self.image_rect.left()), int(v.y() - self.image_rect.top())
-        if self.view == "t":
-            self._position["s"], self._position["c"] = max(_pos[0], 1), max(_pos[1], 1)
-        elif self.view == "c":
-            self._position["s"], self._position["t"] = max(_pos[0], 1), max(_pos[1], 1)
-        else:
-            self._position["c"], self._position["t"] = max(_pos[0], 1), max(_pos[1], 1)
+        # 修改 position：切面内两个方向取十字线中心最近的体素，斜切面上经倾斜映射，法线方向保持基准切面的位置
+        point = self.scene_pos_to_point(v)
+        row, col, _ = VIEW_TO_AXES[self.view]
+        for axis in (row, col):
+            name = "sct"[axis]
+            p = int(math.floor(point[axis] / self.image.spacing[axis] + 0.5)) + 1
+            self._position[name] = min(max(p, 1), self._position_max[name])
         self.position_changed.emit(self._position["s"], self._position["c"], self._position["t"])
 
     def wheelEvent(self, event: QWheelEvent) -> None:
@@ -134,13 +177,18 @@ class ImageView(QGraphicsView):
                 factor = 1 / 1.05
             self.scale(factor, factor)
             self.scale_current = (self.scale_current[0] * factor, self.scale_current[1] * factor)
+            self.update_level()
         else:
+            self.begin_frame()
             if event.angleDelta().y() > 0:
                 self.position += 1
             else:
                 self.position -= 1
-            # 位置信息改变
-            self.position_changed.emit(self._position["s"], self._position["c"], self._position["t"])
+            # 位置信息改变，斜切面上十字线中心对应的体素随基准切面移动
+            if self.oblique is not None:
+                self.scene_pos = self._scene_pos
+            else:
+                self.position_changed.emit(self._position["s"], self._position["c"], self._position["t"])
 
     def resizeEvent(self, event: QResizeEvent) -> None:
         # scene 的大小随着 view 变化
@@ -149,6 +197,7 @@ class ImageView(QGraphicsView):
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
         if self.dragMode() == QGraphicsView.DragMode.NoDrag:
+            self.begin_frame()
             self.scene_pos = self.mapToScene(event.pos())
             self.scene().update()
             if self.PJI_mode:
@@ -156,11 +205,15 @@ class ImageView(QGraphicsView):
                     min(max(self.scene_pos.x() - 20, self.image_rect.left()), self.image_rect.right() - 40),
                     min(max(self.scene_pos.y() - 20, self.image_rect.top()), self.image_rect.bottom() - 40),
                 )
+            if self.curve_points is not None:
+                self.curve_points.append(self.scene_pos_to_point(self.scene_pos))
+                self.curve_changed.emit()
         else:
             return super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
         if self.dragMode() == QGraphicsView.DragMode.NoDrag:
+            self.begin_frame()
             self.scene_pos = self.mapToScene(event.pos())
             self.scene().update()
             if self.PJI_mode:
@@ -184,44 +237,37 @@ class ImageView(QGraphicsView):
             return super().mouseReleaseEvent(event)
 
     def drawForeground(self, painter: QPainter, rect: QRectF) -> None:
-        painter.setPen(
-            QPen(
-                QColor("#0000FF"),
-                1 / self.scale_current[0],
-                Qt.PenStyle.DotLine,
-                Qt.PenCapStyle.SquareCap,
-                Qt.PenJoinStyle.BevelJoin,
-            )
-        )
-        if self.image_rect.top() < self.scene_pos.y() - 1.5:
-            painter.drawLine(
-                QPointF(self.scene_pos.x(), self.image_rect.top()),
-                QPointF(self.scene_pos.x(), self.scene_pos.y() - 1.5),
-            )
-        if self.scene_pos.y() + 1.5 < self.image_rect.bottom():
-            painter.drawLine(
-                QPointF(self.scene_pos.x(), self.scene_pos.y() + 1.5),
-                QPointF(self.scene_pos.x(), self.image_rect.bottom()),
-            )
-        painter.setPen(
-            QPen(
-                QColor("#0000FF"),
-                1 / self.scale_current[1],
-                Qt.PenStyle.DotLine,
-                Qt.PenCapStyle.SquareCap,
-                Qt.PenJoinStyle.BevelJoin,
-            )
-        )
-        if self.image_rect.left() < self.scene_pos.x() - 1.5:
-            painter.drawLine(
-                QPointF(self.image_rect.left(), self.scene_pos.y()),
-                QPointF(self.scene_pos.x() - 1.5, self.scene_pos.y()),
+        # 十字线：轴向切面上为水平、竖直线，斜切面上为与另外两个方向的切面的交线
+        oblique = self.oblique
+        vertical, horizontal = ((0.0, 1.0), (1.0, 0.0)) if oblique is None else oblique.crosshair()
+        for (dr, dc), scale in ((vertical, self.scale_current[0]), (horizontal, self.scale_current[1])):
+            painter.setPen(
+                QPen(
+                    QColor("#0000FF"),
+                    1 / scale,
+                    Qt.PenStyle.DotLine,
+                    Qt.PenCapStyle.SquareCap,
+                    Qt.PenJoinStyle.BevelJoin,
+                )
             )
-        if self.scene_pos.x() + 1.5 < self.image_rect.right():
-            painter.drawLine(
-                QPointF(self.scene_pos.x() + 1.5, self.scene_pos.y()),
-                QPointF(self.image_rect.right(), self.scene_pos.y()),
+            self.draw_crosshair_line(painter, dc, dr)
+
+        # 曲面重建的折线
+        if self.curve_points:
+            painter.setPen(
+                QPen(
+                    QColor("#FFFF00"),
+                    1 / self.scale_current[0],
+                    Qt.PenStyle.SolidLine,
+                    Qt.PenCapStyle.RoundCap,
+                    Qt.PenJoinStyle.RoundJoin,
+                )
             )
+            scene_points = [self.point_to_scene_pos(p) for p in self.curve_points]
+            for p0, p1 in zip(scene_points[:-1], scene_points[1:]):
+                painter.drawLine(p0, p1)
+            for p in scene_points:
+                painter.drawEllipse(p, 1.5, 1.5)
 
         # 绘制40×40的红色边界框
         if self.PJI_mode and self.PJI_box is not None:
@@ -236,14 +282,86 @@ class ImageView(QGraphicsView):
             )
             painter.drawRect(self.PJI_box[0], self.PJI_box[1], 40, 40)
 
+        # 帧时间叠加显示，使用视口坐标
+        if self.hud and self.frame_timer is not None:
+            painter.save()
+            painter.resetTransform()
+            painter.setFont(QFont("Consolas", 9))
+            painter.setPen(QColor("#00FF00"))
+            for i, line in enumerate(self.frame_timer.lines()):
+                painter.drawText(8, 16 + i * 14, line)
+            painter.restore()
+
+    # 过十字线中心、方向为 (dx, dy) 的直线，裁剪到图像范围内，中心处留出间隙
+    def draw_crosshair_line(self, painter: QPainter, dx: float, dy: float):
+        norm = math.hypot(dx, dy)
+        if norm < 1e-6:
+            return
+        dx, dy = dx / norm, dy / norm
+        x, y = self.scene_pos.x(), self.scene_pos.y()
+        t0, t1 = -math.inf, math.inf
+        for p, d, lo, hi in (
+            (x, dx, self.image_rect.left(), self.image_rect.right()),
+            (y, dy, self.image_rect.top(), self.image_rect.bottom()),
+        ):
+            if abs(d) > 1e-9:
+                t0, t1 = max(t0, min((lo - p) / d, (hi - p) / d)), min(t1, max((lo - p) / d, (hi - p) / d))
+        if t0 < -1.5:
+            painter.drawLine(QPointF(x + dx * t0, y + dy * t0), QPointF(x - dx * 1.5, y - dy * 1.5))
+        if 1.5 < t1:
+            painter.drawLine(QPointF(x + dx * 1.5, y + dy * 1.5), QPointF(x + dx * t1, y + dy * t1))
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        if self.frame_timer is None:
+            return super().paintEvent(event)
+        with self.stage("paint"):
+            super().paintEvent(event)
+        self.frame_timer.end()
+
+    # 帧开始：输入事件或切面改变
+    def begin_frame(self):
+        if self.frame_timer is not None:
+            FrameTimer.current = self.frame_timer
+            self.frame_timer.begin()
+
+    # 记录当前帧中一个阶段的耗时
+    def stage(self, name: str):
+        if self.frame_timer is None or self.frame_timer.t0 is None:
+            return nullcontext()
+        return self.frame_timer.stage(name)
+
+    # 帧时间叠加显示
+    def set_hud(self, enabled: bool):
+        if enabled and self.frame_timer is None:
+            self.frame_timer = FrameTimer()
+        self.hud = enabled
+        self.viewport().update()
+
     def position_to_scene_pos(self):
-        if self.view == "t":
-            pos = (self._position["s"], self._position["c"])
-        elif self.view == "c":
-            pos = (self._position["s"], self._position["t"])
+        point = [(self._position[name] - 1) * self.image.spacing[i] for i, name in enumerate("sct")]
+        return self.point_to_scene_pos(point)
+
+    # 物理坐标 (x, y, z) -> 场景坐标，像素中心位于 +0.5 处；斜切面上经倾斜映射
+    def point_to_scene_pos(self, point) -> QPointF:
+        oblique = self.oblique
+        if oblique is None:
+            row, col, _ = VIEW_TO_AXES[self.view]
+            r, c = point[row] / self.image.spacing[row], point[col] / self.image.spacing[col]
         else:
-            pos = (self._position["c"], self._position["t"])
-        return QPointF(self.image_rect.left() + pos[0] + 0.5, self.image_rect.top() + pos[1] + 0.5)
+            r, c = oblique.from_point(point)
+        return QPointF(self.image_rect.left() + float(c) + 0.5, self.image_rect.top() + float(r) + 0.5)
+
+    # 场景坐标 -> 物理坐标 (x, y, z)，轴向切面上法线方向取当前切面的位置
+    def scene_pos_to_point(self, v: QPointF) -> np.ndarray:
+        r, c = v.y() - self.image_rect.top() - 0.5, v.x() - self.image_rect.left() - 0.5
+        oblique = self.oblique
+        if oblique is not None:
+            return oblique.to_point(r, c)
+        row, col, normal = VIEW_TO_AXES[self.view]
+        point = np.zeros(3)
+        point[row], point[col] = r * self.image.spacing[row], c * self.image.spacing[col]
+        point[normal] = (self.position - 1) * self.image.spacing[normal]
+        return point
 
     def reset(self):
         _size_s, _size_c, _size_t = (s1 * s2 for s1, s2 in zip(self.image.size, self.image.spacing))
@@ -261,13 +379,14 @@ class ImageView(QGraphicsView):
         self.resetTransform()
         self.centerOn(0, 0)
         self.scale(*self.scale_default)  # x, y
+        self.update_level()
 
     # 切换视图
     def set_view(self, view: str):
         self.view = view
         self.reset()
         if self.image is not None:
-            self.set_image_item(self.image.plane(self.view, self.position))
+            self.set_plane_item()
             self.scene_pos = self.position_to_scene_pos()
         if self.label is not None:
             self.set_label_item(self.label.plane_origin(self.view, self.position))
@@ -293,17 +412,49 @@ class ImageView(QGraphicsView):
             self.scene().setBackgroundBrush(QColor(*[round(_ * 255) for _ in self.image.cmap(0)]))
 
         # 添加图像
-        self.set_image_item(self.image.plane(self.view, self.position))
+        self.set_plane_item()
 
     # 设置ImageItem
-    def set_image_item(self, image_array: np.ndarray):
-        if self.image_item is not None:
+    def set_image_item(self, image_array: np.ndarray, level: int = 0):
+        first = self.image_item is None
+        if not first:
             self.scene().removeItem(self.image_item)  # 清除图像
         else:
             self.reset()  # 缩放
 
-        self.image_item = ImageItem(image_array)
+        h, w = self.image.pyramid.plane_shape(self.view)
+        with self.stage("pixmap"):
+            self.image_item = ImageItem(image_array, (w, h), level)
         self.scene().addItem(self.image_item)
+        if first:
+            self.update_level()
+
+    # 以当前金字塔层设置ImageItem
+    def set_plane_item(self):
+        level = self.level
+        if self.slab is not None:
+            # 厚层投影按原始分辨率增量更新
+            mode, thickness = self.slab
+            self.set_image_item(self.image.plane_slab(self.view, self.position, thickness, mode), level)
+        elif self.angles != (0.0, 0.0):
+            # 斜切面按与金字塔层相同的分辨率重建
+            self.set_image_item(self.image.plane_oblique(self.view, self.position, self.angles, level), level)
+        else:
+            self.set_image_item(self.image.plane(self.view, self.position, level=level), level)
+        self._rendered = (self.view, self.position, self.angles, self.slab)
+
+    # 设置斜切面的倾斜角度
+    def set_angles(self, a: float, b: float):
+        self._angles[self.view] = (float(a), float(b))
+        self.update_plane()
+        # 十字线保持在屏幕上的位置，重新映射对应的体素
+        self.scene_pos = self._scene_pos
+        self.scene().update()
+
+    # 缩放后金字塔层改变时更新图像
+    def update_level(self):
+        if self.image_item is not None and self.image_item.level != self.level:
+            self.set_plane_item()
 
     def set_label(self, label: MedicalImage):
         if self.image is None:
@@ -315,10 +466,11 @@ class ImageView(QGraphicsView):
             self.set_label_item(self.label.plane_origin(self.view, self.position))
 
     def set_label_item(self, labelArray: np.ndarray):
-        if self.label_item is not None:
-            self.scene().removeItem(self.label_item)  # 清除分割图
-        self.label_item = ImageItem2(labelArray, self.label_opacity)
-        self.scene().addItem(self.label_item)
+        with self.stage("label"):
+            if self.label_item is not None:
+                self.scene().removeItem(self.label_item)  # 清除分割图
+            self.label_item = ImageItem2(labelArray, self.label_opacity)
+            self.scene().addItem(self.label_item)
 
     def set_label_opacity(self, v: float):
         self.label_opacity = v
@@ -327,11 +479,29 @@ class ImageView(QGraphicsView):
 
     # 设置当前平面
     def set_current_plane(self):
+        self.begin_frame()
         if self.image is not None:
-            self.set_image_item(self.image.plane(self.view, self.position))
+            self.set_plane_item()
         if self.label is not None:
             self.set_label_item(self.label.plane_origin(self.view, self.position))
 
+    # 仅当显示的切面改变时才重新渲染
+    def update_plane(self):
+        if self._rendered != (self.view, self.position, self.angles, self.slab):
+            self.set_current_plane()
+
+    # 设置厚层投影：mode 为 None 时显示单层
+    def set_slab(self, mode: str, thickness: int):
+        self.slab = (mode, max(int(thickness), 1)) if mode is not None else None
+        self.update_plane()
+
+    # 与其他视图同步位置：更新十字线，当前视图方向上的位置改变时才重新渲染
+    def set_position(self, s: int, c: int, t: int):
+        self._position = {"s": s, "c": c, "t": t}
+        self.update_plane()
+        self._scene_pos = self.position_to_scene_pos()
+        self.scene().update()
+
     def mirror1(self):  # 水平镜像
         self.scale(-1, 1)
 
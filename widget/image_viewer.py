@@ -1,5 +1,5 @@
 import enum
-from typing import Union
+from typing import List, Union
 
 import numpy as np
 import pydicom
@@ -20,11 +20,17 @@ from PyQt6.QtWidgets import (
 )
 
 from utility import VIEW_TO_NAME, MedicalImage, MedicalImage2, read_nifti
+from utility.memory import MemoryCounter
 from worker import FRIWorker, PJIWorker
 
+from .image_cine import ImageCine
 from .image_constrast import ImageConstrast
+from .image_curved import ImageCurved
+from .image_oblique import ImageOblique
 from .image_view import ImageView
+from .mpr_view import MPRView
 from .message_box import TimerMessageBox, information
+from .mip_player import MIPPlayer
 from .note import Note
 
 
@@ -54,6 +60,10 @@ class ImageViewer(QMainWindow):
 
         self.view = ImageView("t", image, self)
         self.setCentralWidget(self.view)
+        # 三视图联动布局
+        self.mpr: MPRView = None
+        # 被内存预算挂起
+        self.suspended = False
         self.view.PJI_box_selected.connect(self.get_pji_box)
 
         self.toolbar = QToolBar()
@@ -128,6 +138,16 @@ class ImageViewer(QMainWindow):
         view_sagittal = view_menu.addAction(QIcon("asset/icon/S.png"), "矢状面")
         view_coronal = view_menu.addAction(QIcon("asset/icon/C.png"), "冠状面")
         view_transverse = view_menu.addAction(QIcon("asset/icon/T.png"), "横截面")
+        view_menu.addSeparator()
+        view_mpr = view_menu.addAction(QIcon("asset/icon/view.png"), "三视图联动")
+        view_mpr.setCheckable(True)
+        view_mip = view_menu.addAction(QIcon("asset/icon/view.png"), "旋转MIP")
+        view_mip.setEnabled(image.channel == 1)
+        view_menu.addSeparator()
+        view_hud = view_menu.addAction("帧时间")
+        view_hud.setCheckable(True)
+        view_export = view_menu.addAction("导出帧时间")
+        self.mip_window: MIPPlayer = None
         view_button.setMenu(view_menu)
         self.toolbar.addWidget(view_button)
 
@@ -146,9 +166,40 @@ class ImageViewer(QMainWindow):
         operate_menu.addSeparator()
         operate_rotate1 = operate_menu.addAction(QIcon("asset/icon/rotate1.png"), "顺时针旋转")
         operate_rotate2 = operate_menu.addAction(QIcon("asset/icon/rotate2.png"), "逆时针旋转")
+        operate_menu.addSeparator()
+        operate_oblique = operate_menu.addAction(QIcon("asset/icon/rotate1.png"), "斜切面")
+        self.oblique_window = ImageOblique(self)
+        operate_curved = operate_menu.addAction(QIcon("asset/icon/rotate1.png"), "曲面重建")
+        self.curved_window = ImageCurved(self.view, self)
+        operate_cine = operate_menu.addAction(QIcon("asset/icon/slide.png"), "电影")
+        self.cine_window = ImageCine(self.view, self)
+        self.cine_window.view_requested.connect(self.set_view)
         operate_button.setMenu(operate_menu)
         self.toolbar.addWidget(operate_button)
 
+        # 厚层投影：单层、MIP、MinIP、平均
+        self.slab_button = QToolButton()
+        self.slab_button.setText("单层")
+        self.slab_button.setIcon(QIcon("asset/icon/view.png"))
+        self.slab_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
+        self.slab_button.setAutoRaise(True)
+        self.slab_button.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        slab_menu = QMenu()
+        slab_single = slab_menu.addAction("单层")
+        slab_mip = slab_menu.addAction("MIP")
+        slab_minip = slab_menu.addAction("MinIP")
+        slab_mean = slab_menu.addAction("平均")
+        self.slab_button.setMenu(slab_menu)
+        self.slab_thickness = QLineEdit()
+        self.slab_thickness.setValidator(QIntValidator(1, max(self.view._position_max.values())))
+        self.slab_thickness.setText("10")
+        self.slab_thickness.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.slab_thickness.setFixedWidth(30)
+        self.slab_thickness.setFont(QFont("Times New Roman", 12))
+        self.slab_mode: str = None
+        self.toolbar.addWidget(self.slab_button)
+        self.toolbar.addWidget(self.slab_thickness)
+
         # 鼠标左键
         self.mouse_left_button = QToolButton()
         self.mouse_left_button.setText("普通")
@@ -183,12 +234,9 @@ class ImageViewer(QMainWindow):
         constrast_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
         self.constrast_window = ImageConstrast()
         self.toolbar.addWidget(constrast_button)
-        # 设置默认值
-        mi, ma = image.array.min(), image.array.max()
-        self.constrast_window.edit_min.setText(f"{mi:.2f}")
-        self.constrast_window.edit_max.setText(f"{ma:.2f}")
-        self.constrast_window.edit_window_level.setText(f"{(mi + ma) / 2:.2f}")
-        self.constrast_window.edit_window_width.setText(f"{ma- mi:.2f}")
+        # 设置默认值，使用加载时预先计算的统计
+        self.constrast_window.set_statistics(image.statistics, image.modality)
+        self.constrast_window.set_window(image.statistics.min, image.statistics.max)
 
         if self.toolbar_mode == self.ToolbarMode.Bimodal:
             self.constrast_slider = QSlider(Qt.Orientation.Horizontal)
@@ -248,12 +296,26 @@ class ImageViewer(QMainWindow):
         view_sagittal.triggered.connect(lambda: self.set_view("s"))
         view_coronal.triggered.connect(lambda: self.set_view("c"))
         view_transverse.triggered.connect(lambda: self.set_view("t"))
+        view_mpr.toggled.connect(self.toggle_mpr)
+        view_mip.triggered.connect(self.show_mip)
+        view_hud.toggled.connect(self.set_hud)
+        view_export.triggered.connect(self.export_frame_times)
 
-        operate_reset.triggered.connect(self.view.reset)
+        operate_reset.triggered.connect(self.reset_view)
         operate_mirror1.triggered.connect(self.view.mirror1)
         operate_mirror2.triggered.connect(self.view.mirror2)
         operate_rotate1.triggered.connect(self.view.rotate1)
         operate_rotate2.triggered.connect(self.view.rotate2)
+        operate_oblique.triggered.connect(self.show_oblique)
+        operate_cine.triggered.connect(self.cine_window.show)
+        self.oblique_window.changed.connect(lambda a, b: self.view.set_angles(a, b))
+        operate_curved.triggered.connect(self.curved_window.show)
+
+        slab_single.triggered.connect(lambda: self.set_slab(None, "单层"))
+        slab_mip.triggered.connect(lambda: self.set_slab("mip", "MIP"))
+        slab_minip.triggered.connect(lambda: self.set_slab("minip", "MinIP"))
+        slab_mean.triggered.connect(lambda: self.set_slab("mean", "平均"))
+        self.slab_thickness.editingFinished.connect(lambda: self.set_slab(self.slab_mode, self.slab_button.text()))
 
         mouse_left_normal.triggered.connect(self.activate_normal_mode)
         mouse_left_drag.triggered.connect(self.activate_drag_mode)
@@ -271,40 +333,151 @@ class ImageViewer(QMainWindow):
 
         self.ai_button.clicked.connect(self.inference)
 
+    # 统计当前标签页持有的内存
+    def memory(self, counter: MemoryCounter, name: str):
+        counter.add_image(f"{name}.image", self.view.image)
+        for view in self.views():
+            counter.add_image(f"{name}.label", view.label)
+
+    # 关闭标签页时停止后台任务，释放可重新计算的缓存；图像仍被其他标签页使用时保留缓存
+    def release(self, drop_caches: bool = True):
+        self.stop_workers()
+        if self.mpr is not None:
+            self.toggle_mpr(False)
+        for view in self.views():
+            view.label = None
+            view.scene().clear()
+            view.image_item = view.label_item = None
+        if drop_caches:
+            self.drop_caches()
+        # 融合图像由标签页独占，归还共享的 CT 与重采样后的 PET
+        if isinstance(self.view.image, MedicalImage2):
+            self.view.image.release()
+
+    def stop_workers(self):
+        self.cine_window.hide()
+        self.curved_window.hide()
+        self.cine_window.prefetch_worker.wait()
+        if self.mip_window is not None:
+            self.mip_window.hide()
+
+    # 标签页使用的图像
+    def source_images(self) -> list:
+        return [self.view.image]
+
+    # 清空可重新计算的缓存：渲染缓存、金字塔与厚层投影
+    def drop_caches(self):
+        image = self.view.image
+        image.plane_cache.clear()
+        for attr in ("pyramid", "pyramid_pt"):
+            if getattr(image, attr, None) is not None:
+                getattr(image, attr).clear()
+        for attr in ("projectors", "projectors_pt"):
+            if hasattr(image, attr):
+                getattr(image, attr).clear()
+
+    # 挂起：停止后台任务，屏幕上保留最后显示的切面，图像由内存预算决定是否换出
+    def suspend(self):
+        self.stop_workers()
+        self.drop_caches()
+        self.suspended = True
+
+    # 恢复：图像恢复后重新渲染当前切面
+    def resume(self):
+        for image in self.source_images():
+            image.resume()
+        self.suspended = False
+        for view in self.views():
+            view._rendered = None
+            view.set_current_plane()
+
+    # 当前显示的所有视图
+    def views(self) -> List[ImageView]:
+        return self.mpr.panes if self.mpr is not None else [self.view]
+
+    # 三视图联动
+    def toggle_mpr(self, checked: bool):
+        if checked and self.mpr is None:
+            self.takeCentralWidget()
+            self.mpr = MPRView(self.view, self)
+            self.mpr.position_changed.connect(self.set_position)
+            self.setCentralWidget(self.mpr)
+        elif not checked and self.mpr is not None:
+            self.takeCentralWidget()
+            self.mpr.release()
+            self.mpr.deleteLater()
+            self.mpr = None
+            self.setCentralWidget(self.view)
+            self.view.show()
+        self.reset_view()
+
+    # 旋转MIP：非模态窗口，帧在后台计算
+    def show_mip(self):
+        if self.mip_window is None:
+            self.mip_window = MIPPlayer(self.view.image, self)
+        self.mip_window.show()
+        self.mip_window.raise_()
+
+    # 帧时间叠加显示
+    def set_hud(self, enabled: bool):
+        for view in self.views():
+            view.set_hud(enabled)
+
+    def export_frame_times(self):
+        if self.view.frame_timer is None:
+            information("请先开启帧时间统计。")
+            return
+        filename = QFileDialog().getSaveFileName(
+            self, "导出帧时间", "./frame_times.json", filter="JSON(*.json);;CSV(*.csv)"
+        )
+        if len(filename[0]) == 0:
+            return
+        self.view.frame_timer.export(filename[0])
+
+    def reset_view(self):
+        for view in self.views():
+            view.reset()
+
     # 普通
     def activate_normal_mode(self):
         self.mouse_left_button.setText("普通")
         self.mouse_left_button.setIcon(QIcon("asset/icon/arrow.png"))
-        self.view.setDragMode(QGraphicsView.DragMode.NoDrag)
+        for view in self.views():
+            view.setDragMode(QGraphicsView.DragMode.NoDrag)
 
     # 拖动
     def activate_drag_mode(self):
         self.mouse_left_button.setText("拖动")
         self.mouse_left_button.setIcon(QIcon("asset/icon/drag.png"))
-        self.view.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+        for view in self.views():
+            view.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
 
     # 缩放
     def activate_resize_mode(self):
         self.wheel_button.setText("缩放")
         self.wheel_button.setIcon(QIcon("asset/icon/resize.png"))
-        self.view.resize_or_slide = True
+        for view in self.views():
+            view.resize_or_slide = True
 
     # 切换
     def activate_slide_mode(self):
         self.wheel_button.setText("切换")
         self.wheel_button.setIcon(QIcon("asset/icon/slide.png"))
-        self.view.resize_or_slide = False
+        for view in self.views():
+            view.resize_or_slide = False
 
     # 调整对比度
     def adjust_constrast(self, mi, ma):
         if self.view.image is not None:
             self.view.image.normlize(mi, ma)
-            self.view.set_current_plane()
+            for view in self.views():
+                view.set_current_plane()
 
     def adjust_constrast2(self):
         if self.view.image is not None:
             self.view.image.normlize_pt(self.constrast_slider.value() * 0.1)
-            self.view.set_current_plane()
+            for view in self.views():
+                view.set_current_plane()
 
     def validate_constrast_max2(self, t: str):
         if t == "" or float(t) <= 0:
@@ -325,15 +498,37 @@ class ImageViewer(QMainWindow):
             return
 
         labelImage = read_nifti(filename[0], True)
-        self.view.set_label(labelImage)
+        self.set_label(labelImage)
+
+    def set_label(self, label: MedicalImage):
+        for view in self.views():
+            view.set_label(label)
 
     # 调整分割图透明度
     def adjust_label_opacity(self, v: int):
-        self.view.set_label_opacity(v * 0.01)
+        for view in self.views():
+            view.set_label_opacity(v * 0.01)
 
     def set_view(self, v: str):
-        self.view.set_view(v)
+        if self.mpr is not None:
+            self.mpr.set_view(v)
+        else:
+            self.view.set_view(v)
         self.view_name.setText(VIEW_TO_NAME[v])
+        self.oblique_window.set_angles(*self.view.angles)
+
+    # 斜切面：以当前视图为基准倾斜，非模态窗口，拖动滑块时实时重建
+    def show_oblique(self):
+        self.oblique_window.set_angles(*self.view.angles)
+        self.oblique_window.show()
+
+    # 厚层投影，滚动切面时增量更新
+    def set_slab(self, mode: str, name: str):
+        self.slab_mode = mode
+        self.slab_button.setText(name)
+        thickness = int(self.slab_thickness.text()) if self.slab_thickness.text() else 1
+        for view in self.views():
+            view.set_slab(mode, thickness)
 
     def set_position(self, s: int, c: int, t: int):
         self.position["s"].set_value(str(s))
@@ -348,10 +543,14 @@ class ImageViewer(QMainWindow):
         else:
             self.pixel_value1.set_value(f"{self.view.image_value:.2f}")
             self.pixel_value2.set_value(f"{self.view.image_value_pt:.2f}")
-        self.view.set_current_plane()
+        self.view.update_plane()
 
     def edit_position(self, v: str):
         self.view._position[v] = int(self.position[v].text)
+        self.view.set_current_plane()
+        self.view.scene_pos = self.view.position_to_scene_pos()
+        self.view.scene().update()
+        # 斜切面上的像素值按十字线中心读取，需在十字线更新之后
         if self.toolbar_mode == self.ToolbarMode.Gray:
             self.pixel_value.set_value(f"{self.view.image_value:.2f}")
         elif self.toolbar_mode == self.ToolbarMode.RGB:
@@ -361,9 +560,6 @@ class ImageViewer(QMainWindow):
         else:
             self.pixel_value1.set_value(f"{self.view.image_value:.2f}")
             self.pixel_value2.set_value(f"{self.view.image_value_pt:.2f}")
-        self.view.set_current_plane()
-        self.view.scene_pos = self.view.position_to_scene_pos()
-        self.view.scene().update()
 
     def inference(self):
         # TODO: 整合入模型
@@ -425,7 +621,7 @@ class ImageViewer(QMainWindow):
             "OT",
             1,
         )
-        self.view.set_label(roi_image)
+        self.set_label(roi_image)
         #
         direction = "left" if left + 19 <= 64 else "right"
         self.woker = PJIWorker(self.view.image[0:25, top : top + 40, left : left + 40], "hip", direction)
@@ -464,4 +660,4 @@ class ImageViewer(QMainWindow):
             "OT",
             1,
         )
-        self.view.set_label(result_image)
+        self.set_label(result_image)
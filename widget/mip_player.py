@@ -0,0 +1,157 @@
+from typing import List, Union
+
+import numpy as np
+from PyQt6.QtCore import Qt, QThread, QTimer
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import (
+    QComboBox,
+    QDialog,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSlider,
+    QSpinBox,
+    QVBoxLayout,
+    QWidget,
+)
+
+from utility import MedicalImage, MedicalImage2
+from worker import MIPWorker
+
+
+class MIPPlayer(QDialog):
+    """
+    旋转 MIP 播放：各帧在后台线程池中计算，完成一帧显示一帧；计算完成后播放只需贴图。
+    各帧保存在窗口中(帧数 × 单帧大小)，隐藏后再次显示只计算缺少的帧，图像的颜色改变后全部重新计算
+    """
+
+    def __init__(self, image: Union[MedicalImage, MedicalImage2], parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self.image = image
+        self.worker: MIPWorker = None
+        self.frames: List[QPixmap] = []
+        # 各帧对应的图像渲染缓存代数
+        self.generation: int = None
+        self.index = 0
+
+        self.resize(600, 800)
+        self.setWindowTitle("旋转MIP")
+
+        self.canvas = QLabel()
+        self.canvas.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.canvas.setMinimumSize(200, 200)
+        self.canvas.setStyleSheet("background-color: #000000;")
+
+        self.play_button = QPushButton()
+        self.play_button.setText("播放")
+        self.play_button.setFixedWidth(60)
+        self.slider = QSlider(Qt.Orientation.Horizontal)
+        self.slider.setSingleStep(1)
+        self.count = QComboBox()
+        self.count.addItems(["36", "72"])
+        self.fps = QSpinBox()
+        self.fps.setRange(1, 60)
+        self.fps.setValue(15)
+        self.fps.setSuffix(" fps")
+        self.progress = QLabel()
+        self.progress.setFixedWidth(60)
+        self.progress.setAlignment(Qt.AlignmentFlag.AlignRight)
+
+        _layout = QHBoxLayout()
+        _layout.addWidget(self.play_button)
+        _layout.addWidget(self.slider)
+        _layout.addWidget(self.count)
+        _layout.addWidget(self.fps)
+        _layout.addWidget(self.progress)
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas, 1)
+        layout.addLayout(_layout)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.next_frame)
+
+        self.play_button.clicked.connect(self.toggle_play)
+        self.slider.valueChanged.connect(self.show_frame)
+        self.count.currentTextChanged.connect(lambda t: self.compute(int(t)))
+        self.fps.valueChanged.connect(lambda v: self.timer.setInterval(int(1000 / v)))
+
+    def compute(self, frames: int):
+        self.stop_worker()
+        generation = self.image.plane_cache.generation
+        if frames != len(self.frames) or generation != self.generation:
+            self.frames = [None] * frames
+            self.generation = generation
+            self.slider.setRange(0, frames - 1)
+        missing = [i for i, f in enumerate(self.frames) if f is None]
+        self.progress.setText(f"{frames - len(missing)}/{frames}")
+        if not missing:
+            return
+        self.worker = MIPWorker(self.image, frames, missing, self.generation)
+        self.worker.frame_ready.connect(self.add_frame)
+        self.worker.finished.connect(self.worker_finished)
+        self.worker.start(QThread.Priority.LowPriority)
+
+    def stop_worker(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker.frame_ready.disconnect(self.add_frame)
+            self.worker.finished.disconnect(self.worker_finished)
+            self.worker.wait()
+            self.worker = None
+
+    def worker_finished(self):
+        # 计算期间图像的颜色改变，重新计算所有帧
+        if self.generation != self.image.plane_cache.generation and self.isVisible():
+            self.compute(len(self.frames))
+
+    def add_frame(self, index: int, frame: np.ndarray):
+        if index >= len(self.frames):
+            return
+        image = QImage(
+            frame.data.tobytes(), frame.shape[1], frame.shape[0], frame.shape[1] * 3, QImage.Format.Format_RGB888
+        )
+        self.frames[index] = QPixmap.fromImage(image)
+        done = sum(f is not None for f in self.frames)
+        self.progress.setText(f"{done}/{len(self.frames)}")
+        if index == self.index or self.canvas.pixmap().isNull():
+            self.show_frame(index)
+
+    def show_frame(self, index: int):
+        self.index = index
+        if self.frames[index] is not None:
+            self.canvas.setPixmap(
+                self.frames[index].scaled(
+                    self.canvas.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+                )
+            )
+
+    def next_frame(self):
+        # 跳过尚未计算完成的帧
+        for step in range(1, len(self.frames) + 1):
+            index = (self.index + step) % len(self.frames)
+            if self.frames[index] is not None:
+                self.slider.setValue(index)
+                return
+
+    def toggle_play(self):
+        if self.timer.isActive():
+            self.timer.stop()
+            self.play_button.setText("播放")
+        else:
+            self.timer.start(int(1000 / self.fps.value()))
+            self.play_button.setText("暂停")
+
+    def showEvent(self, event) -> None:
+        # 已保存的帧直接显示，只计算缺少的帧
+        if self.worker is None:
+            self.compute(int(self.count.currentText()))
+            if self.frames[self.index] is not None:
+                self.show_frame(self.index)
+        super().showEvent(event)
+
+    def hideEvent(self, event) -> None:
+        self.timer.stop()
+        self.play_button.setText("播放")
+        self.stop_worker()
+        super().hideEvent(event)
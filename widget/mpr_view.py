@@ -0,0 +1,80 @@
+from typing import List
+
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QGridLayout, QWidget
+
+from .image_view import ImageView
+
+
+class MPRView(QWidget):
+    """
+    三视图联动布局：主视图与另外两个方向的视图共享同一个图像实例、归一化结果与渲染缓存。
+    某个视图中的十字线移动时，只有切面位置发生变化的视图才会重新渲染。
+    """
+
+    position_changed = pyqtSignal(int, int, int)
+
+    def __init__(self, view: ImageView, parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self.main = view
+        self.panes: List[ImageView] = [view]
+        for v in "tcs":
+            if v != view.view:
+                pane = ImageView(v, view.image, self)
+                pane.set_label_opacity(view.label_opacity)
+                self.panes.append(pane)
+
+        layout = QGridLayout()
+        layout.setSpacing(2)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.panes[0], 0, 0, 2, 1)
+        layout.addWidget(self.panes[1], 0, 1, 1, 1)
+        layout.addWidget(self.panes[2], 1, 1, 1, 1)
+        layout.setColumnStretch(0, 2)
+        layout.setColumnStretch(1, 1)
+        self.setLayout(layout)
+
+        for pane in self.panes:
+            pane.position_changed.connect(lambda s, c, t, pane=pane: self.sync(pane, s, c, t))
+        for pane in self.panes[1:]:
+            pane.setDragMode(view.dragMode())
+            pane.resize_or_slide = view.resize_or_slide
+            if view.label is not None:
+                pane.set_label(view.label)
+            if view.slab is not None:
+                pane.set_slab(*view.slab)
+            if view.hud:
+                pane.set_hud(True)
+            pane.set_position(view._position["s"], view._position["c"], view._position["t"])
+
+    def sync(self, source: ImageView, s: int, c: int, t: int):
+        for pane in self.panes:
+            if pane is not source and pane is not self.main:
+                pane.set_position(s, c, t)
+        # 主视图由 ImageViewer 处理
+        if source is not self.main:
+            self.main.set_position(s, c, t)
+            self.position_changed.emit(s, c, t)
+
+    def set_view(self, view: str):
+        # 与显示该方向的视图交换
+        for pane in self.panes[1:]:
+            if pane.view == view:
+                pane.set_view(self.main.view)
+        self.main.set_view(view)
+
+    def reset(self):
+        for pane in self.panes:
+            pane.reset()
+
+    def set_current_plane(self):
+        for pane in self.panes:
+            pane.set_current_plane()
+
+    def release(self):
+        # 归还主视图，删除其余视图
+        self.layout().removeWidget(self.main)
+        self.main.setParent(None)
+        for pane in self.panes[1:]:
+            pane.deleteLater()
+        self.panes = [self.main]
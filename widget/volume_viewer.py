@@ -1,39 +1,123 @@
-import math
+import os
+import time
+import weakref
+from collections import deque
 from typing import List, Tuple, Union
 
 import numpy as np
 import SimpleITK as sitk
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QFileDialog, QMainWindow, QMenu, QMessageBox, QSlider, QToolBar, QToolButton, QWidget
-from vtkmodules.all import vtkActor, vtkRenderer, vtkTextActor3D, vtkVolume
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QGuiApplication, QHideEvent, QIcon, QShowEvent
+from PyQt6.QtWidgets import (
+    QFileDialog,
+    QInputDialog,
+    QMainWindow,
+    QMenu,
+    QMessageBox,
+    QSlider,
+    QToolBar,
+    QToolButton,
+    QWidget,
+)
+from vtkmodules.all import vtkActor, vtkInteractorStyleTrackballCamera, vtkRenderer, vtkRenderWindow, vtkVolume
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 
 from utility import (
+    BBoxLayer,
     MedicalImage,
     MedicalImage2,
-    bbox,
+    downsample,
     get_body_mask,
     get_colors,
     json_to_labels,
+    look_at,
+    mask_body,
     nifti_to_labels,
+    set_volume_input,
+    set_volume_preset,
     volume_ct,
     volume_pt,
 )
-from worker import FRIWorker
+from utility.memory import MemoryCounter
+from utility.surface import SURFACES, drop_surfaces, surface_actor
+from utility.transfer_function import DEFAULT_PRESETS, PRESETS, presets
+from utility.volume_mapper import BACKENDS, INTERPOLATIONS, get_mapper_config, set_mapper_config
+from utility.volume_store import get_volume_store
+from worker import FRIWorker, ProgressiveWorker, SurfaceWorker
 
 from .message_box import TimerMessageBox, error, information
 
 
 class VolumeViewer(QMainWindow):
+    # 隐藏超过该时间(ms)后释放 vtk 体数据与图形资源
+    RELEASE_AFTER = 120 * 1000
+    # 所有三维标签页切换到前台后首次渲染完成的耗时(ms)
+    switch_latency = deque(maxlen=100)
+    # 所有打开的三维标签页，映射器配置改变时一并重建
+    viewers = weakref.WeakSet()
+    # 交互(旋转、缩放)时的目标帧率，0 表示始终以最高质量渲染
+    TARGET_FPS = 10.0
+    # 交互时光线采样步长(mm)的调整范围
+    SAMPLE_DISTANCE_RANGE = (1.0, 8.0)
+    # 映射器不能设置交互采样步长(智能映射器)时，交互时向渲染窗口请求的帧率相对目标帧率的调整范围
+    UPDATE_RATE_RANGE = (1.0, 4.0)
+    # 各模态的图像对应的 vtk 体数据
+    VOLUME_MODALITIES = {"CT": ["CT"], "PT": ["PT"], "PTCT": ["CT", "PT"]}
+    # 体素数超过该值时先显示降采样的体数据，再在后台逐级替换为更高的分辨率
+    PROGRESSIVE_MIN_VOXELS = 256**3
+    # 首先显示的降采样倍数，之后依次为 2 倍与原始分辨率
+    PROGRESSIVE_FACTORS = (4, 2)
+    # 更高分辨率的数据在标签页可见且停止交互超过该时间(ms)后才替换：
+    # 替换后的首次渲染需要在界面线程中重新计算梯度，期间界面无响应
+    REFINE_IDLE_MS = 1000
+
     def __init__(self, image: Union[MedicalImage, MedicalImage2], parent: QWidget = None):
         super().__init__(parent)
+        VolumeViewer.viewers.add(self)
         self.images: List[Union[MedicalImage, MedicalImage2]] = []
         self.volumes: List[List[vtkVolume]] = []
         self.image_body: np.ndarray = None
-        self.actors: List[Tuple[vtkActor, vtkTextActor3D]] = []
+        # 各 vtk 体数据从共享仓库获取的数据的键，与 volumes 一一对应，移除时归还
+        self.volume_keys: List[List[tuple]] = []
+        self.body_key: tuple = None
+        # 是否仅显示人体，切换时只替换映射器的输入
+        self.body_visible = False
+        # 各模态当前使用的传递函数预设
+        self.presets = dict(DEFAULT_PRESETS)
+        # 表面模式：显示等值面网格代替体绘制，None 表示体绘制
+        self.surface_levels: dict = None
+        self.surface_reduction = 0.0
+        self.surface_actors: List[vtkActor] = []
+        self.surface_worker: SurfaceWorker = None
+        # 所有标注框与文本合并为一个图层
+        self.bbox_layer: BBoxLayer = None
+        # 标注框的体素范围，与 view_menu 中主影像之后的选项一一对应
+        self.boxes: List[Tuple[list, list]] = []
         self.label_opacity: float = 0.8
         self.checked_view: int = 0
+        # 被内存预算挂起，或隐藏时间过长而释放
+        self.suspended = False
+        # 切换到前台的时间，首次渲染完成后记录耗时
+        self._shown_at: float = None
+        self._released = False
+        self.release_timer = QTimer(self)
+        self.release_timer.setSingleShot(True)
+        self.release_timer.timeout.connect(self.release_graphics)
+        # 交互时降低采样质量，停止后以最高质量重新渲染
+        self.target_fps = self.TARGET_FPS
+        self.interactive_sample_distance = 2.0
+        self.interactive_update_rate = self.target_fps
+        self.interacting = False
+        self.frame_times = deque(maxlen=500)
+        # 渐进加载：当前显示的降采样倍数，首帧渲染完成后启动后台线程，准备好的数据等标签页空闲时再替换
+        self.level = 1
+        self.progressive_worker: ProgressiveWorker = None
+        self.progressive_pending = False
+        self.pending_level: tuple = None
+        self._opened_at: float = None
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.timeout.connect(self.apply_pending_level)
 
         # 样式
         self.setStyleSheet("QToolBar {border: none;}" "QToolButton::menu-indicator {image: none;}")
@@ -61,7 +145,7 @@ class VolumeViewer(QMainWindow):
 
         label_slider = QSlider(Qt.Orientation.Horizontal)
         label_slider.setRange(0, 100)
-        label_slider.setValue(self.label_opacity * 100)
+        label_slider.setValue(int(self.label_opacity * 100))
         label_slider.setSingleStep(1)
         label_slider.setMinimumWidth(50)
         label_slider.setMaximumWidth(100)
@@ -69,11 +153,12 @@ class VolumeViewer(QMainWindow):
         toolbar.addSeparator()
 
         # 仅保留人体
-        body_button = QToolButton()
-        body_button.setText("人体")
-        body_button.setIcon(QIcon("asset/icon/body.png"))
-        body_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
-        toolbar.addWidget(body_button)
+        self.body_button = QToolButton()
+        self.body_button.setText("人体")
+        self.body_button.setIcon(QIcon("asset/icon/body.png"))
+        self.body_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
+        self.body_button.setCheckable(True)
+        toolbar.addWidget(self.body_button)
 
         # AI
         self.ai_button = QToolButton()
@@ -83,10 +168,79 @@ class VolumeViewer(QMainWindow):
         toolbar.addWidget(self.ai_button)
         self.timer_message_box = TimerMessageBox(QMessageBox.Icon.Information, "正在处理中...")
 
+        # 表面模式
+        self.surface_button = QToolButton()
+        self.surface_button.setText("体绘制")
+        self.surface_button.setIcon(QIcon("asset/icon/body.png"))
+        self.surface_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
+        self.surface_button.setAutoRaise(True)
+        self.surface_button.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        surface_menu = QMenu()
+        surface_menu.addAction("体绘制").triggered.connect(lambda: self.set_surface(None, "体绘制"))
+        surface_menu.addAction("骨骼表面").triggered.connect(
+            lambda: self.set_surface({"bone": SURFACES["bone"][0]}, "骨骼")
+        )
+        surface_menu.addAction("骨骼与金属表面").triggered.connect(
+            lambda: self.set_surface({name: level for name, (level, _) in SURFACES.items()}, "骨骼与金属")
+        )
+        surface_menu.addAction("自定义阈值...").triggered.connect(self.set_custom_surface)
+        surface_menu.addSeparator()
+        decimate_action = surface_menu.addAction("简化网格")
+        decimate_action.setCheckable(True)
+        decimate_action.toggled.connect(self.set_surface_reduction)
+        self.surface_button.setMenu(surface_menu)
+        toolbar.addWidget(self.surface_button)
+
+        # 传递函数预设
+        preset_button = QToolButton()
+        preset_button.setText("预设")
+        preset_button.setIcon(QIcon("asset/icon/view.png"))
+        preset_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
+        preset_button.setAutoRaise(True)
+        preset_button.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        preset_menu = QMenu()
+        for modality in ("CT", "PT"):
+            for name in presets(modality):
+                _action = preset_menu.addAction(f"{modality} - {PRESETS[name].name}")
+                _action.triggered.connect(lambda _, name=name: self.set_preset(name))
+            preset_menu.addSeparator()
+        preset_button.setMenu(preset_menu)
+        toolbar.addWidget(preset_button)
+
+        # 交互帧率
+        self.lod_button = QToolButton()
+        self.lod_button.setText(f"{self.target_fps:g} FPS")
+        self.lod_button.setIcon(QIcon("asset/icon/view.png"))
+        self.lod_button.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextUnderIcon)
+        self.lod_button.setAutoRaise(True)
+        self.lod_button.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        lod_menu = QMenu()
+        for fps in (0, 5, 10, 15, 25):
+            _action = lod_menu.addAction("最高质量" if fps == 0 else f"{fps} FPS")
+            _action.triggered.connect(lambda _, fps=fps: self.set_target_fps(fps))
+        # 映射器配置，修改后保存并应用到所有三维标签页
+        lod_menu.addSeparator()
+        for backend, name in BACKENDS.items():
+            _action = lod_menu.addAction(name)
+            _action.triggered.connect(lambda _, backend=backend: self.set_mapper_config(backend=backend))
+        lod_menu.addSeparator()
+        for interpolation, name in zip(INTERPOLATIONS, ("线性插值", "最近邻插值")):
+            _action = lod_menu.addAction(name)
+            _action.triggered.connect(lambda _, i=interpolation: self.set_mapper_config(interpolation=i))
+        lod_menu.addAction("线程数...").triggered.connect(self.set_mapper_threads)
+        lod_menu.addAction("采样步长...").triggered.connect(self.set_mapper_sample_distance)
+        self.lod_button.setMenu(lod_menu)
+        toolbar.addWidget(self.lod_button)
+
         self.addToolBar(toolbar)
 
         # 三维可视化部件
-        view = QVTKRenderWindowInteractor()
+        render_window = vtkRenderWindow()
+        if QGuiApplication.platformName() == "offscreen":
+            # 没有窗口系统(如自动化测试)时离屏渲染：不绑定部件的窗口句柄，绑定后 EGL 离屏窗口无法创建，也不会释放渲染上下文
+            render_window.SetOffScreenRendering(1)
+            render_window.SetWindowInfo = lambda info: None
+        view = QVTKRenderWindowInteractor(rw=render_window)
         self.setCentralWidget(view)
         self.renderer = vtkRenderer()
         view.GetRenderWindow().AddRenderer(self.renderer)
@@ -95,54 +249,136 @@ class VolumeViewer(QMainWindow):
         # 信号与槽
         label_button.clicked.connect(self.open_label)
         label_slider.valueChanged.connect(self.adjust_label_opacity)
-        body_button.clicked.connect(self.add_body)
+        self.body_button.toggled.connect(self.add_body)
         self.ai_button.clicked.connect(self.inference)
 
         # 加载
+        view.GetRenderWindow().AddObserver("EndEvent", self.render_finished)
+        style = vtkInteractorStyleTrackballCamera()
+        style.AddObserver("StartInteractionEvent", self.start_interaction)
+        style.AddObserver("EndInteractionEvent", self.end_interaction)
+        view.SetInteractorStyle(style)
+        self.set_target_fps(self.target_fps)
         view.Initialize()
         view.Start()
         self.show()
         self.add_image(image)
 
-    def adjust_camera(self, image: Union[MedicalImage, MedicalImage2]):
-        _ = -0.5 * max(image.size[0] * image.spacing[0], image.size[2] * image.spacing[2]) / math.tan(math.pi / 6)
-        self.camera.SetPosition(0.0, _, 0.0)
-        self.camera.SetFocalPoint(0.0, 0.0, 0.0)
-        self.camera.SetViewUp(0, 0, 1)
-        self.camera.SetViewAngle(60.0)
+    def adjust_camera(self, image: Union[MedicalImage, MedicalImage2], p1: list = None, p2: list = None):
+        # 指定标注框(体素范围)时对准框的中心
+        look_at(self.camera, image.size, image.spacing, p1, p2)
 
     def add_image(self, image: Union[MedicalImage, MedicalImage2]):
+        self._opened_at = time.perf_counter()
         self.images.append(image)
-        self.volumes.append(self.image_to_volume(image, self.image_body))
+        self.volume_keys.append([])
+        self.volumes.append(self.build_volumes(image, self.image_body, self.volume_keys[-1]))
 
         # 渲染三维影像
         for v in self.volumes[0]:
             self.renderer.AddVolume(v)
         self.adjust_camera(image)
+        self.begin_progressive()
 
         _action = self.view_menu.addAction(QIcon("asset/icon/checked2.png"), "0 - 主影像")
         _action.triggered.connect(self.view_action_clicked)
         self.checked_view = 0
 
-    def add_body(self):
-        if self.images[0].modality == "PTCT":
-            if self.image_body is None:
-                self.image_body = sitk.GetArrayFromImage(get_body_mask(*self.images[0].to_sitk_image()))
+    def add_body(self, checked: bool = True):
+        """
+        切换是否仅显示人体：身体掩膜与保留身体部分的数据只计算一次，之后的切换只替换映射器的输入
+        """
+        image = self.images[0]
+        if image.modality != "PTCT":
+            if checked:
+                self.body_button.setChecked(False)
+                information("该功能仅支持PET/CT融合成像。")
+            return
+        if checked and self.image_body is None:
+            self.body_key = (image.source_key, "body")
+            self.image_body = get_volume_store().acquire(
+                self.body_key, lambda: sitk.GetArrayFromImage(get_body_mask(*image.to_sitk_image()))
+            )
+        self.body_visible = checked
+
+        # 切换后直接显示原始分辨率
+        self.stop_progressive_worker()
+        self.set_level(1, self.volume_arrays())
+
+    def volume_arrays(self) -> List[np.ndarray]:
+        """
+        主影像各 vtk 体数据按当前是否仅显示人体应使用的原始分辨率数据
+        """
+        image = self.images[0]
+        arrays = [image.array, image.array_pt] if image.modality == "PTCT" else [image.array]
+        image_body = self.image_body if self.body_visible else None
+        return [
+            self.masked_array(image, array, modality, image_body, self.volume_keys[0])
+            for array, modality in zip(arrays, self.VOLUME_MODALITIES[image.modality])
+        ]
+
+    def set_level(self, factor: int, arrays: List[np.ndarray]):
+        """
+        替换主影像的 vtk 体数据为降采样 factor 倍的数据，原点不变，体素间距乘以 factor
+        """
+        spacing = [s * factor for s in self.images[0].spacing]
+        for v, array in zip(self.volumes[0], arrays):
+            set_volume_input(v, array, spacing)
+        self.level = factor
+        self.request_render()
+
+    def begin_progressive(self):
+        """
+        大体数据先以降采样的数据渲染首帧，首帧完成后在后台准备更高的分辨率
+        """
+        if int(np.prod(self.images[0].size)) < self.PROGRESSIVE_MIN_VOXELS:
+            return
+        factor = self.PROGRESSIVE_FACTORS[0]
+        self.progressive_pending = True
+        self.set_level(factor, [downsample(array, factor) for array in self.volume_arrays()])
 
-                _volume_new = self.image_to_volume(self.images[0], self.image_body)
+    def start_progressive(self):
+        # 启动前已切换到原始分辨率(例如切换了人体显示)或已挂起
+        if self.level == 1 or self.suspended or self.progressive_worker is not None:
+            return
+        self.progressive_worker = ProgressiveWorker(self.volume_arrays(), self.PROGRESSIVE_FACTORS[1:])
+        self.progressive_worker.level_ready.connect(self.level_ready)
+        self.progressive_worker.start()
 
-                if self.checked_view == 0:
-                    for v in self.volumes[0]:
-                        self.renderer.RemoveVolume(v)
+    def level_ready(self, factor: int, arrays: list):
+        # 尚未替换的较粗的数据直接被更细的数据取代
+        if self.sender() is not self.progressive_worker or self.suspended:
+            return
+        self.pending_level = (factor, arrays)
+        self.schedule_refine()
 
-                    self.volumes[0].clear()
-                    self.volumes[0] = _volume_new
+    def schedule_refine(self):
+        if self.pending_level is not None and self.isVisible() and not self.interacting and not self.suspended:
+            self.refine_timer.start(self.REFINE_IDLE_MS)
 
-                    for v in self.volumes[0]:
-                        self.renderer.AddVolume(v)
-                    self.adjust_camera(self.images[0])
-        else:
-            information("该功能仅支持PET/CT融合成像。")
+    def apply_pending_level(self):
+        if self.pending_level is None or not self.isVisible() or self.interacting or self.suspended:
+            return
+        factor, arrays = self.pending_level
+        self.pending_level = None
+        t0 = time.perf_counter()
+        self.set_level(factor, arrays)
+        if self._opened_at is not None:
+            print(
+                f"[INFO] 3D level 1/{factor}: {(time.perf_counter() - self._opened_at) * 1000:.1f} ms, "
+                f"swap {(time.perf_counter() - t0) * 1000:.1f} ms."
+            )
+        if factor == 1:
+            self._opened_at = None
+
+    def stop_progressive_worker(self):
+        self.progressive_pending = False
+        self.pending_level = None
+        self.refine_timer.stop()
+        if self.progressive_worker is not None:
+            self.progressive_worker.stop()
+            self.progressive_worker.wait()
+            self.progressive_worker = None
 
     def open_label(self):
         # 标签
@@ -171,33 +407,36 @@ class VolumeViewer(QMainWindow):
         except Exception as e:
             error(f"解析失败：{str(e)}")
 
+        self.set_labels(_labels)
+
+    def set_labels(self, _labels: list):
+        """
+        显示标注框：每个框只记录体素范围，选中时通过映射器的裁剪区域显示主影像的对应部分，不复制数据
+        """
         # 切换至主影像
         self.view_menu.actions()[0].trigger()
         # 更新view_menu
         for a in self.view_menu.actions()[1:]:
             self.view_menu.removeAction(a)
         # 移除掉之前的label
-        for c, t in self.actors:
-            self.renderer.RemoveActor(c)
-            self.renderer.RemoveActor(t)
-        self.actors.clear()
-        del self.images[1:]
-        del self.volumes[1:]
+        if self.bbox_layer is not None:
+            self.bbox_layer.remove_from(self.renderer)
+            self.bbox_layer = None
+        self.boxes.clear()
 
         # 根据图像获取原点与体素间距
         _origin = [-0.5 * s1 * s2 for s1, s2 in zip(self.images[0].size, self.images[0].spacing)]
         _spacing = self.images[0].spacing
         for i, _l in enumerate(_labels):
-            self.actors.append(bbox(_l[0:3], _l[3:6], _origin, _spacing, _l[6], _l[7], self.label_opacity))
-            self.images.append(self.images[0][_l[2] : _l[5] + 1, _l[1] : _l[4] + 1, _l[0] : _l[3] + 1])
-            self.volumes.append(self.image_to_volume(self.images[-1]))
+            self.boxes.append((_l[0:3], _l[3:6]))
             _action = self.view_menu.addAction(QIcon("asset/icon/checked1.png"), f"{i + 1} - {_l[6]}")
             _action.triggered.connect(self.view_action_clicked)
 
         # 渲染新的label
-        for c, t in self.actors:
-            self.renderer.AddActor(c)
-            self.renderer.AddActor(t)
+        if _labels:
+            boxes = [(_l[0:3], _l[3:6], _l[6], _l[7]) for _l in _labels]
+            self.bbox_layer = BBoxLayer(boxes, _origin, _spacing, self.label_opacity)
+            self.bbox_layer.add_to(self.renderer)
 
     def view_action_clicked(self):
         action = self.sender()
@@ -206,50 +445,409 @@ class VolumeViewer(QMainWindow):
         # 更新
         if idx == self.checked_view:
             return
-        for v in self.volumes[self.checked_view]:
-            self.renderer.RemoveVolume(v)
-        if self.checked_view == 0:
-            for c, t in self.actors:
-                self.renderer.RemoveActor(c)
-                self.renderer.RemoveActor(t)
+        if self.checked_view == 0 and self.bbox_layer is not None:
+            self.bbox_layer.remove_from(self.renderer)
         self.view_menu.actions()[self.checked_view].setIcon(QIcon("asset/icon/checked1.png"))
 
         #
         self.checked_view = idx
         self.view_menu.actions()[self.checked_view].setIcon(QIcon("asset/icon/checked2.png"))
-        for v in self.volumes[self.checked_view]:
-            self.renderer.AddVolume(v)
+        for volumes in self.volumes:
+            for v in volumes:
+                self.apply_cropping(v)
         if self.checked_view == 0:
-            for c, t in self.actors:
-                self.renderer.AddActor(c)
-                self.renderer.AddActor(t)
-        self.adjust_camera(self.images[self.checked_view])
-        # self.centralWidget().GetRenderWindow().Render()
+            if self.bbox_layer is not None:
+                self.bbox_layer.add_to(self.renderer)
+            self.adjust_camera(self.images[0])
+        else:
+            self.adjust_camera(self.images[0], *self.boxes[self.checked_view - 1])
+        self.request_render()
+
+    def apply_cropping(self, volume: vtkVolume):
+        """
+        选中标注框时只渲染框内的部分，裁剪平面为体数据的世界坐标，包含两端的体素
+        """
+        mapper = volume.GetMapper()
+        if self.checked_view == 0:
+            mapper.CroppingOff()
+            return
+        image = self.images[0]
+        p1, p2 = self.boxes[self.checked_view - 1]
+        planes = []
+        for p, q, size, spacing in zip(p1, p2, image.size, image.spacing):
+            origin = -0.5 * size * spacing
+            planes += [origin + (p - 0.5) * spacing, origin + (q + 0.5) * spacing]
+        mapper.SetCroppingRegionPlanes(*planes)
+        mapper.SetCroppingRegionFlagsToSubVolume()
+        mapper.CroppingOn()
 
     def adjust_label_opacity(self, v: int):
         self.label_opacity = 0.01 * v
-        for c, t in self.actors:
-            c.GetProperty().SetOpacity(self.label_opacity)
-            t.GetTextProperty().SetOpacity(self.label_opacity)
-        self.centralWidget().GetRenderWindow().Render()
+        if self.bbox_layer is not None:
+            self.bbox_layer.set_opacity(self.label_opacity)
+        self.request_render()
 
     @staticmethod
-    def image_to_volume(image: Union[MedicalImage, MedicalImage2], image_body: np.ndarray = None):
+    def image_to_volume(image: Union[MedicalImage, MedicalImage2], image_body: np.ndarray = None, keys: list = None):
         # 根据图像获取原点与体素间距
         _origin = [-0.5 * s1 * s2 for s1, s2 in zip(image.size, image.spacing)]
         _spacing = image.spacing
 
+        def _array(array: np.ndarray, modality: str) -> np.ndarray:
+            return VolumeViewer.masked_array(image, array, modality, image_body, keys)
+
         if image.modality == "CT":
-            _volume = [volume_ct(image.array, _origin, _spacing, image_body)]
+            _volume = [volume_ct(_array(image.array, "CT"), _origin, _spacing)]
         elif image.modality == "PT":
-            _volume = [volume_pt(image.array, _origin, _spacing, image_body)]
+            _volume = [volume_pt(_array(image.array, "PT"), _origin, _spacing)]
         elif image.modality == "PTCT":
             _volume = [
-                volume_ct(image.array, _origin, _spacing, image_body),
-                volume_pt(image.array_pt, _origin, _spacing, image_body),
+                volume_ct(_array(image.array, "CT"), _origin, _spacing),
+                volume_pt(_array(image.array_pt, "PT"), _origin, _spacing),
             ]
         return _volume
 
+    # 创建 vtk 体数据并按当前的交互帧率设置映射器
+    def build_volumes(self, image, image_body: np.ndarray = None, keys: list = None) -> List[vtkVolume]:
+        volumes = self.image_to_volume(image, image_body, keys)
+        for v, modality in zip(volumes, self.VOLUME_MODALITIES[image.modality]):
+            self.configure_lod(v)
+            self.apply_cropping(v)
+            if self.presets[modality] != DEFAULT_PRESETS[modality]:
+                set_volume_preset(v, self.presets[modality])
+        return volumes
+
+    @staticmethod
+    def masked_array(image, array: np.ndarray, modality: str, image_body: np.ndarray = None, keys: list = None):
+        """
+        体绘制使用的数据：未使用掩膜时直接使用图像的数据；保留身体部分的数据从共享仓库获取，
+        同一序列的多个三维标签页只保留一份，keys 中已有的键不重复计数
+        """
+        if image_body is None:
+            return array
+        if keys is None:
+            return mask_body(array, image_body, modality)
+        key = (image.source_key, modality, "masked")
+        if key in keys:
+            return get_volume_store().get(key)
+        keys.append(key)
+        return get_volume_store().acquire(key, lambda: mask_body(array, image_body, modality))
+
+    # 移除 start 之后的 vtk 体数据，并归还对应的共享数据
+    def remove_volumes(self, start: int = 0):
+        for keys in self.volume_keys[start:]:
+            get_volume_store().release_all(keys)
+        del self.volume_keys[start:]
+        del self.volumes[start:]
+
+    # 统计当前标签页持有的内存：vtk 体数据与身体掩膜，标注框不占用额外的内存
+    def memory(self, counter: MemoryCounter, name: str):
+        counter.add_image(f"{name}.image", self.images[0] if self.images else None)
+        counter.add_array(f"{name}.body", self.image_body)
+        for volumes in self.volumes:
+            for v in volumes:
+                counter.add_vtk(f"{name}.vtk", v)
+        for a in self.surface_actors:
+            counter.add_vtk(f"{name}.surface", a)
+
+    # 标签页使用的图像
+    def source_images(self) -> list:
+        return self.images[:1]
+
+    def drop_caches(self):
+        pass
+
+    # 挂起：移除并释放 vtk 体数据，保留图像与标注，恢复时重建
+    def suspend(self):
+        self.stop_progressive_worker()
+        self.level = 1
+        self.renderer.RemoveAllViewProps()
+        self.remove_volumes()
+        self.suspended = True
+
+    def resume(self):
+        for image in self.source_images():
+            image.resume()
+        self.suspended = False
+        self.volume_keys = [[] for _ in self.images]
+        self.volumes = [
+            self.build_volumes(image, self.image_body if i == 0 and self.body_visible else None, keys)
+            for i, (image, keys) in enumerate(zip(self.images, self.volume_keys))
+        ]
+        if self.surface_levels is None:
+            for v in self.volumes[0]:
+                self.renderer.AddVolume(v)
+        else:
+            for a in self.surface_actors:
+                self.renderer.AddActor(a)
+        if self.checked_view == 0 and self.bbox_layer is not None:
+            self.bbox_layer.add_to(self.renderer)
+        self._opened_at = time.perf_counter()
+        self.begin_progressive()
+        self.request_render()
+
+    # 只渲染当前可见的标签页
+    def request_render(self):
+        if self.isVisible() and not self.suspended:
+            self.centralWidget().GetRenderWindow().Render()
+
+    def showEvent(self, event: QShowEvent) -> None:
+        self.release_timer.stop()
+        self._shown_at = time.perf_counter()
+        self.centralWidget().Enable()
+        if self.suspended:
+            self.resume()
+        super().showEvent(event)
+        self.schedule_refine()
+
+    def hideEvent(self, event: QHideEvent) -> None:
+        # 隐藏后不再响应交互与渲染请求，长时间隐藏后释放资源
+        self.centralWidget().Disable()
+        self._shown_at = None
+        self.refine_timer.stop()
+        self.release_timer.start(self.RELEASE_AFTER)
+        super().hideEvent(event)
+
+    def release_graphics(self):
+        if self.isVisible() or self.suspended:
+            return
+        render_window = self.centralWidget().GetRenderWindow()
+        self.renderer.ReleaseGraphicsResources(render_window)
+        self.suspend()
+        self._released = True
+        print("[INFO] release graphics resources of hidden 3D tab.")
+
+    def set_target_fps(self, fps: float):
+        """
+        设置交互时的目标帧率：交互时渲染窗口按该帧率分配渲染时间，光线投射映射器据此自动增大图像采样间隔；
+        停止交互后恢复静止帧率，以最高质量重新渲染
+        """
+        self.target_fps = fps
+        self.interactive_update_rate = fps
+        view = self.centralWidget()
+        view.SetDesiredUpdateRate(fps if fps > 0 else view.GetStillUpdateRate())
+        self.lod_button.setText(f"{fps:g} FPS" if fps > 0 else "最高质量")
+        for volumes in self.volumes:
+            for v in volumes:
+                self.configure_lod(v)
+
+    def set_surface(self, levels: dict, name: str):
+        """
+        切换表面模式：levels 为 {名称: 阈值(HU)}，在后台提取等值面后以多边形渲染；None 时恢复体绘制
+        """
+        image = self.images[0]
+        if levels is not None and image.modality not in ("CT", "PTCT"):
+            information("该功能仅支持CT与PET/CT融合成像。")
+            return
+        self.surface_button.setText(name)
+        self.surface_levels = levels
+        self.stop_surface_worker()
+        for a in self.surface_actors:
+            self.renderer.RemoveActor(a)
+        self.surface_actors.clear()
+
+        for v in self.volumes[0] if self.volumes else []:
+            if levels is None:
+                self.renderer.AddVolume(v)
+            else:
+                self.renderer.RemoveVolume(v)
+        if levels is not None:
+            self.surface_worker = SurfaceWorker(image, levels, self.surface_reduction)
+            self.surface_worker.surface_ready.connect(self.add_surface)
+            self.surface_worker.start()
+        self.request_render()
+
+    def set_custom_surface(self):
+        level, ok = QInputDialog.getDouble(self, "等值面", "阈值(HU)：", SURFACES["bone"][0], -1000, 30000, 0)
+        if ok:
+            self.set_surface({"custom": level}, f"{level:g} HU")
+
+    def set_surface_reduction(self, checked: bool):
+        self.surface_reduction = 0.5 if checked else 0.0
+        if self.surface_levels is not None:
+            self.set_surface(self.surface_levels, self.surface_button.text())
+
+    def add_surface(self, name: str, surface):
+        if self.sender() is not self.surface_worker:
+            return
+        color = SURFACES[name][1] if name in SURFACES else SURFACES["bone"][1]
+        actor = surface_actor(surface, color)
+        self.surface_actors.append(actor)
+        if not self.suspended:
+            self.renderer.AddActor(actor)
+        self.request_render()
+
+    def stop_surface_worker(self):
+        if self.surface_worker is not None:
+            self.surface_worker.stop()
+            self.surface_worker.wait()
+            self.surface_worker = None
+
+    def set_preset(self, name: str):
+        """
+        切换传递函数预设：替换对应模态的所有体数据的属性，不重新创建映射器
+        """
+        modality = PRESETS[name].modality
+        self.presets[modality] = name
+        for image, volumes in zip(self.images, self.volumes):
+            for v, m in zip(volumes, self.VOLUME_MODALITIES[image.modality]):
+                if m == modality:
+                    set_volume_preset(v, name)
+        self.request_render()
+
+    def set_mapper_config(self, **changes):
+        """
+        修改体绘制映射器的配置(类型、线程数、采样步长、插值方式)并保存，所有三维标签页重新创建 vtk 体数据
+        """
+        config = get_mapper_config()
+        new_config = config.replace(**changes)
+        if new_config.to_dict() == config.to_dict():
+            return
+        set_mapper_config(new_config)
+        print(f"[INFO] volume mapper: {new_config.name}.")
+        for viewer in list(VolumeViewer.viewers):
+            viewer.rebuild_volumes()
+
+    def set_mapper_threads(self):
+        config = get_mapper_config()
+        threads, ok = QInputDialog.getInt(self, "映射器", "线程数(0 表示所有核心)：", config.threads, 0, os.cpu_count() or 1)
+        if ok:
+            self.set_mapper_config(threads=threads)
+
+    def set_mapper_sample_distance(self):
+        config = get_mapper_config()
+        distance, ok = QInputDialog.getDouble(self, "映射器", "光线采样步长(mm)：", config.sample_distance, 0.1, 10.0, 2)
+        if ok:
+            self.set_mapper_config(sample_distance=distance)
+
+    def rebuild_volumes(self):
+        """
+        按当前的映射器配置重新创建 vtk 体数据：可见时立即重建，隐藏的标签页挂起，切换到前台时重建
+        """
+        if self.suspended:
+            return
+        visible = self.isVisible()
+        self.suspend()
+        if visible:
+            self.resume()
+        # 交互时请求的帧率按新的映射器重新调整
+        self.set_target_fps(self.target_fps)
+
+    def configure_lod(self, volume: vtkVolume):
+        mapper = volume.GetMapper()
+        if hasattr(mapper, "SetAutoAdjustSampleDistances"):
+            mapper.SetAutoAdjustSampleDistances(self.target_fps > 0)
+        if hasattr(mapper, "SetInteractiveSampleDistance"):
+            mapper.SetInteractiveSampleDistance(self.interactive_sample_distance)
+        elif hasattr(mapper, "SetInteractiveUpdateRate") and self.target_fps > 0:
+            # 智能映射器：渲染窗口请求的帧率不低于目标帧率时视为交互渲染
+            mapper.SetInteractiveUpdateRate(self.target_fps)
+
+    def sample_distance_adjustable(self) -> bool:
+        """
+        所有映射器都能设置交互时的光线采样步长；智能映射器不能，只能通过请求的帧率增大图像采样间隔
+        """
+        return all(hasattr(v.GetMapper(), "SetInteractiveSampleDistance") for volumes in self.volumes for v in volumes)
+
+    def start_interaction(self, obj, event):
+        self.interacting = True
+        self.refine_timer.stop()
+        self.frame_times.clear()
+
+    def end_interaction(self, obj, event):
+        self.interacting = False
+        self.schedule_refine()
+        if self.target_fps > 0 and self.frame_times:
+            self.adapt_sample_distance()
+            print(f"[INFO] {self.lod_report()}")
+
+    def adapt_sample_distance(self):
+        """
+        根据实际帧率调整交互时的光线采样步长：达不到目标时增大，明显超出时减小；
+        映射器不能设置采样步长时改为调整向渲染窗口请求的帧率，由映射器自动增大或减小图像采样间隔
+        """
+        achieved = 1.0 / max(float(np.median(np.fromiter(self.frame_times, dtype=np.float64))), 1e-6)
+        if self.sample_distance_adjustable():
+            lo, hi = self.SAMPLE_DISTANCE_RANGE
+            if achieved < 0.8 * self.target_fps:
+                self.interactive_sample_distance = min(self.interactive_sample_distance * 1.25, hi)
+            elif achieved > 1.5 * self.target_fps:
+                self.interactive_sample_distance = max(self.interactive_sample_distance / 1.25, lo)
+        else:
+            lo, hi = (r * self.target_fps for r in self.UPDATE_RATE_RANGE)
+            if achieved < 0.8 * self.target_fps:
+                self.interactive_update_rate = min(self.interactive_update_rate * 1.25, hi)
+            elif achieved > 1.5 * self.target_fps:
+                self.interactive_update_rate = max(self.interactive_update_rate / 1.25, lo)
+            self.centralWidget().SetDesiredUpdateRate(self.interactive_update_rate)
+        for volumes in self.volumes:
+            for v in volumes:
+                self.configure_lod(v)
+
+    def lod_report(self) -> str:
+        """
+        最近一次交互的帧时间统计
+        """
+        if not self.frame_times:
+            return "3D interaction: no frames."
+        times = np.fromiter(self.frame_times, dtype=np.float64) * 1000
+        p50, p95 = np.percentile(times, (50, 95))
+        return (
+            f"3D interaction: {len(times)} frames, p50 {p50:.1f} ms, p95 {p95:.1f} ms, "
+            f"{1000.0 / max(p50, 1e-3):.1f}/{self.target_fps:g} FPS, "
+            + (
+                f"sample distance {self.interactive_sample_distance:.2f}"
+                if self.sample_distance_adjustable()
+                else f"requested {self.interactive_update_rate:.1f} FPS"
+            )
+        )
+
+    def render_finished(self, obj, event):
+        if self.interacting:
+            self.frame_times.append(self.renderer.GetLastRenderTimeInSeconds())
+        elif self.progressive_pending:
+            # 降采样的首帧已显示
+            self.progressive_pending = False
+            if self._opened_at is not None:
+                latency = (time.perf_counter() - self._opened_at) * 1000
+                print(f"[INFO] 3D level 1/{self.level} (first frame): {latency:.1f} ms.")
+            QTimer.singleShot(0, self.start_progressive)
+        if self._shown_at is None:
+            return
+        latency = (time.perf_counter() - self._shown_at) * 1000
+        self._shown_at = None
+        self.switch_latency.append(latency)
+        p50, p95 = np.percentile(np.fromiter(self.switch_latency, dtype=np.float64), (50, 95))
+        state = "restored" if self._released else "resident"
+        self._released = False
+        print(f"[INFO] 3D tab switch ({state}): {latency:.1f} ms, p50 {p50:.1f} ms, p95 {p95:.1f} ms.")
+
+    # 关闭标签页时释放 vtk 对象与渲染窗口
+    def release(self):
+        VolumeViewer.viewers.discard(self)
+        self.release_timer.stop()
+        self.stop_progressive_worker()
+        self.stop_surface_worker()
+        self.surface_actors.clear()
+        self.renderer.RemoveAllViewProps()
+        self.remove_volumes()
+        self.bbox_layer = None
+        self.boxes.clear()
+        self.image_body = None
+        if self.body_key is not None:
+            get_volume_store().release(self.body_key)
+            self.body_key = None
+        # 没有其他三维标签页显示同一序列时删除缓存的等值面网格
+        if self.images:
+            key = self.images[0].source_key
+            if all(not v.images or v.images[0].source_key != key for v in VolumeViewer.viewers):
+                drop_surfaces(key)
+        # 融合图像由标签页独占
+        if self.images and isinstance(self.images[0], MedicalImage2):
+            self.images[0].release()
+        self.centralWidget().GetRenderWindow().RemoveRenderer(self.renderer)
+        self.centralWidget().Finalize()
+
     def inference(self):
         if self.images[0].modality == "PTCT":
             self.woker = FRIWorker(self.images[0])
@@ -274,33 +872,7 @@ class VolumeViewer(QMainWindow):
         for c, l in zip(classes, labels):
             _labels.append([*l, c, c2c[c]])
 
-        # 切换至主影像
-        self.view_menu.actions()[0].trigger()
-        # 更新view_menu
-        for a in self.view_menu.actions()[1:]:
-            self.view_menu.removeAction(a)
-        # 移除掉之前的label
-        for c, t in self.actors:
-            self.renderer.RemoveActor(c)
-            self.renderer.RemoveActor(t)
-        self.actors.clear()
-        del self.images[1:]
-        del self.volumes[1:]
-
-        # 根据图像获取原点与体素间距
-        _origin = [-0.5 * s1 * s2 for s1, s2 in zip(self.images[0].size, self.images[0].spacing)]
-        _spacing = self.images[0].spacing
-        for i, _l in enumerate(_labels):
-            self.actors.append(bbox(_l[0:3], _l[3:6], _origin, _spacing, _l[6], _l[7], self.label_opacity))
-            self.images.append(self.images[0][_l[2] : _l[5] + 1, _l[1] : _l[4] + 1, _l[0] : _l[3] + 1])
-            self.volumes.append(self.image_to_volume(self.images[-1]))
-            _action = self.view_menu.addAction(QIcon("asset/icon/checked1.png"), f"{i + 1} - {_l[6]}")
-            _action.triggered.connect(self.view_action_clicked)
-
-        # 渲染新的label
-        for c, t in self.actors:
-            self.renderer.AddActor(c)
-            self.renderer.AddActor(t)
+        self.set_labels(_labels)
 
         i1 = classes.count("infected")
         i2 = classes.count("uninfected")
@@ -1,2 +1,7 @@
 from worker.fri import FRIWorker
+from worker.mip import MIPWorker
 from worker.pji import PJIWorker
+from worker.prefetch import PrefetchWorker
+from worker.progressive import ProgressiveWorker
+from worker.surface import SurfaceWorker
+from worker.thumbnail import ThumbnailWorker
@@ -2,6 +2,8 @@ import time
 
 from PyQt6.QtCore import QThread, pyqtSignal
 
+from utility.trace import traced
+
 
 class FRIWorker(QThread):
     finished = pyqtSignal(list)
@@ -12,6 +14,7 @@ class FRIWorker(QThread):
         self.model_path_det = "asset/model/FRI_det.pth"
         self.model_path_cls = "asset/model/FRI_cls.pth"
 
+    @traced()
     def run(self) -> None:
         # TODO: 模型推理
 
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Union
+
+import numpy as np
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from utility import MedicalImage, MedicalImage2
+from utility.trace import counter, traced
+
+
+class MIPWorker(QThread):
+    """
+    后台计算旋转 MIP 的指定帧，每完成一帧即发出信号，结果由播放窗口保存。
+    图像的渲染缓存被清空(重新归一化、切换颜色图)后计算的帧已过期，不再发出并停止计算
+    """
+
+    frame_ready = pyqtSignal(int, np.ndarray)
+
+    def __init__(
+        self,
+        image: Union[MedicalImage, MedicalImage2],
+        frames: int = 36,
+        indices: List[int] = None,
+        generation: int = None,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.image = image
+        self.frames = frames
+        self.indices = indices if indices is not None else list(range(frames))
+        self.generation = generation if generation is not None else image.plane_cache.generation
+        self.max_workers = max((os.cpu_count() or 2) - 1, 1)
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    @traced()
+    def run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mip") as executor:
+            futures = {executor.submit(self.generate, i): i for i in self.indices}
+            for done, future in enumerate(as_completed(futures), 1):
+                if self.stopped:
+                    for f in futures:
+                        f.cancel()
+                    return
+                frame = future.result()
+                if frame is not None:
+                    self.frame_ready.emit(futures[future], frame)
+                counter("MIPWorker", frames=done)
+
+    @traced()
+    def generate(self, index: int) -> np.ndarray:
+        if self.stopped:
+            return None
+        try:
+            frame = self.image.plane_mip(index, self.frames)
+        except Exception as e:
+            print(f"[WARNING] MIP frame {index} failed: {e}")
+            return None
+        if self.image.plane_cache.generation != self.generation:
+            self.stopped = True
+            return None
+        return frame
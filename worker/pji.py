@@ -2,6 +2,8 @@ import time
 
 from PyQt6.QtCore import QThread, pyqtSignal
 
+from utility.trace import traced
+
 
 class PJIWorker(QThread):
     finished = pyqtSignal(str)
@@ -14,6 +16,7 @@ class PJIWorker(QThread):
         if body_part == "hip":
             self.model_path = "./asset/model/PJI_hip_1.pth"
 
+    @traced()
     def run(self) -> None:
         # TODO: 模型推理
 
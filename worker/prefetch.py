@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+from typing import List, Union
+
+from PyQt6.QtCore import QThread
+
+from utility import MedicalImage, MedicalImage2
+
+
+class PrefetchWorker(QThread):
+    """
+    在后台预先计算即将显示的切面，结果写入图像的渲染缓存；新的请求会替换尚未处理的旧请求
+    """
+
+    def __init__(self, image: Union[MedicalImage, MedicalImage2], parent=None) -> None:
+        super().__init__(parent)
+        self.image = image
+        self.tasks = deque()
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.stopped = False
+        self.finished.connect(self.restart)
+
+    def prefetch(self, view: str, positions: List[int], level: int = 0):
+        with self.lock:
+            self.stopped = False
+            self.tasks.clear()
+            self.tasks.extend((view, pos, level) for pos in positions)
+        self.event.set()
+        if not self.isRunning():
+            self.start(QThread.Priority.LowPriority)
+
+    def stop(self):
+        with self.lock:
+            self.tasks.clear()
+        self.stopped = True
+        self.event.set()
+
+    def restart(self):
+        # 线程空闲退出时若有新任务则重新启动
+        if self.tasks and not self.stopped and not self.isRunning():
+            self.start(QThread.Priority.LowPriority)
+
+    def run(self) -> None:
+        while not self.stopped:
+            with self.lock:
+                task = self.tasks.popleft() if self.tasks else None
+                if task is None:
+                    self.event.clear()
+            if task is None:
+                if not self.event.wait(timeout=1.0):
+                    return
+                continue
+            if task not in self.image.plane_cache:
+                try:
+                    self.image.plane(*task[0:2], level=task[2])
+                except Exception as e:
+                    print(f"[WARNING] prefetch of {task} failed: {e}")
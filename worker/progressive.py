@@ -0,0 +1,36 @@
+from typing import List, Sequence
+
+import numpy as np
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from utility import downsample
+from utility.trace import traced
+
+
+class ProgressiveWorker(QThread):
+    """
+    在后台由粗到细地准备体绘制数据，每完成一级即发出信号(降采样倍数, 各体数据的数组)，最后一级为原始分辨率
+    """
+
+    level_ready = pyqtSignal(int, object)
+
+    def __init__(self, arrays: List[np.ndarray], factors: Sequence[int] = (2,), parent=None) -> None:
+        super().__init__(parent)
+        self.arrays = arrays
+        self.factors = factors
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    @traced()
+    def run(self) -> None:
+        for factor in self.factors:
+            if self.stopped:
+                return
+            arrays = [downsample(array, factor) for array in self.arrays]
+            if self.stopped:
+                return
+            self.level_ready.emit(factor, arrays)
+        if not self.stopped:
+            self.level_ready.emit(1, self.arrays)
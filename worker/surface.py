@@ -0,0 +1,51 @@
+from typing import Dict, Union
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from utility import MedicalImage, MedicalImage2
+from utility.surface import extract_surface, get_surface, put_surface
+from utility.trace import traced
+
+
+class SurfaceWorker(QThread):
+    """
+    在后台提取 CT 的等值面(骨骼、金属植入物等)，每完成一个即发出信号；
+    结果按序列、阈值与简化比例缓存，再次打开时直接使用
+    """
+
+    surface_ready = pyqtSignal(str, object)
+
+    def __init__(
+        self,
+        image: Union[MedicalImage, MedicalImage2],
+        levels: Dict[str, float],
+        reduction: float = 0.0,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.image = image
+        self.levels = levels
+        self.reduction = reduction
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    @traced()
+    def run(self) -> None:
+        image = self.image
+        origin = [-0.5 * s1 * s2 for s1, s2 in zip(image.size, image.spacing)]
+        for name, level in self.levels.items():
+            if self.stopped:
+                return
+            key = (image.source_key, float(level), float(self.reduction))
+            surface = get_surface(key)
+            if surface is None:
+                try:
+                    surface = extract_surface(image.array, origin, image.spacing, level, self.reduction)
+                except Exception as e:
+                    print(f"[WARNING] surface {name} at {level} HU failed: {e}")
+                    continue
+                put_surface(key, surface)
+                print(f"[INFO] surface {name} at {level} HU: {surface.GetNumberOfPolys()} triangles.")
+            self.surface_ready.emit(name, surface)
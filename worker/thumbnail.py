@@ -0,0 +1,44 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from utility import MedicalImage, load_thumbnail
+from utility.trace import traced
+
+
+class ThumbnailWorker(QThread):
+    thumbnail_ready = pyqtSignal(str, np.ndarray)
+
+    def __init__(self, max_workers: int = 2, parent=None) -> None:
+        super().__init__(parent)
+        self.tasks = queue.Queue()
+        self.max_workers = max_workers
+        self.finished.connect(self.restart)
+
+    def add(self, uid: str, image: MedicalImage):
+        self.tasks.put((uid, image))
+        if not self.isRunning():
+            self.start(QThread.Priority.LowPriority)
+
+    def restart(self):
+        # 线程空闲退出时若有新任务则重新启动
+        if not self.tasks.empty() and not self.isRunning():
+            self.start(QThread.Priority.LowPriority)
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="thumbnail") as executor:
+            while True:
+                try:
+                    uid, image = self.tasks.get(timeout=1.0)
+                except queue.Empty:
+                    return
+                executor.submit(self.generate, uid, image)
+
+    @traced()
+    def generate(self, uid: str, image: MedicalImage):
+        try:
+            self.thumbnail_ready.emit(uid, load_thumbnail(image))
+        except Exception as e:
+            print(f"[WARNING] thumbnail of {uid} failed: {e}")